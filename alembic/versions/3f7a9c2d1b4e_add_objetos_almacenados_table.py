@@ -0,0 +1,42 @@
+"""add objetos_almacenados table for content-addressed attachments
+
+Revision ID: 3f7a9c2d1b4e
+Revises: 9ca960d29f01
+Create Date: 2026-10-19 09:12:31.418207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f7a9c2d1b4e'
+down_revision = '9ca960d29f01'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('objetos_almacenados',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('hash_sha256', sa.String(length=64), nullable=False),
+    sa.Column('ruta_archivo', sa.String(), nullable=False),
+    sa.Column('tipo_archivo', sa.String(), nullable=False),
+    sa.Column('tamano', sa.Integer(), nullable=False),
+    sa.Column('referencias', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_objetos_almacenados_id'), 'objetos_almacenados', ['id'], unique=False)
+    op.create_index(op.f('ix_objetos_almacenados_hash_sha256'), 'objetos_almacenados', ['hash_sha256'], unique=True)
+    # Los archivos existentes quedan con hash NULL y conservan su key original
+    op.add_column('archivos_adjuntos', sa.Column('hash_sha256', sa.String(length=64), nullable=True))
+    op.create_index(op.f('ix_archivos_adjuntos_hash_sha256'), 'archivos_adjuntos', ['hash_sha256'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_archivos_adjuntos_hash_sha256'), table_name='archivos_adjuntos')
+    op.drop_column('archivos_adjuntos', 'hash_sha256')
+    op.drop_index(op.f('ix_objetos_almacenados_hash_sha256'), table_name='objetos_almacenados')
+    op.drop_index(op.f('ix_objetos_almacenados_id'), table_name='objetos_almacenados')
+    op.drop_table('objetos_almacenados')
@@ -0,0 +1,24 @@
+"""add ruta_miniatura to archivos_adjuntos
+
+Revision ID: 5b8e2f4a6c1d
+Revises: 3f7a9c2d1b4e
+Create Date: 2026-10-19 11:40:05.227913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b8e2f4a6c1d'
+down_revision = '3f7a9c2d1b4e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('archivos_adjuntos', sa.Column('ruta_miniatura', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('archivos_adjuntos', 'ruta_miniatura')
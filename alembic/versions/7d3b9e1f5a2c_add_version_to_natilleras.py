@@ -0,0 +1,25 @@
+"""add version to natilleras
+
+Revision ID: 7d3b9e1f5a2c
+Revises: 5b8e2f4a6c1d
+Create Date: 2026-10-19 14:05:31.482190
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d3b9e1f5a2c'
+down_revision = '5b8e2f4a6c1d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Versión de la natillera: se incrementa con cada escritura de sus datos (ETags)
+    op.add_column('natilleras', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('natilleras', 'version')
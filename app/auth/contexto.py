@@ -0,0 +1,98 @@
+import enum
+from typing import Dict, Optional
+
+from fastapi import Depends, HTTPException, status
+from sqlalchemy.orm import Session
+
+from app.auth.dependencies import get_current_user
+from app.database import get_db
+from app.models import Natillera, User
+from app.services.membresia_service import MembresiaService
+
+# Clave en session.info donde vive el contexto de la petición
+CLAVE_CONTEXTO = "contexto_autorizacion"
+
+
+class RolNatillera(str, enum.Enum):
+    CREADOR = "creador"
+    MIEMBRO = "miembro"
+    NINGUNO = "ninguno"
+
+
+class ContextoAutorizacion:
+    """
+    Contexto de autorización de una petición: carga cada natillera y el rol del usuario
+    en ella una sola vez y los reutiliza en el router y en los servicios que reciben
+    la misma sesión.
+    """
+
+    def __init__(self, db: Session, user: User):
+        self.db = db
+        self.user = user
+        self._natilleras: Dict[int, Optional[Natillera]] = {}
+        self._roles: Dict[int, RolNatillera] = {}
+
+    @staticmethod
+    def de_sesion(db: Session, user: User) -> "ContextoAutorizacion":
+        """Obtiene (o crea) el contexto asociado a la sesión de la petición"""
+        contexto = db.info.get(CLAVE_CONTEXTO)
+        if contexto is None or contexto.user.id != user.id:
+            contexto = ContextoAutorizacion(db, user)
+            db.info[CLAVE_CONTEXTO] = contexto
+        return contexto
+
+    def natillera(self, natillera_id: int) -> Optional[Natillera]:
+        """Natillera por ID (None si no existe), consultada una sola vez por petición"""
+        if natillera_id not in self._natilleras:
+            self._natilleras[natillera_id] = self.db.get(Natillera, natillera_id)
+        return self._natilleras[natillera_id]
+
+    def rol(self, natillera_id: int) -> RolNatillera:
+        """Rol del usuario actual en la natillera"""
+        if natillera_id not in self._roles:
+            natillera = self.natillera(natillera_id)
+            if natillera is None:
+                rol = RolNatillera.NINGUNO
+            elif natillera.creator_id == self.user.id:
+                rol = RolNatillera.CREADOR
+            elif MembresiaService.es_miembro(self.db, natillera_id, self.user.id):
+                rol = RolNatillera.MIEMBRO
+            else:
+                rol = RolNatillera.NINGUNO
+            self._roles[natillera_id] = rol
+        return self._roles[natillera_id]
+
+    def es_creador(self, natillera_id: int) -> bool:
+        return self.rol(natillera_id) == RolNatillera.CREADOR
+
+    def es_miembro(self, natillera_id: int) -> bool:
+        """Miembro o creador"""
+        return self.rol(natillera_id) != RolNatillera.NINGUNO
+
+    def requerir_natillera(self, natillera_id: int) -> Natillera:
+        natillera = self.natillera(natillera_id)
+        if natillera is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Natillera no encontrada")
+        return natillera
+
+    def requerir_miembro(self, natillera_id: int, detail: str = "No eres miembro de esta natillera") -> Natillera:
+        """Retorna la natillera si el usuario es miembro o creador; 404/403 en otro caso"""
+        natillera = self.requerir_natillera(natillera_id)
+        if not self.es_miembro(natillera_id):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=detail)
+        return natillera
+
+    def requerir_creador(self, natillera_id: int, detail: str = "Solo el creador puede realizar esta acción") -> Natillera:
+        """Retorna la natillera si el usuario es su creador; 404/403 en otro caso"""
+        natillera = self.requerir_natillera(natillera_id)
+        if not self.es_creador(natillera_id):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=detail)
+        return natillera
+
+
+def get_contexto_autorizacion(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+) -> ContextoAutorizacion:
+    """Dependencia con el contexto de autorización de la petición"""
+    return ContextoAutorizacion.de_sesion(db, current_user)
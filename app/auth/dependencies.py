@@ -1,35 +1,80 @@
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from app.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
+from app.database import get_db, get_async_db
 from app.models import User
 from app.auth.firebase_auth import verify_firebase_token
 
 security = HTTPBearer()
 
-async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> User:
-    """Obtiene el usuario actual desde el token de Firebase"""
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="No se pudo validar las credenciales",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
+
+def _user_not_found_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="Usuario no encontrado en la base de datos. Por favor, sincroniza tu cuenta."
+    )
+
+def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db)
+) -> User:
+    """
+    Obtiene el usuario actual desde el token de Firebase.
+    Es síncrona para que la verificación y la consulta corran en el threadpool
+    y no bloqueen el event loop.
+    """
     token = credentials.credentials
     firebase_user = verify_firebase_token(token)
     
     if firebase_user is None:
-        raise credentials_exception
+        raise _credentials_exception()
     
     # Buscar usuario por Firebase UID
     user = db.query(User).filter(User.firebase_uid == firebase_user['uid']).first()
     if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Usuario no encontrado en la base de datos. Por favor, sincroniza tu cuenta."
-        )
+        raise _user_not_found_exception()
     
     return user
+
+async def get_current_user_async(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_async_db)
+) -> User:
+    """
+    Versión asíncrona de get_current_user para endpoints que usan AsyncSession.
+    El usuario retornado no admite cargas perezosas de relaciones; solo deben usarse sus columnas.
+    """
+    token = credentials.credentials
+    # La verificación del token puede descargar certificados de Google: no bloquear el event loop
+    firebase_user = await run_in_threadpool(verify_firebase_token, token)
+    
+    if firebase_user is None:
+        raise _credentials_exception()
+    
+    user = await db.scalar(select(User).where(User.firebase_uid == firebase_user['uid']))
+    if user is None:
+        raise _user_not_found_exception()
+    
+    return user
+
+def get_admin_user(current_user: User = Depends(get_current_user)) -> User:
+    """
+    Exige que el usuario actual esté en ADMIN_EMAILS.
+    """
+    admins = {email.strip().lower() for email in settings.ADMIN_EMAILS.split(",") if email.strip()}
+    if current_user.email.lower() not in admins:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Se requieren permisos de administrador"
+        )
+    return current_user
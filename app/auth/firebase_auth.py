@@ -1,25 +1,52 @@
-import firebase_admin
-from firebase_admin import credentials, auth as firebase_auth
 from app.config import settings
+import logging
 import os
+import threading
 
-# Inicializar Firebase solo si no está inicializado
-if not firebase_admin._apps:
-    if settings.FIREBASE_CREDENTIALS_PATH and os.path.exists(settings.FIREBASE_CREDENTIALS_PATH):
-        cred = credentials.Certificate(settings.FIREBASE_CREDENTIALS_PATH)
-        firebase_admin.initialize_app(cred)
-    else:
-        # Para desarrollo local sin credenciales
-        print("⚠️  Firebase credentials not found. Using development mode without Firebase Auth validation.")
-        print("   Set FIREBASE_CREDENTIALS_PATH in .env to enable Firebase Auth")
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_auth = None
+_inicializado = False
+
+
+def obtener_firebase_auth():
+    """
+    Importa e inicializa firebase-admin en el primer uso: importarlo al cargar el
+    módulo retrasa el arranque de cada worker. Retorna el módulo `firebase_admin.auth`
+    o None si no hay credenciales (modo desarrollo).
+    """
+    global _auth, _inicializado
+    if _inicializado:
+        return _auth
+    with _lock:
+        if not _inicializado:
+            import firebase_admin
+            from firebase_admin import credentials, auth as firebase_auth
+
+            # Inicializar Firebase solo si no está inicializado
+            if not firebase_admin._apps:
+                if settings.FIREBASE_CREDENTIALS_PATH and os.path.exists(settings.FIREBASE_CREDENTIALS_PATH):
+                    cred = credentials.Certificate(settings.FIREBASE_CREDENTIALS_PATH)
+                    firebase_admin.initialize_app(cred)
+                else:
+                    # Para desarrollo local sin credenciales
+                    logger.warning(
+                        "Firebase credentials not found. Using development mode without Firebase Auth validation. "
+                        "Set FIREBASE_CREDENTIALS_PATH in .env to enable Firebase Auth"
+                    )
+            _auth = firebase_auth if firebase_admin._apps else None
+            _inicializado = True
+    return _auth
 
 def verify_firebase_token(token: str):
     """Verifica el token de Firebase y retorna el usuario decodificado"""
+    firebase_auth = obtener_firebase_auth()
+    if firebase_auth is None:
+        # Modo desarrollo sin Firebase
+        return None
+
     try:
-        if not firebase_admin._apps:
-            # Modo desarrollo sin Firebase
-            return None
-        
         decoded_token = firebase_auth.verify_id_token(token)
         return decoded_token
     except firebase_auth.InvalidIdTokenError:
@@ -27,17 +54,18 @@ def verify_firebase_token(token: str):
     except firebase_auth.ExpiredIdTokenError:
         return None
     except Exception as e:
-        print(f"Error verificando token: {e}")
+        logger.warning("Error verificando token: %s", e)
         return None
 
 def get_firebase_user_by_uid(uid: str):
     """Obtiene información del usuario de Firebase por UID"""
+    firebase_auth = obtener_firebase_auth()
+    if firebase_auth is None:
+        return None
     try:
-        if not firebase_admin._apps:
-            return None
         return firebase_auth.get_user(uid)
     except Exception as e:
-        print(f"Error obteniendo usuario de Firebase: {e}")
+        logger.warning("Error obteniendo usuario de Firebase: %s", e)
         return None
 
 def verify_token(token: str, db):
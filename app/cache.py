@@ -0,0 +1,255 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from fastapi import Response
+from pydantic import BaseModel, TypeAdapter
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.metrics import registro
+from app.respuestas import dumps
+from app.services.version_service import CLAVE_MODIFICADAS
+
+CACHE_CONSULTAS = registro.counter(
+    "cache_respuestas_total", "Consultas a la caché de respuestas por ruta y resultado (hit/miss)",
+    ["ruta", "resultado"]
+)
+CACHE_INVALIDACIONES = registro.counter(
+    "cache_invalidaciones_total", "Natilleras invalidadas en la caché de respuestas"
+)
+registro.gauge(
+    "cache_hit_ratio", "Proporción de aciertos de la caché de respuestas por ruta", ["ruta"],
+    funcion=lambda: _proporcion_aciertos()
+)
+
+
+def _proporcion_aciertos():
+    rutas = {serie["ruta"] for serie in CACHE_CONSULTAS.series()}
+    for ruta in rutas:
+        aciertos = CACHE_CONSULTAS.valor(ruta=ruta, resultado="hit")
+        total = aciertos + CACHE_CONSULTAS.valor(ruta=ruta, resultado="miss")
+        if total:
+            yield {"ruta": ruta}, aciertos / total
+
+
+class CacheMemoria:
+    """Backend en memoria del proceso: LRU con expiración por entrada"""
+
+    bloqueante = False
+
+    def __init__(self, max_entradas: int = 10000):
+        self.max_entradas = max_entradas
+        self._datos: "OrderedDict[str, tuple]" = OrderedDict()
+        # Los contadores (generaciones) van aparte: nunca expiran ni se desalojan
+        self._contadores: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, clave: str) -> Optional[bytes]:
+        with self._lock:
+            if clave in self._contadores:
+                return str(self._contadores[clave]).encode()
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return None
+            valor, expira = entrada
+            if expira is not None and expira <= time.monotonic():
+                del self._datos[clave]
+                return None
+            self._datos.move_to_end(clave)
+            return valor
+
+    def set(self, clave: str, valor: bytes, ttl: Optional[float] = None):
+        expira = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._datos[clave] = (valor, expira)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+
+    def incr(self, clave: str) -> int:
+        with self._lock:
+            self._contadores[clave] = self._contadores.get(clave, 0) + 1
+            return self._contadores[clave]
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+            self._contadores.clear()
+
+
+class CacheRedis:
+    """
+    Backend compartido entre procesos sobre un cliente compatible con Redis (get, set
+    con `ex` e incr); acepta por ejemplo un cliente de redis-py o un fake en pruebas.
+    """
+
+    bloqueante = True
+
+    def __init__(self, cliente):
+        self.cliente = cliente
+
+    def get(self, clave: str) -> Optional[bytes]:
+        return self.cliente.get(clave)
+
+    def set(self, clave: str, valor: bytes, ttl: Optional[float] = None):
+        self.cliente.set(clave, valor, ex=int(ttl) if ttl else None)
+
+    def incr(self, clave: str) -> int:
+        return self.cliente.incr(clave)
+
+    def limpiar(self):
+        pass
+
+
+@lru_cache(maxsize=None)
+def _adaptador(esquema) -> TypeAdapter:
+    return TypeAdapter(esquema)
+
+
+def _a_json(contenido: Any, esquema=None) -> bytes:
+    # Mismo formato que el response_model: se valida contra el esquema y se serializa en modo JSON
+    if esquema is not None:
+        adaptador = _adaptador(esquema)
+        contenido = adaptador.dump_python(adaptador.validate_python(contenido, from_attributes=True), mode="json")
+    elif isinstance(contenido, BaseModel):
+        contenido = contenido.model_dump(mode="json")
+    return dumps(contenido)
+
+
+def _respuesta(cuerpo: bytes, resultado: str) -> Response:
+    return Response(content=cuerpo, media_type="application/json", headers={"X-Cache": resultado.upper()})
+
+
+class CacheRespuestas:
+    """
+    Caché de respuestas de lectura por natillera. La clave combina la ruta, la natillera,
+    el alcance del llamador (rol o usuario) y la versión de la natillera
+    (`natilleras.version`, ver VersionService) que el endpoint ya leyó: cualquier
+    escritura la incrementa en la base, así que todos los procesos dejan de consultar
+    las entradas anteriores, que expiran solas por TTL.
+
+    Sin versión la clave usa la generación guardada en el backend, que `invalidar`
+    incrementa tras cada commit; con el backend en memoria esa generación es del
+    proceso y los demás workers no se enteran de la invalidación.
+
+    La autorización nunca se guarda: el endpoint verifica el acceso antes de consultar.
+    """
+
+    def __init__(self, backend, ttl: float, prefijo: str = "natillera"):
+        self.backend = backend
+        self.ttl = ttl
+        self.prefijo = prefijo
+
+    def _clave_generacion(self, natillera_id: int) -> str:
+        return f"{self.prefijo}:gen:{natillera_id}"
+
+    def _clave(self, ruta: str, natillera_id: int, alcance: str, version: Optional[int] = None) -> str:
+        if version is not None:
+            return f"{self.prefijo}:{ruta}:{natillera_id}:v{version}:{alcance}"
+        generacion = self.backend.get(self._clave_generacion(natillera_id)) or b"0"
+        if isinstance(generacion, bytes):
+            generacion = generacion.decode()
+        return f"{self.prefijo}:{ruta}:{natillera_id}:g{generacion}:{alcance}"
+
+    def obtener(
+        self, ruta: str, natillera_id: int, alcance: str, version: Optional[int] = None
+    ) -> Tuple[Optional[Response], str]:
+        """
+        Respuesta guardada (o None) y la clave con la que guardar el resultado calculado.
+        La clave se fija antes de consultar la base: si la natillera cambia mientras
+        tanto, el resultado queda bajo la versión anterior y no se sirve.
+        """
+        clave = self._clave(ruta, natillera_id, alcance, version)
+        cuerpo = self.backend.get(clave)
+        CACHE_CONSULTAS.inc(ruta=ruta, resultado="hit" if cuerpo is not None else "miss")
+        return (_respuesta(cuerpo, "hit") if cuerpo is not None else None), clave
+
+    def guardar(self, clave: str, contenido: Any, esquema=None, ttl: Optional[float] = None) -> Response:
+        """Serializa el contenido, lo guarda y retorna la respuesta para el cliente"""
+        cuerpo = _a_json(contenido, esquema)
+        self.backend.set(clave, cuerpo, ttl or self.ttl)
+        return _respuesta(cuerpo, "miss")
+
+    async def obtener_async(
+        self, ruta: str, natillera_id: int, alcance: str, version: Optional[int] = None
+    ) -> Tuple[Optional[Response], str]:
+        if self.backend.bloqueante:
+            return await run_in_threadpool(self.obtener, ruta, natillera_id, alcance, version)
+        return self.obtener(ruta, natillera_id, alcance, version)
+
+    async def guardar_async(self, clave: str, contenido: Any, esquema=None, ttl: Optional[float] = None) -> Response:
+        if self.backend.bloqueante:
+            return await run_in_threadpool(self.guardar, clave, contenido, esquema, ttl)
+        return self.guardar(clave, contenido, esquema, ttl)
+
+    def invalidar(self, natillera_ids: Iterable[int]):
+        """Descarta todas las respuestas guardadas de las natilleras indicadas"""
+        for natillera_id in natillera_ids:
+            self.backend.incr(self._clave_generacion(natillera_id))
+            CACHE_INVALIDACIONES.inc()
+
+
+def _crear_backend():
+    if settings.CACHE_BACKEND == "redis":
+        import redis
+        return CacheRedis(redis.Redis.from_url(settings.REDIS_URL))
+    return CacheMemoria(settings.CACHE_MAX_ENTRADAS)
+
+
+class _CacheDeshabilitada(CacheRespuestas):
+    """
+    Sin caché: siempre miss. La clave se retorna igual porque también identifica el
+    cálculo para la coalescencia, así que debe cambiar con cada escritura: lleva la
+    versión de la natillera o, sin ella, una generación local que `invalidar`
+    incrementa tras cada commit.
+    """
+
+    def __init__(self):
+        super().__init__(backend=None, ttl=0)
+        self._generaciones: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def _clave(self, ruta: str, natillera_id: int, alcance: str, version: Optional[int] = None) -> str:
+        if version is not None:
+            return f"{self.prefijo}:{ruta}:{natillera_id}:v{version}:{alcance}"
+        return f"{self.prefijo}:{ruta}:{natillera_id}:g{self._generaciones.get(natillera_id, 0)}:{alcance}"
+
+    def obtener(
+        self, ruta: str, natillera_id: int, alcance: str, version: Optional[int] = None
+    ) -> Tuple[Optional[Response], str]:
+        return None, self._clave(ruta, natillera_id, alcance, version)
+
+    async def obtener_async(
+        self, ruta: str, natillera_id: int, alcance: str, version: Optional[int] = None
+    ) -> Tuple[Optional[Response], str]:
+        return self.obtener(ruta, natillera_id, alcance, version)
+
+    def guardar(self, clave: str, contenido: Any, esquema=None, ttl: Optional[float] = None) -> Response:
+        return _respuesta(_a_json(contenido, esquema), "miss")
+
+    async def guardar_async(self, clave: str, contenido: Any, esquema=None, ttl: Optional[float] = None) -> Response:
+        return self.guardar(clave, contenido, esquema, ttl)
+
+    def invalidar(self, natillera_ids: Iterable[int]):
+        with self._lock:
+            for natillera_id in natillera_ids:
+                self._generaciones[natillera_id] = self._generaciones.get(natillera_id, 0) + 1
+
+
+cache_respuestas: CacheRespuestas = (
+    _CacheDeshabilitada() if settings.CACHE_BACKEND == "ninguno"
+    else CacheRespuestas(_crear_backend(), settings.CACHE_TTL_SEGUNDOS)
+)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidar_tras_commit(session: Session):
+    # Se invalida después del commit: antes, otra petición podría volver a guardar datos viejos
+    natillera_ids = session.info.pop(CLAVE_MODIFICADAS, None)
+    if natillera_ids:
+        cache_respuestas.invalidar(natillera_ids)
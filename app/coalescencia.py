@@ -0,0 +1,113 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict
+
+from app.config import settings
+from app.metrics import registro
+
+COALESCENCIA_LLAMADAS = registro.counter(
+    "coalescencia_llamadas_total",
+    "Llamadas por función: lider (calculó), coalescida (reusó un cálculo en curso) o timeout (dejó de esperar y calculó)",
+    ["funcion", "resultado"]
+)
+
+
+class _LiderInterrumpido(Exception):
+    """El cálculo en curso se canceló: quienes esperaban lo hacen por su cuenta"""
+
+
+class _Vuelo:
+    __slots__ = ("evento", "resultado", "error")
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+        self.error = None
+
+
+class Coalescedor:
+    """
+    Single-flight: las llamadas concurrentes con la misma clave comparten un único
+    cálculo en curso y su resultado (o su excepción). Quien espera más de `timeout`
+    segundos deja de esperar y calcula por su cuenta.
+
+    La clave debe identificar la función, la natillera, el alcance del llamador y la
+    generación de la caché (la clave de CacheRespuestas cumple todo): así una petición
+    que llega después de una escritura no recibe un cálculo iniciado antes de ella.
+    El resultado se comparte entre peticiones y no debe modificarse.
+    """
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self._vuelos: Dict[str, _Vuelo] = {}
+        self._lock = threading.Lock()
+        self._vuelos_async: Dict[str, asyncio.Future] = {}
+
+    def ejecutar(self, nombre: str, clave: str, funcion: Callable[[], Any]) -> Any:
+        """Versión para endpoints síncronos (threadpool)"""
+        if self.timeout <= 0:
+            return funcion()
+
+        with self._lock:
+            vuelo = self._vuelos.get(clave)
+            lider = vuelo is None
+            if lider:
+                vuelo = self._vuelos[clave] = _Vuelo()
+
+        if lider:
+            COALESCENCIA_LLAMADAS.inc(funcion=nombre, resultado="lider")
+            try:
+                vuelo.resultado = funcion()
+                return vuelo.resultado
+            except BaseException as e:
+                vuelo.error = e if isinstance(e, Exception) else _LiderInterrumpido()
+                raise
+            finally:
+                with self._lock:
+                    self._vuelos.pop(clave, None)
+                vuelo.evento.set()
+
+        if not vuelo.evento.wait(self.timeout) or isinstance(vuelo.error, _LiderInterrumpido):
+            COALESCENCIA_LLAMADAS.inc(funcion=nombre, resultado="timeout")
+            return funcion()
+        COALESCENCIA_LLAMADAS.inc(funcion=nombre, resultado="coalescida")
+        if vuelo.error is not None:
+            raise vuelo.error
+        return vuelo.resultado
+
+    async def ejecutar_async(self, nombre: str, clave: str, funcion: Callable[[], Awaitable[Any]]) -> Any:
+        """Versión para endpoints asíncronos; los vuelos son del event loop del proceso"""
+        if self.timeout <= 0:
+            return await funcion()
+
+        futuro = self._vuelos_async.get(clave)
+        if futuro is None:
+            futuro = asyncio.get_running_loop().create_future()
+            self._vuelos_async[clave] = futuro
+            COALESCENCIA_LLAMADAS.inc(funcion=nombre, resultado="lider")
+            try:
+                resultado = await funcion()
+            except BaseException as e:
+                futuro.set_exception(e if isinstance(e, Exception) else _LiderInterrumpido())
+                # Marca la excepción como consultada aunque nadie esté esperando
+                futuro.exception()
+                raise
+            else:
+                futuro.set_result(resultado)
+                return resultado
+            finally:
+                self._vuelos_async.pop(clave, None)
+
+        try:
+            resultado = await asyncio.wait_for(asyncio.shield(futuro), self.timeout)
+        except (asyncio.TimeoutError, _LiderInterrumpido):
+            COALESCENCIA_LLAMADAS.inc(funcion=nombre, resultado="timeout")
+            return await funcion()
+        except Exception:
+            COALESCENCIA_LLAMADAS.inc(funcion=nombre, resultado="coalescida")
+            raise
+        COALESCENCIA_LLAMADAS.inc(funcion=nombre, resultado="coalescida")
+        return resultado
+
+
+coalescedor = Coalescedor(settings.COALESCENCIA_TIMEOUT_SEGUNDOS)
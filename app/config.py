@@ -3,11 +3,69 @@ from typing import Optional
 
 class Settings(BaseSettings):
     DATABASE_URL: str
+    # Réplicas de lectura separadas por comas (vacío = todo va al primario)
+    DATABASE_REPLICA_URLS: str = ""
+    # Segundos que las lecturas de un cliente siguen en el primario tras una escritura
+    REPLICA_STICKY_SEGUNDOS: float = 5.0
+    # Segundos que una réplica caída queda fuera de rotación antes de reintentarla
+    REPLICA_REINTENTO_SEGUNDOS: float = 30.0
+    # Retraso máximo de replicación tolerado antes de enviar las lecturas al primario
+    REPLICA_MAX_LAG_SEGUNDOS: float = 10.0
+    # Pool de conexiones de cada engine (por worker)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    # Conexiones que puede abrir la app en total contra cada servidor (max_connections
+    # de Postgres menos las reservadas); si se define, los pools se reducen para que
+    # workers x engines x (pool + overflow) no lo supere. 0 = sin límite
+    DB_MAX_CONEXIONES: int = 0
+    # Número de workers del servidor (lo define gunicorn.conf.py)
+    WEB_CONCURRENCY: int = 1
+    # Umbral en milisegundos para registrar una sentencia como lenta
+    DB_CONSULTA_LENTA_MS: float = 200.0
+    # Consultas máximas por petición antes de advertir (0 = sin límite)
+    DB_PRESUPUESTO_CONSULTAS: int = 30
+    # Veces que una misma sentencia puede repetirse con parámetros distintos antes de marcarla como N+1
+    DB_N_MAS_1_UMBRAL: int = 5
+    # En pruebas: lanzar error en lugar de solo advertir al exceder el presupuesto o detectar N+1
+    DB_PRESUPUESTO_ESTRICTO: bool = False
+    # /metrics exige "Authorization: Bearer <METRICS_TOKEN>"; sin token queda cerrado
+    # salvo que METRICS_PUBLICO lo abra explícitamente (expone sentencias SQL y tablas)
+    METRICS_TOKEN: Optional[str] = None
+    METRICS_PUBLICO: bool = False
+    # Emails (separados por comas) con acceso a los endpoints /admin
+    ADMIN_EMAILS: str = ""
+    # Perfiles por muestreo que se conservan en memoria (los más recientes)
+    PERFILES_MAX: int = 50
+    # Caché de respuestas por natillera: "memoria" (por proceso), "redis" (compartida) o "ninguno"
+    CACHE_BACKEND: str = "memoria"
+    CACHE_TTL_SEGUNDOS: float = 60.0
+    CACHE_MAX_ENTRADAS: int = 10000
+    REDIS_URL: str = "redis://localhost:6379/0"
+    # Segundos que una petición espera el cálculo idéntico en curso de otra antes de
+    # hacerlo por su cuenta (single-flight de balance, resumen y participación; 0 = deshabilitado)
+    COALESCENCIA_TIMEOUT_SEGUNDOS: float = 5.0
+    # Compresión de respuestas (brotli si el cliente lo acepta y está instalado, si no gzip)
+    COMPRESION_MIN_BYTES: int = 1024
+    COMPRESION_NIVEL_GZIP: int = 6
+    COMPRESION_NIVEL_BROTLI: int = 4
+    COMPRESION_TIPOS: str = "application/json,text/plain,text/csv,text/html"
+    # Logs: nivel global, niveles por módulo ("modulo=NIVEL,..."), formato ("json" o "texto")
+    LOG_NIVEL: str = "INFO"
+    LOG_NIVELES: str = ""
+    LOG_FORMATO: str = "json"
+    # Fracción de los eventos DEBUG que se registran (1.0 = todos)
+    LOG_MUESTREO_DEBUG: float = 0.1
     FIREBASE_CREDENTIALS_PATH: Optional[str] = None
     MINIO_ENDPOINT: Optional[str] = None
     MINIO_ACCESS_KEY: Optional[str] = None
     MINIO_SECRET_KEY: Optional[str] = None
     MINIO_BUCKET_NAME: Optional[str] = None
+    # Generación de miniaturas de archivos adjuntos en segundo plano
+    MINIATURAS_HABILITADAS: bool = True
+    MINIATURAS_WORKERS: int = 1
+    # Inicializar al arrancar cada worker lo que se carga de forma perezosa (Firebase,
+    # cliente S3, conexiones del pool) en vez de hacerlo en la primera petición
+    PRECALENTAR: bool = False
     # Mantener SECRET_KEY para otras funcionalidades si es necesario
     SECRET_KEY: str = "fallback-secret-key"
 
@@ -1,17 +1,277 @@
-from sqlalchemy import create_engine
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from app.config import settings
+from app.instrumentacion_db import AsyncQueuePoolMedido, QueuePoolMedido, instrumentar_engine
+
+logger = logging.getLogger(__name__)
+
+
+def _dimensionar_pool() -> Tuple[int, int]:
+    """
+    pool_size y max_overflow de cada engine. Con DB_MAX_CONEXIONES, las conexiones
+    permitidas se reparten entre los workers (WEB_CONCURRENCY) y los dos engines de
+    cada uno (síncrono y asíncrono), conservando la proporción configurada.
+    """
+    tamano, extra = settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW
+    if settings.DB_MAX_CONEXIONES <= 0:
+        return tamano, extra
+    por_engine = settings.DB_MAX_CONEXIONES // (max(1, settings.WEB_CONCURRENCY) * 2)
+    if por_engine < 2:
+        # Con una sola conexión por engine las peticiones concurrentes y el worker de
+        # miniaturas esperan turno y agotan pool_timeout: se rechaza en lugar de arrancar así
+        raise RuntimeError(
+            f"DB_MAX_CONEXIONES={settings.DB_MAX_CONEXIONES} no alcanza para "
+            f"{settings.WEB_CONCURRENCY} workers: se necesitan al menos 2 conexiones por engine "
+            f"({4 * max(1, settings.WEB_CONCURRENCY)} en total); reduzca WEB_CONCURRENCY o "
+            f"aumente DB_MAX_CONEXIONES"
+        )
+    if tamano + extra <= por_engine:
+        return tamano, extra
+    nuevo_tamano = max(1, round(por_engine * tamano / (tamano + extra)))
+    return nuevo_tamano, por_engine - nuevo_tamano
+
+
+POOL_SIZE, POOL_MAX_OVERFLOW = _dimensionar_pool()
 
 # Configurar engine con pool de conexiones y reconexión automática
 engine = create_engine(
     settings.DATABASE_URL,
     pool_pre_ping=True,  # Verifica la conexión antes de usarla
     pool_recycle=3600,   # Recicla conexiones cada hora
-    pool_size=10,        # Tamaño del pool
-    max_overflow=20      # Conexiones adicionales permitidas
+    pool_size=POOL_SIZE,               # Tamaño del pool
+    max_overflow=POOL_MAX_OVERFLOW,    # Conexiones adicionales permitidas
+    poolclass=QueuePoolMedido,
+    pool_logging_name="primario"
+)
+
+
+def _url_async(url: str) -> str:
+    """Convierte la URL de conexión de PostgreSQL para usar el driver asyncpg"""
+    for prefijo in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefijo):
+            return "postgresql+asyncpg://" + url[len(prefijo):]
+    return url
+
+
+# Engine asíncrono (asyncpg) para los endpoints de lectura más usados
+async_engine = create_async_engine(
+    _url_async(settings.DATABASE_URL),
+    pool_pre_ping=True,
+    pool_recycle=3600,
+    pool_size=POOL_SIZE,
+    max_overflow=POOL_MAX_OVERFLOW,
+    poolclass=AsyncQueuePoolMedido,
+    pool_logging_name="primario-async"
+)
+
+
+# ---------------------------------------------------------------------------
+# Réplicas de lectura
+# ---------------------------------------------------------------------------
+
+REPLICA_URLS: List[str] = [u.strip() for u in settings.DATABASE_REPLICA_URLS.split(",") if u.strip()]
+
+replica_engines: List[Engine] = [
+    create_engine(
+        url, pool_pre_ping=True, pool_recycle=3600, pool_size=POOL_SIZE, max_overflow=POOL_MAX_OVERFLOW,
+        poolclass=QueuePoolMedido, pool_logging_name=f"replica-{i}"
+    )
+    for i, url in enumerate(REPLICA_URLS)
+]
+async_replica_engines = [
+    create_async_engine(
+        _url_async(url), pool_pre_ping=True, pool_recycle=3600, pool_size=POOL_SIZE, max_overflow=POOL_MAX_OVERFLOW,
+        poolclass=AsyncQueuePoolMedido, pool_logging_name=f"replica-{i}-async"
+    )
+    for i, url in enumerate(REPLICA_URLS)
+]
+
+# Métricas de pool y de sentencias para /metrics
+instrumentar_engine(engine, "primario")
+instrumentar_engine(async_engine.sync_engine, "primario-async")
+for _indice, _replica in enumerate(replica_engines):
+    instrumentar_engine(_replica, f"replica-{_indice}")
+for _indice, _replica in enumerate(async_replica_engines):
+    instrumentar_engine(_replica.sync_engine, f"replica-{_indice}-async")
+
+# Indica si la unidad de trabajo actual (petición GET o servicio marcado) solo lee
+_solo_lectura: ContextVar[bool] = ContextVar("solo_lectura", default=False)
+
+
+@contextmanager
+def solo_lectura(activo: bool = True):
+    """
+    Marca el bloque como de solo lectura para que las sesiones lo envíen a una réplica.
+    Puede usarse en servicios: `with solo_lectura(): ...`
+    """
+    token = _solo_lectura.set(activo)
+    try:
+        yield
+    finally:
+        _solo_lectura.reset(token)
+
+
+class EstadoReplicas:
+    """
+    Salud de las réplicas y ventanas de lectura-tras-escritura por cliente.
+    Una réplica con errores de conexión o con demasiado retraso sale de rotación
+    durante REPLICA_REINTENTO_SEGUNDOS y sus lecturas van al primario.
+    """
+
+    def __init__(self, total: int):
+        self._caida_hasta: List[float] = [0.0] * total
+        self._escrituras: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._monitor: Optional[threading.Thread] = None
+
+    def disponibles(self) -> List[int]:
+        ahora = time.monotonic()
+        return [i for i, hasta in enumerate(self._caida_hasta) if hasta <= ahora]
+
+    def marcar_caida(self, indice: int):
+        self._caida_hasta[indice] = time.monotonic() + settings.REPLICA_REINTENTO_SEGUNDOS
+        self.iniciar_monitor()
+
+    def marcar_sana(self, indice: int):
+        self._caida_hasta[indice] = 0.0
+
+    def registrar_escritura(self, clave: Optional[str]):
+        """Mantiene las lecturas del cliente en el primario durante la ventana de stickiness"""
+        if not clave:
+            return
+        with self._lock:
+            ahora = time.monotonic()
+            self._escrituras[clave] = ahora + settings.REPLICA_STICKY_SEGUNDOS
+            # Limpieza ocasional de ventanas vencidas
+            if len(self._escrituras) > 10000:
+                self._escrituras = {k: v for k, v in self._escrituras.items() if v > ahora}
+
+    def escribio_recientemente(self, clave: Optional[str]) -> bool:
+        if not clave:
+            return False
+        hasta = self._escrituras.get(clave)
+        return hasta is not None and hasta > time.monotonic()
+
+    def iniciar_monitor(self):
+        """Inicia (una vez) el hilo que revisa las réplicas caídas o retrasadas"""
+        with self._lock:
+            if self._monitor is not None and self._monitor.is_alive():
+                return
+            self._monitor = threading.Thread(target=self._vigilar, name="monitor-replicas", daemon=True)
+            self._monitor.start()
+
+    def _vigilar(self):
+        while True:
+            time.sleep(max(1.0, settings.REPLICA_REINTENTO_SEGUNDOS / 3))
+            for indice, replica in enumerate(replica_engines):
+                try:
+                    with replica.connect() as conn:
+                        retraso = conn.execute(text(
+                            "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                            "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+                        )).scalar() or 0
+                    if float(retraso) > settings.REPLICA_MAX_LAG_SEGUNDOS:
+                        self.marcar_caida(indice)
+                    else:
+                        self.marcar_sana(indice)
+                except Exception as e:
+                    logger.warning("Réplica %s no disponible: %s", indice, e)
+                    self.marcar_caida(indice)
+
+
+estado_replicas = EstadoReplicas(len(REPLICA_URLS))
+
+
+def _registrar_errores_replica(replica: Engine, indice: int):
+    @event.listens_for(replica, "handle_error")
+    def _al_fallar(contexto):
+        # Errores de conexión sacan la réplica de rotación de inmediato
+        if contexto.is_disconnect or contexto.connection is None:
+            estado_replicas.marcar_caida(indice)
+
+
+for _indice, _replica in enumerate(replica_engines):
+    _registrar_errores_replica(_replica, _indice)
+for _indice, _replica in enumerate(async_replica_engines):
+    _registrar_errores_replica(_replica.sync_engine, _indice)
+
+if REPLICA_URLS:
+    estado_replicas.iniciar_monitor()
+
+
+def reiniciar_tras_fork():
+    """
+    Para servidores que importan la app antes de crear los workers (gunicorn con
+    preload): descarta las conexiones heredadas del proceso padre sin cerrarlas
+    (siguen siendo del padre) y reinicia el monitor de réplicas, cuyo hilo no
+    sobrevive al fork.
+    """
+    engine.dispose(close=False)
+    async_engine.sync_engine.dispose(close=False)
+    for replica in replica_engines:
+        replica.dispose(close=False)
+    for replica in async_replica_engines:
+        replica.sync_engine.dispose(close=False)
+    if REPLICA_URLS:
+        estado_replicas.iniciar_monitor()
+
+
+class RoutingSession(Session):
+    """
+    Sesión que envía las lecturas de unidades de trabajo de solo lectura a una réplica sana
+    y todo lo demás (escrituras, flush, sesiones que ya escribieron) al primario.
+    La réplica se elige una vez por sesión para que la petición vea un estado consistente.
+    """
+
+    _primario: Engine = engine
+    _replicas: List[Engine] = replica_engines
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self._replicas and not self._flushing and _solo_lectura.get() and not self.info.get("escritura"):
+            indice = self.info.get("replica")
+            if indice is None or indice not in estado_replicas.disponibles():
+                disponibles = estado_replicas.disponibles()
+                indice = random.choice(disponibles) if disponibles else None
+                self.info["replica"] = indice
+            if indice is not None:
+                return self._replicas[indice]
+        return self._primario
+
+
+class AsyncRoutingSession(RoutingSession):
+    """Variante de RoutingSession para AsyncSession (usa los sync_engine de los engines async)"""
+
+    _primario: Engine = async_engine.sync_engine
+    _replicas: List[Engine] = [e.sync_engine for e in async_replica_engines]
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _marcar_escritura(session, flush_context):
+    # Tras escribir, el resto de la sesión lee del primario (lee sus propias escrituras)
+    session.info["escritura"] = True
+
+
+# expire_on_commit=False: tras el commit los objetos conservan los valores que se
+# escribieron (los defaults son del lado de Python y la PK vuelve con RETURNING), así
+# que las respuestas se arman sin un SELECT extra por refresh; en async además evita
+# cargas implícitas, que no están permitidas
+SessionLocal = sessionmaker(
+    autocommit=False, autoflush=False, expire_on_commit=False, bind=engine, class_=RoutingSession
+)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False, sync_session_class=AsyncRoutingSession
 )
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
@@ -21,3 +281,7 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
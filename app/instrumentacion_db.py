@@ -0,0 +1,182 @@
+import re
+import time
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+from functools import lru_cache
+from typing import Callable, Deque, Dict, List, Optional, Set, Union
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from app.config import settings
+from app.metrics import registro
+
+# Engines instrumentados por nombre ("primario", "replica-0", ...)
+_engines: Dict[str, Engine] = {}
+
+
+def _estado_pools(metodo: str):
+    for nombre, engine in list(_engines.items()):
+        pool = engine.pool
+        if hasattr(pool, metodo):
+            # overflow() arranca en -pool_size: solo interesan las conexiones extra en uso
+            yield {"pool": nombre}, max(0, getattr(pool, metodo)())
+
+
+POOL_ESPERA = registro.histogram(
+    "db_pool_checkout_seconds", "Tiempo esperando una conexión del pool", ["pool"]
+)
+POOL_TIMEOUTS = registro.counter(
+    "db_pool_timeouts_total", "Checkouts que agotaron el pool_timeout (pool agotado)", ["pool"]
+)
+registro.gauge(
+    "db_pool_in_use", "Conexiones entregadas y aún no devueltas", ["pool"],
+    funcion=lambda: _estado_pools("checkedout")
+)
+registro.gauge(
+    "db_pool_overflow", "Conexiones abiertas por encima de pool_size", ["pool"],
+    funcion=lambda: _estado_pools("overflow")
+)
+registro.gauge(
+    "db_pool_idle", "Conexiones disponibles en el pool", ["pool"],
+    funcion=lambda: _estado_pools("checkedin")
+)
+registro.gauge(
+    "db_pool_size", "Tamaño configurado del pool", ["pool"],
+    funcion=lambda: _estado_pools("size")
+)
+CONSULTA_DURACION = registro.histogram(
+    "db_statement_seconds", "Duración de las sentencias SQL por sentencia normalizada",
+    ["pool", "sql"], max_series=500
+)
+CONSULTAS_LENTAS = registro.counter(
+    "db_slow_statements_total", "Sentencias por encima de DB_CONSULTA_LENTA_MS", ["pool"]
+)
+
+# Últimas consultas lentas (más reciente al final)
+consultas_lentas: Deque[dict] = deque(maxlen=100)
+
+
+class _MedirCheckout:
+    """Mide la espera de checkout de conexiones y cuenta los timeouts del pool"""
+
+    def _do_get(self):
+        nombre = self.logging_name or "db"
+        inicio = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            POOL_TIMEOUTS.inc(pool=nombre)
+            raise
+        finally:
+            POOL_ESPERA.observe(time.perf_counter() - inicio, pool=nombre)
+
+
+class QueuePoolMedido(_MedirCheckout, QueuePool):
+    pass
+
+
+class AsyncQueuePoolMedido(_MedirCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+_ESPACIOS = re.compile(r"\s+")
+_PARAMETROS = re.compile(r"%\(\w+\)s|\$\d+|%s|\?")
+_LITERALES = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LISTAS_IN = re.compile(r"\bIN \((?:\?(?:, )?)+\)", re.IGNORECASE)
+
+
+@lru_cache(maxsize=4096)
+def normalizar_sql(sql: str) -> str:
+    """Reduce una sentencia a su forma sin parámetros ni literales para agruparla"""
+    sql = _ESPACIOS.sub(" ", sql).strip()
+    sql = _PARAMETROS.sub("?", sql)
+    sql = _LITERALES.sub("?", sql)
+    sql = _LISTAS_IN.sub("IN (...)", sql)
+    return sql[:300]
+
+
+class PresupuestoConsultasExcedido(Exception):
+    """Se lanza en modo estricto cuando una petición supera el presupuesto de consultas o repite una consulta (N+1)"""
+
+
+class EstadisticasConsultas:
+    """Conteo de sentencias y tiempo de base de datos de una petición"""
+
+    def __init__(self, ruta: Union[str, Callable[[], str]] = ""):
+        # Un callable permite resolver la ruta cuando se necesita (p. ej. tras el enrutamiento)
+        self._ruta = ruta
+        self.total = 0
+        self.duracion = 0.0
+        # sentencia normalizada -> huellas de los parámetros distintos con que se ejecutó
+        self._parametros: Dict[str, Set[int]] = {}
+        self.repetidas: Dict[str, int] = {}
+
+    def antes(self, sql: str, parametros):
+        """Aplica el presupuesto y la detección de N+1 antes de ejecutar la sentencia"""
+        self.total += 1
+        huellas = self._parametros.setdefault(sql, set())
+        if len(huellas) <= settings.DB_N_MAS_1_UMBRAL:
+            huellas.add(hash(repr(parametros)))
+        if len(huellas) >= settings.DB_N_MAS_1_UMBRAL:
+            self.repetidas[sql] = len(huellas)
+            if settings.DB_PRESUPUESTO_ESTRICTO:
+                raise PresupuestoConsultasExcedido(
+                    f"Posible N+1 en {self.ruta}: la misma consulta se ejecutó con "
+                    f"{len(huellas)} parámetros distintos: {sql}"
+                )
+        presupuesto = settings.DB_PRESUPUESTO_CONSULTAS
+        if presupuesto and self.total > presupuesto and settings.DB_PRESUPUESTO_ESTRICTO:
+            raise PresupuestoConsultasExcedido(
+                f"{self.ruta} superó el presupuesto de {presupuesto} consultas"
+            )
+
+    @property
+    def ruta(self) -> str:
+        return self._ruta() if callable(self._ruta) else self._ruta
+
+    def excede_presupuesto(self) -> bool:
+        return bool(settings.DB_PRESUPUESTO_CONSULTAS) and self.total > settings.DB_PRESUPUESTO_CONSULTAS
+
+
+# Estadísticas de la petición en curso (las fija el middleware de consultas)
+estadisticas_peticion: ContextVar[Optional[EstadisticasConsultas]] = ContextVar("estadisticas_peticion", default=None)
+
+
+def instrumentar_engine(engine: Engine, nombre: str):
+    """Registra los eventos de medición de sentencias sobre un engine (sync o sync_engine de uno async)"""
+    _engines[nombre] = engine
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        estadisticas = estadisticas_peticion.get()
+        if estadisticas is not None:
+            estadisticas.antes(normalizar_sql(statement), parameters)
+        context._inicio_medicion = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _despues(conn, cursor, statement, parameters, context, executemany):
+        inicio = getattr(context, "_inicio_medicion", None)
+        if inicio is None:
+            return
+        duracion = time.perf_counter() - inicio
+        sql = normalizar_sql(statement)
+        estadisticas = estadisticas_peticion.get()
+        if estadisticas is not None:
+            estadisticas.duracion += duracion
+        CONSULTA_DURACION.observe(duracion, pool=nombre, sql=sql)
+        if duracion * 1000 >= settings.DB_CONSULTA_LENTA_MS:
+            CONSULTAS_LENTAS.inc(pool=nombre)
+            consultas_lentas.append({
+                "pool": nombre,
+                "sql": sql,
+                "duracion_ms": round(duracion * 1000, 2),
+                "fecha": datetime.utcnow().isoformat(),
+            })
+
+
+def obtener_consultas_lentas() -> List[dict]:
+    return list(reversed(consultas_lentas))
@@ -0,0 +1,184 @@
+import atexit
+import copy
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+
+import orjson
+
+from app.config import settings
+
+# ID de la petición en curso; se copia al registro antes de encolarlo
+id_peticion: ContextVar[Optional[str]] = ContextVar("id_peticion", default=None)
+
+# Atributos propios de LogRecord: el resto son campos pasados con `extra=`
+_ATRIBUTOS_RECORD = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id", "muestra"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class FiltroPeticion(logging.Filter):
+    """Agrega el ID de la petición al registro (se ejecuta en el hilo que registra)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = id_peticion.get()
+        return True
+
+
+class FiltroMuestreo(logging.Filter):
+    """
+    Conserva solo una fracción de los eventos de alto volumen: los DEBUG según
+    LOG_MUESTREO_DEBUG, o cualquier registro con `extra={"muestra": fraccion}`.
+    Se descartan antes de encolarlos, así no cuestan formateo ni E/S.
+    """
+
+    def __init__(self, fraccion_debug: float):
+        super().__init__()
+        self.fraccion_debug = fraccion_debug
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        fraccion = getattr(record, "muestra", None)
+        if fraccion is None:
+            if record.levelno > logging.DEBUG:
+                return True
+            fraccion = self.fraccion_debug
+        return fraccion >= 1 or random.random() < fraccion
+
+
+class _Encolador(logging.handlers.QueueHandler):
+    """QueueHandler que conserva la traza de la excepción en exc_text en vez de mezclarla en el mensaje"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class FormateadorJSON(logging.Formatter):
+    """Un objeto JSON por línea con nivel, logger, mensaje, request_id y los campos de `extra`"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        datos = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "mensaje": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+        }
+        for clave, valor in vars(record).items():
+            if clave not in _ATRIBUTOS_RECORD:
+                datos[clave] = valor
+        if record.exc_text:
+            datos["excepcion"] = record.exc_text
+        return orjson.dumps(datos, default=str, option=orjson.OPT_UTC_Z).decode()
+
+
+class FormateadorTexto(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s [%(name)s] [%(request_id)s] %(message)s")
+
+
+def _niveles_por_modulo() -> dict:
+    """LOG_NIVELES="app.services.sorteo_service=DEBUG,sqlalchemy.engine=WARNING" """
+    niveles = {}
+    for parte in settings.LOG_NIVELES.split(","):
+        modulo, _, nivel = parte.partition("=")
+        if modulo.strip() and nivel.strip():
+            niveles[modulo.strip()] = nivel.strip().upper()
+    return niveles
+
+
+def configurar_logs():
+    """
+    Configura el logging de la aplicación: los handlers solo encolan el registro y un
+    hilo (QueueListener) lo formatea y escribe, así registrar no bloquea la petición.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    salida = logging.StreamHandler(sys.stdout)
+    salida.setFormatter(FormateadorJSON() if settings.LOG_FORMATO == "json" else FormateadorTexto())
+
+    cola: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    encolador = _Encolador(cola)
+    encolador.addFilter(FiltroPeticion())
+    encolador.addFilter(FiltroMuestreo(settings.LOG_MUESTREO_DEBUG))
+
+    raiz = logging.getLogger()
+    for handler in list(raiz.handlers):
+        raiz.removeHandler(handler)
+    raiz.addHandler(encolador)
+    raiz.setLevel(settings.LOG_NIVEL.upper())
+
+    # Los loggers de uvicorn traen sus propios handlers: se redirigen a la cola
+    for nombre in ("uvicorn", "uvicorn.error", "uvicorn.access", "gunicorn.error"):
+        logger = logging.getLogger(nombre)
+        logger.handlers = []
+        logger.propagate = True
+
+    for modulo, nivel in _niveles_por_modulo().items():
+        logging.getLogger(modulo).setLevel(nivel)
+
+    _listener = logging.handlers.QueueListener(cola, salida, respect_handler_level=True)
+    _listener.start()
+    atexit.register(detener_logs)
+
+
+def detener_logs():
+    """Vacía la cola y detiene el hilo de escritura"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def reiniciar_tras_fork():
+    """El hilo del QueueListener no sobrevive al fork: el proceso hijo crea el suyo"""
+    global _listener
+    _listener = None
+    configurar_logs()
+
+
+class IdPeticionMiddleware:
+    """
+    Asigna a cada petición un ID (el header X-Request-ID recibido o uno nuevo), lo deja
+    disponible para los logs y lo devuelve en la respuesta.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        valor = None
+        for nombre, contenido in scope.get("headers", []):
+            if nombre == b"x-request-id":
+                # Se limita el tamaño: el valor viene del cliente
+                valor = contenido.decode("latin-1")[:64]
+                break
+        valor = valor or uuid.uuid4().hex
+        token = id_peticion.set(valor)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", valor.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            id_peticion.reset(token)
@@ -1,6 +1,17 @@
 from fastapi import FastAPI
+from app.logs import IdPeticionMiddleware, configurar_logs, detener_logs
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import auth, users, natilleras, aportes, invitaciones, transacciones, prestamos, politicas, archivos_adjuntos, sorteos
+from app.database import async_engine
+from app.middleware import CompresionMiddleware, ConsultasMiddleware, RutaLecturaMiddleware
+from app.perfilador import PerfiladoMiddleware
+from app.config import settings
+from app.precalentamiento import precalentar
+# Registra los listeners que incrementan la versión de las natilleras en cada commit
+from app.services import version_service  # noqa: F401
+from app.routers import auth, users, natilleras, aportes, invitaciones, transacciones, prestamos, politicas, archivos_adjuntos, sorteos, metrics, perfiles
+
+# Logs estructurados no bloqueantes (antes de crear la app para capturar todo)
+configurar_logs()
 
 app = FastAPI(
     title="Natillera API",
@@ -17,6 +28,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Enviar las lecturas a las réplicas configuradas
+app.add_middleware(RutaLecturaMiddleware)
+
+# Conteo de consultas por petición (Server-Timing) y detección de N+1
+app.add_middleware(ConsultasMiddleware)
+
+# Compresión de las respuestas (comprime ya con todos los headers)
+app.add_middleware(CompresionMiddleware)
+
+# Perfilado por muestreo bajo demanda (/admin/perfiles); apagado cuesta una comparación por petición
+app.add_middleware(PerfiladoMiddleware)
+
+# ID de petición para los logs (la más externa: cubre también a los demás middlewares)
+app.add_middleware(IdPeticionMiddleware)
+
 # Montar archivos estáticos - Comentado porque el frontend está separado
 # app.mount("/static", StaticFiles(directory="frontend"), name="static")
 
@@ -31,6 +57,20 @@ app.include_router(prestamos.router)
 app.include_router(politicas.router)
 app.include_router(archivos_adjuntos.router)
 app.include_router(sorteos.router)
+app.include_router(metrics.router)
+app.include_router(perfiles.router)
+
+@app.on_event("startup")
+async def precalentar_worker():
+    """Inicializa Firebase, S3 y el pool de conexiones antes de recibir tráfico si PRECALENTAR está activo"""
+    if settings.PRECALENTAR:
+        await precalentar()
+
+@app.on_event("shutdown")
+async def cerrar_conexiones():
+    """Cierra las conexiones del pool asíncrono al apagar el servidor"""
+    await async_engine.dispose()
+    detener_logs()
 
 @app.get("/")
 def read_root():
@@ -0,0 +1,184 @@
+import bisect
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Buckets por defecto en segundos (de 1 ms a 10 s)
+BUCKETS_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escapar(valor: str) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _formatear_labels(nombres: Tuple[str, ...], valores: Tuple[str, ...], extra: str = "") -> str:
+    partes = [f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores)]
+    if extra:
+        partes.append(extra)
+    return "{" + ",".join(partes) + "}" if partes else ""
+
+
+def _formatear_numero(valor: float) -> str:
+    if valor == float("inf"):
+        return "+Inf"
+    if float(valor).is_integer():
+        return str(int(valor))
+    return repr(float(valor))
+
+
+class _Metrica:
+    tipo = ""
+
+    def __init__(self, nombre: str, ayuda: str, labels: Iterable[str] = (), max_series: int = 1000):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.labels = tuple(labels)
+        # Límite de series para que labels de alta cardinalidad no agoten la memoria
+        self.max_series = max_series
+        self._lock = threading.Lock()
+
+    def _clave(self, labels: Dict[str, str], series: dict) -> Tuple[str, ...]:
+        clave = tuple(str(labels.get(n, "")) for n in self.labels)
+        if clave not in series and len(series) >= self.max_series:
+            clave = tuple("otros" for _ in self.labels)
+        return clave
+
+    def encabezado(self) -> List[str]:
+        return [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+
+
+class Counter(_Metrica):
+    tipo = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._valores: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, cantidad: float = 1.0, **labels):
+        with self._lock:
+            clave = self._clave(labels, self._valores)
+            self._valores[clave] = self._valores.get(clave, 0.0) + cantidad
+
+    def valor(self, **labels) -> float:
+        return self._valores.get(tuple(str(labels.get(n, "")) for n in self.labels), 0.0)
+
+    def series(self) -> List[Dict[str, str]]:
+        """Labels de cada serie registrada"""
+        with self._lock:
+            claves = list(self._valores)
+        return [dict(zip(self.labels, clave)) for clave in claves]
+
+    def exportar(self) -> List[str]:
+        with self._lock:
+            items = list(self._valores.items())
+        return self.encabezado() + [
+            f"{self.nombre}{_formatear_labels(self.labels, clave)} {_formatear_numero(v)}" for clave, v in items
+        ]
+
+
+class Gauge(_Metrica):
+    """Gauge cuyo valor se fija directamente o se calcula al exportar con `funcion`"""
+
+    tipo = "gauge"
+
+    def __init__(self, *args, funcion: Optional[Callable[[], Iterable[Tuple[Dict[str, str], float]]]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._valores: Dict[Tuple[str, ...], float] = {}
+        self._funcion = funcion
+
+    def set(self, valor: float, **labels):
+        with self._lock:
+            self._valores[self._clave(labels, self._valores)] = valor
+
+    def inc(self, cantidad: float = 1.0, **labels):
+        with self._lock:
+            clave = self._clave(labels, self._valores)
+            self._valores[clave] = self._valores.get(clave, 0.0) + cantidad
+
+    def dec(self, cantidad: float = 1.0, **labels):
+        self.inc(-cantidad, **labels)
+
+    def exportar(self) -> List[str]:
+        if self._funcion is not None:
+            items = [(tuple(str(l.get(n, "")) for n in self.labels), v) for l, v in self._funcion()]
+        else:
+            with self._lock:
+                items = list(self._valores.items())
+        return self.encabezado() + [
+            f"{self.nombre}{_formatear_labels(self.labels, clave)} {_formatear_numero(v)}" for clave, v in items
+        ]
+
+
+class Histogram(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, *args, buckets: Tuple[float, ...] = BUCKETS_LATENCIA, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # clave -> [conteos por bucket..., suma, total]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, valor: float, **labels):
+        indice = bisect.bisect_left(self.buckets, valor)
+        with self._lock:
+            clave = self._clave(labels, self._series)
+            serie = self._series.get(clave)
+            if serie is None:
+                serie = self._series[clave] = [0] * len(self.buckets) + [0.0, 0]
+            if indice < len(self.buckets):
+                serie[indice] += 1
+            serie[-2] += valor
+            serie[-1] += 1
+
+    def exportar(self) -> List[str]:
+        with self._lock:
+            items = [(clave, list(serie)) for clave, serie in self._series.items()]
+        lineas = self.encabezado()
+        for clave, serie in items:
+            acumulado = 0
+            for limite, conteo in zip(self.buckets, serie):
+                acumulado += conteo
+                etiquetas = _formatear_labels(self.labels, clave, f'le="{_formatear_numero(limite)}"')
+                lineas.append(f"{self.nombre}_bucket{etiquetas} {acumulado}")
+            etiquetas = _formatear_labels(self.labels, clave, 'le="+Inf"')
+            lineas.append(f"{self.nombre}_bucket{etiquetas} {serie[-1]}")
+            etiquetas = _formatear_labels(self.labels, clave)
+            lineas.append(f"{self.nombre}_sum{etiquetas} {_formatear_numero(serie[-2])}")
+            lineas.append(f"{self.nombre}_count{etiquetas} {serie[-1]}")
+        return lineas
+
+
+class Registro:
+    """Registro de métricas del proceso, exportable en formato de texto de Prometheus"""
+
+    def __init__(self):
+        self._metricas: Dict[str, _Metrica] = {}
+        self._lock = threading.Lock()
+
+    def _registrar(self, metrica: _Metrica) -> _Metrica:
+        with self._lock:
+            existente = self._metricas.get(metrica.nombre)
+            if existente is not None:
+                return existente
+            self._metricas[metrica.nombre] = metrica
+            return metrica
+
+    def counter(self, nombre: str, ayuda: str, labels: Iterable[str] = (), **kwargs) -> Counter:
+        return self._registrar(Counter(nombre, ayuda, labels, **kwargs))
+
+    def gauge(self, nombre: str, ayuda: str, labels: Iterable[str] = (), **kwargs) -> Gauge:
+        return self._registrar(Gauge(nombre, ayuda, labels, **kwargs))
+
+    def histogram(self, nombre: str, ayuda: str, labels: Iterable[str] = (), **kwargs) -> Histogram:
+        return self._registrar(Histogram(nombre, ayuda, labels, **kwargs))
+
+    def exportar(self) -> str:
+        with self._lock:
+            metricas = list(self._metricas.values())
+        lineas: List[str] = []
+        for metrica in metricas:
+            lineas.extend(metrica.exportar())
+        return "\n".join(lineas) + "\n"
+
+
+# Registro compartido por el proceso
+registro = Registro()
@@ -0,0 +1,235 @@
+import hashlib
+import logging
+import time
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from app.config import settings
+from app.database import estado_replicas, solo_lectura, REPLICA_URLS
+from app.instrumentacion_db import EstadisticasConsultas, estadisticas_peticion
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él solo se ofrece gzip
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+METODOS_LECTURA = {"GET", "HEAD", "OPTIONS"}
+
+
+def clave_cliente(scope) -> Optional[str]:
+    """Identificador estable del cliente a partir del header Authorization (sin guardar el token)"""
+    for nombre, valor in scope.get("headers", []):
+        if nombre == b"authorization":
+            return hashlib.sha256(valor).hexdigest()[:32]
+    return None
+
+
+def plantilla_ruta(scope) -> str:
+    """
+    Método y plantilla de la ruta que atendió la petición ("GET /natilleras/{natillera_id}"),
+    para agrupar las peticiones a un mismo endpoint. Antes del enrutamiento, o si ninguna
+    ruta coincidió, usa la ruta literal.
+    """
+    route = scope.get("route")
+    ruta = getattr(route, "path_format", None) or scope["path"]
+    return f"{scope['method']} {ruta}"
+
+
+class RutaLecturaMiddleware:
+    """
+    Marca las peticiones de lectura como de solo lectura para que sus sesiones usen
+    las réplicas. Tras una escritura exitosa, las lecturas del mismo cliente siguen en
+    el primario durante REPLICA_STICKY_SEGUNDOS (lectura de sus propias escrituras).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not REPLICA_URLS:
+            await self.app(scope, receive, send)
+            return
+
+        clave = clave_cliente(scope)
+        if scope["method"] in METODOS_LECTURA:
+            with solo_lectura(not estado_replicas.escribio_recientemente(clave)):
+                await self.app(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            # También si falló: pudo haber confirmado cambios antes del error
+            estado_replicas.registrar_escritura(clave)
+
+
+class ConsultasMiddleware:
+    """
+    Cuenta las sentencias SQL y el tiempo de base de datos de cada petición y los
+    expone en el header Server-Timing. Advierte cuando la ruta supera
+    DB_PRESUPUESTO_CONSULTAS o repite una sentencia con parámetros distintos (N+1);
+    con DB_PRESUPUESTO_ESTRICTO la consulta que lo provoca falla (útil en pruebas).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # El router agrega la ruta al scope: se resuelve cuando se necesita
+        estadisticas = EstadisticasConsultas(lambda: plantilla_ruta(scope))
+        token = estadisticas_peticion.set(estadisticas)
+        inicio = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                total_ms = (time.perf_counter() - inicio) * 1000
+                valor = (
+                    f'db;dur={estadisticas.duracion * 1000:.1f};desc="{estadisticas.total} consultas", '
+                    f"app;dur={total_ms:.1f}"
+                )
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", valor.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            estadisticas_peticion.reset(token)
+            ruta = estadisticas.ruta
+            if estadisticas.excede_presupuesto():
+                logger.warning(
+                    "%s ejecutó %s consultas (presupuesto %s)", ruta, estadisticas.total, settings.DB_PRESUPUESTO_CONSULTAS,
+                    extra={"ruta": ruta, "consultas": estadisticas.total}
+                )
+            for sql, veces in estadisticas.repetidas.items():
+                logger.warning(
+                    "Posible N+1 en %s: %s+ ejecuciones con parámetros distintos", ruta, veces,
+                    extra={"ruta": ruta, "sql": sql}
+                )
+
+
+TIPOS_COMPRIMIBLES = {tipo.strip() for tipo in settings.COMPRESION_TIPOS.split(",") if tipo.strip()}
+
+
+def elegir_codificacion(accept_encoding: str) -> Optional[str]:
+    """Codificación a usar según Accept-Encoding: br si está disponible, si no gzip"""
+    aceptadas = {}
+    for parte in accept_encoding.split(","):
+        nombre, _, parametros = parte.strip().partition(";")
+        calidad = 1.0
+        parametros = parametros.strip()
+        if parametros.startswith("q="):
+            try:
+                calidad = float(parametros[2:])
+            except ValueError:
+                calidad = 0.0
+        aceptadas[nombre.strip().lower()] = calidad
+    comodin = aceptadas.get("*", 0.0)
+    if brotli is not None and aceptadas.get("br", comodin) > 0:
+        return "br"
+    if aceptadas.get("gzip", comodin) > 0:
+        return "gzip"
+    return None
+
+
+class _Compresor:
+    """Compresor incremental: cada bloque se vacía para que el cliente lo reciba sin esperar al final"""
+
+    def __init__(self, codificacion: str):
+        if codificacion == "br":
+            self._br = brotli.Compressor(quality=settings.COMPRESION_NIVEL_BROTLI)
+            self._gzip = None
+        else:
+            self._br = None
+            # wbits=31: formato gzip (cabecera y CRC)
+            self._gzip = zlib.compressobj(settings.COMPRESION_NIVEL_GZIP, zlib.DEFLATED, 31)
+
+    def comprimir(self, datos: bytes, final: bool) -> bytes:
+        if self._br is not None:
+            salida = self._br.process(datos)
+            return salida + (self._br.finish() if final else self._br.flush())
+        salida = self._gzip.compress(datos)
+        return salida + self._gzip.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class CompresionMiddleware:
+    """
+    Comprime con brotli o gzip las respuestas de tipos en COMPRESION_TIPOS a partir de
+    COMPRESION_MIN_BYTES. Las respuestas en streaming se comprimen bloque a bloque sin
+    acumularlas en memoria; las que ya traen Content-Encoding se dejan intactas.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+
+        codificacion = elegir_codificacion(Headers(scope=scope).get("accept-encoding", ""))
+        if codificacion is None:
+            await self.app(scope, receive, send)
+            return
+
+        inicio_respuesta = None
+        compresor: Optional[_Compresor] = None
+        # None: aún no se decide; False: se envía sin comprimir
+        comprimir: Optional[bool] = None
+
+        async def send_wrapper(message):
+            nonlocal inicio_respuesta, compresor, comprimir
+            if message["type"] == "http.response.start":
+                cabeceras = Headers(raw=message.get("headers", []))
+                tipo = cabeceras.get("content-type", "").split(";")[0].strip().lower()
+                if (
+                    message["status"] < 200 or message["status"] in (204, 304)
+                    or "content-encoding" in cabeceras or tipo not in TIPOS_COMPRIMIBLES
+                ):
+                    comprimir = False
+                    await send(message)
+                else:
+                    # Se retiene hasta ver el primer bloque del cuerpo
+                    inicio_respuesta = message
+                return
+
+            if message["type"] != "http.response.body" or comprimir is False:
+                await send(message)
+                return
+
+            cuerpo = message.get("body", b"")
+            mas_cuerpo = message.get("more_body", False)
+            if comprimir is None:
+                cabeceras = MutableHeaders(scope=inicio_respuesta)
+                cabeceras.add_vary_header("Accept-Encoding")
+                if not mas_cuerpo and len(cuerpo) < settings.COMPRESION_MIN_BYTES:
+                    comprimir = False
+                    await send(inicio_respuesta)
+                    await send(message)
+                    return
+                comprimir = True
+                compresor = _Compresor(codificacion)
+                cabeceras["Content-Encoding"] = codificacion
+                del cabeceras["Content-Length"]
+                if not mas_cuerpo:
+                    comprimido = compresor.comprimir(cuerpo, final=True)
+                    cabeceras["Content-Length"] = str(len(comprimido))
+                    await send(inicio_respuesta)
+                    await send({"type": "http.response.body", "body": comprimido})
+                    return
+                await send(inicio_respuesta)
+
+            await send({
+                "type": "http.response.body",
+                "body": compresor.comprimir(cuerpo, final=not mas_cuerpo),
+                "more_body": mas_cuerpo,
+            })
+
+        await self.app(scope, receive, send_wrapper)
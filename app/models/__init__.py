@@ -44,6 +44,8 @@ class Natillera(Base):
     estado = Column(Enum(NatilleraEstado, name='natilleraestado', values_callable=lambda x: [e.value for e in x]), default=NatilleraEstado.ACTIVO, nullable=False)
     creator_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Se incrementa con cada escritura de la natillera o de sus datos (ver VersionService)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     
     # Relaciones
     creator = relationship("User", back_populates="created_natilleras")
@@ -232,6 +234,8 @@ class ArchivoAdjunto(Base):
     id_aporte = Column(Integer, ForeignKey("aportes.id"), nullable=True)
     id_pago_prestamo = Column(Integer, ForeignKey("pagos_prestamo.id"), nullable=True)
     id_usuario = Column(Integer, ForeignKey("users.id"), nullable=False)
+    hash_sha256 = Column(String(64), nullable=True, index=True)  # Contenido deduplicado (NULL en archivos antiguos)
+    ruta_miniatura = Column(String, nullable=True)  # Key en MinIO de la miniatura/vista previa
     
     # Relaciones
     aporte = relationship("Aporte", back_populates="archivos_adjuntos")
@@ -239,6 +243,19 @@ class ArchivoAdjunto(Base):
     usuario = relationship("User", back_populates="archivos_adjuntos")
 
 
+class ObjetoAlmacenado(Base):
+    """Objeto de MinIO direccionado por contenido, compartido por varios archivos adjuntos"""
+    __tablename__ = "objetos_almacenados"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    hash_sha256 = Column(String(64), unique=True, index=True, nullable=False)
+    ruta_archivo = Column(String, nullable=False)  # Key en MinIO
+    tipo_archivo = Column(String, nullable=False)  # MIME type de la primera subida
+    tamano = Column(Integer, nullable=False)  # Tamaño en bytes
+    referencias = Column(Integer, default=1, nullable=False)  # Archivos adjuntos que lo usan
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
 # Agregar relaciones inversas
 Aporte.archivos_adjuntos = relationship("ArchivoAdjunto", back_populates="aporte", cascade="all, delete-orphan")
 PagoPrestamo.archivos_adjuntos = relationship("ArchivoAdjunto", back_populates="pago_prestamo", cascade="all, delete-orphan")
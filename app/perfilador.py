@@ -0,0 +1,212 @@
+import itertools
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Dict, List, Optional
+
+from app.config import settings
+from app.logs import id_peticion
+from app.metrics import registro
+
+PERFILES_CAPTURADOS = registro.counter(
+    "perfiles_capturados_total", "Peticiones perfiladas por el perfilador por muestreo"
+)
+
+# Marcos superiores de un hilo sin trabajo (workers esperando tareas, event loop en select)
+_FUNCIONES_OCIOSAS = {
+    "threading:Condition.wait", "threading:Event.wait", "queue:Queue.get", "queue:SimpleQueue.get",
+    "selectors:EpollSelector.select", "selectors:KqueueSelector.select", "selectors:SelectSelector.select",
+    "logging.handlers:QueueListener.dequeue",
+}
+
+
+def _plantilla_a_regex(plantilla: str) -> "re.Pattern":
+    """/transacciones/natilleras/{natillera_id}/balance -> ^/transacciones/natilleras/[^/]+/balance$"""
+    partes = re.split(r"\{[^}]+\}", plantilla)
+    return re.compile("^" + "[^/]+".join(re.escape(p) for p in partes) + "$")
+
+
+def _nombre_marco(marco) -> str:
+    codigo = marco.f_code
+    modulo = marco.f_globals.get("__name__", "?")
+    return f"{modulo}:{getattr(codigo, 'co_qualname', codigo.co_name)}"
+
+
+class _Captura:
+    def __init__(self, id_: int, metodo: str, path: str):
+        self.id = id_
+        self.metodo = metodo
+        self.path = path
+        self.request_id = id_peticion.get()
+        self.inicio = time.time()
+        self.inicio_monotonic = time.perf_counter()
+        self.pilas: Counter = Counter()
+        self.muestras = 0
+        self.concurrentes = 0
+
+
+class Perfilador:
+    """
+    Perfilador por muestreo bajo demanda. Mientras haya peticiones perfiladas en curso,
+    un hilo toma cada `intervalo` la pila de todos los hilos ocupados del proceso
+    (sys._current_frames) y la acumula en formato "colapsado" (marco;marco;... N), el
+    que leen flamegraph.pl y speedscope. Se ven los marcos Python de SQLAlchemy,
+    Pydantic, boto3, etc.; el código nativo (pydantic-core, psycopg2) aparece como su
+    llamador.
+
+    Las muestras son del proceso completo, como las de py-spy: si otras peticiones
+    corren a la vez también aparecen (cada perfil guarda cuántas había en curso).
+    Apagado, el costo por petición es una comparación.
+    """
+
+    def __init__(self, max_perfiles: int):
+        self._perfiles: deque = deque(maxlen=max_perfiles)
+        self._capturas: Dict[int, _Captura] = {}
+        self._lock = threading.Lock()
+        self._hilo: Optional[threading.Thread] = None
+        self._ids = itertools.count(1)
+        self.habilitado = False
+        self._ruta: Optional["re.Pattern"] = None
+        self.plantilla: Optional[str] = None
+        self.fraccion = 0.0
+        self.intervalo = 0.005
+        self.expira = 0.0
+
+    def activar(self, ruta: Optional[str], fraccion: float, duracion: float, intervalo_ms: float):
+        """Perfila las peticiones a `ruta` (plantilla de path) y/o una fracción aleatoria de todas"""
+        self.plantilla = ruta
+        self._ruta = _plantilla_a_regex(ruta) if ruta else None
+        self.fraccion = fraccion
+        self.intervalo = intervalo_ms / 1000
+        self.expira = time.monotonic() + duracion
+        self.habilitado = True
+
+    def desactivar(self):
+        self.habilitado = False
+
+    def estado(self) -> dict:
+        if self.habilitado and time.monotonic() >= self.expira:
+            self.habilitado = False
+        return {
+            "habilitado": self.habilitado,
+            "ruta": self.plantilla,
+            "fraccion": self.fraccion,
+            "intervalo_ms": self.intervalo * 1000,
+            "segundos_restantes": max(0.0, round(self.expira - time.monotonic(), 1)) if self.habilitado else 0.0,
+            "en_curso": len(self._capturas),
+            "guardados": len(self._perfiles),
+        }
+
+    def debe_perfilar(self, path: str) -> bool:
+        if not self.habilitado:
+            return False
+        if time.monotonic() >= self.expira:
+            self.habilitado = False
+            return False
+        if self._ruta is not None and self._ruta.match(path):
+            return True
+        return self.fraccion > 0 and random.random() < self.fraccion
+
+    def iniciar(self, metodo: str, path: str) -> _Captura:
+        captura = _Captura(next(self._ids), metodo, path)
+        with self._lock:
+            captura.concurrentes = len(self._capturas)
+            self._capturas[captura.id] = captura
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._muestrear, name="perfilador", daemon=True)
+                self._hilo.start()
+        return captura
+
+    def terminar(self, captura: _Captura, estado: int):
+        with self._lock:
+            self._capturas.pop(captura.id, None)
+        duracion_ms = (time.perf_counter() - captura.inicio_monotonic) * 1000
+        self._perfiles.append({
+            "id": captura.id,
+            "metodo": captura.metodo,
+            "path": captura.path,
+            "estado": estado,
+            "request_id": captura.request_id,
+            "inicio": captura.inicio,
+            "duracion_ms": round(duracion_ms, 2),
+            "intervalo_ms": self.intervalo * 1000,
+            "muestras": captura.muestras,
+            "otras_en_curso": captura.concurrentes,
+            "pilas": captura.pilas,
+        })
+        PERFILES_CAPTURADOS.inc()
+
+    def _muestrear(self):
+        propio = threading.get_ident()
+        while True:
+            with self._lock:
+                if not self._capturas:
+                    self._hilo = None
+                    return
+            nombres = {hilo.ident: hilo.name for hilo in threading.enumerate()}
+            pilas = []
+            for ident, marco in sys._current_frames().items():
+                if ident == propio or _nombre_marco(marco) in _FUNCIONES_OCIOSAS:
+                    continue
+                marcos = []
+                while marco is not None:
+                    marcos.append(_nombre_marco(marco))
+                    marco = marco.f_back
+                marcos.append(nombres.get(ident, str(ident)))
+                pilas.append(";".join(reversed(marcos)))
+            # Solo las capturas aún en curso, bajo el lock: `terminar` las saca con el mismo
+            # lock antes de guardarlas, así que un perfil guardado ya no cambia
+            with self._lock:
+                for captura in self._capturas.values():
+                    captura.muestras += 1
+                    captura.pilas.update(pilas)
+            time.sleep(self.intervalo)
+
+    def listar(self) -> List[dict]:
+        return [{k: v for k, v in perfil.items() if k != "pilas"} for perfil in reversed(self._perfiles)]
+
+    def colapsado(self, perfil_id: Optional[int] = None) -> Optional[str]:
+        """
+        Pilas en formato colapsado de un perfil, o de todos los guardados combinados
+        si no se indica ID (útil para ver una ruta con muchas peticiones cortas).
+        """
+        perfiles = [p for p in self._perfiles if perfil_id is None or p["id"] == perfil_id]
+        if not perfiles:
+            return None
+        pilas: Counter = Counter()
+        for perfil in perfiles:
+            pilas.update(perfil["pilas"])
+        return "".join(f"{pila} {cuenta}\n" for pila, cuenta in pilas.most_common())
+
+
+perfilador = Perfilador(settings.PERFILES_MAX)
+
+
+class PerfiladoMiddleware:
+    """Perfila las peticiones elegidas por el perfilador y agrega el header X-Perfil-ID"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not perfilador.debe_perfilar(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        captura = perfilador.iniciar(scope["method"], scope["path"])
+        estado = 500
+
+        async def send_wrapper(message):
+            nonlocal estado
+            if message["type"] == "http.response.start":
+                estado = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-perfil-id", str(captura.id).encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            perfilador.terminar(captura, estado)
@@ -0,0 +1,63 @@
+import logging
+import time
+
+from sqlalchemy import text
+from sqlalchemy.orm import configure_mappers
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.database import async_engine, engine
+
+logger = logging.getLogger(__name__)
+
+
+def _componentes_sync():
+    """
+    Lo que de otro modo pagaría la primera petición de cada worker: configurar los
+    mappers, abrir una conexión del pool e importar/inicializar Firebase y boto3.
+    """
+    yield "mappers", configure_mappers
+
+    def base_de_datos():
+        with engine.connect() as conexion:
+            conexion.execute(text("SELECT 1"))
+    yield "base_de_datos", base_de_datos
+
+    def firebase():
+        from app.auth.firebase_auth import obtener_firebase_auth
+        obtener_firebase_auth()
+    yield "firebase", firebase
+
+    if settings.MINIO_ENDPOINT:
+        def s3():
+            from app.services.archivo_adjunto_service import ArchivoAdjuntoService
+            ArchivoAdjuntoService._obtener_cliente_s3()
+        yield "s3", s3
+
+
+def _ejecutar_sync() -> dict:
+    tiempos = {}
+    for nombre, funcion in _componentes_sync():
+        inicio = time.perf_counter()
+        try:
+            funcion()
+        except Exception:
+            # El precalentamiento nunca impide arrancar: la primera petición reintentará
+            logger.exception("Error precalentando", extra={"componente": nombre})
+        tiempos[nombre] = round((time.perf_counter() - inicio) * 1000, 1)
+    return tiempos
+
+
+async def precalentar():
+    """Inicializa los componentes perezosos al arrancar el worker (PRECALENTAR=true)"""
+    tiempos = await run_in_threadpool(_ejecutar_sync)
+
+    inicio = time.perf_counter()
+    try:
+        async with async_engine.connect() as conexion:
+            await conexion.execute(text("SELECT 1"))
+    except Exception:
+        logger.exception("Error precalentando", extra={"componente": "base_de_datos_async"})
+    tiempos["base_de_datos_async"] = round((time.perf_counter() - inicio) * 1000, 1)
+
+    logger.info("Worker precalentado", extra={"tiempos_ms": tiempos})
@@ -0,0 +1,86 @@
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence
+
+import orjson
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+
+# Campos de UserResponse en el mismo orden en que los serializa Pydantic
+CAMPOS_USUARIO = ("email", "username", "full_name", "id", "created_at")
+
+
+def _por_defecto(valor: Any):
+    # Pydantic v2 serializa Decimal como string en modo JSON: se conserva ese formato
+    if isinstance(valor, Decimal):
+        return str(valor)
+    raise TypeError(f"Tipo no serializable: {type(valor).__name__}")
+
+
+def dumps(contenido: Any) -> bytes:
+    """
+    Serializa a JSON con orjson. datetime sale en ISO 8601 (con "Z" para UTC, igual que
+    Pydantic), los Enum como su valor y Decimal como string.
+    """
+    return orjson.dumps(contenido, default=_por_defecto, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+
+
+class OrjsonResponse(JSONResponse):
+    """
+    Respuesta JSON serializada con orjson para listados grandes. El endpoint devuelve
+    dicts ya construidos (por ejemplo desde filas de una consulta por columnas), sin
+    pasar por la validación del response_model.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def columnas_usuario(entidad, prefijo: str) -> list:
+    """Columnas de un User (o alias) etiquetadas con un prefijo, para consultas por columnas"""
+    return [getattr(entidad, campo).label(f"{prefijo}_{campo}") for campo in CAMPOS_USUARIO]
+
+
+def usuario_desde_fila(fila, prefijo: str) -> Optional[Dict[str, Any]]:
+    """Construye el dict de UserResponse desde una fila con columnas_usuario (None si no hay usuario)"""
+    datos = fila._mapping
+    if datos[f"{prefijo}_id"] is None:
+        return None
+    return {campo: datos[f"{prefijo}_{campo}"] for campo in CAMPOS_USUARIO}
+
+
+def filas_a_dicts(filas: Sequence, campos: Sequence[str]) -> List[Dict[str, Any]]:
+    """Convierte filas de columnas simples a dicts con los campos indicados"""
+    return [{campo: fila._mapping[campo] for campo in campos} for fila in filas]
+
+
+# Las respuestas con ETag dependen del usuario: el navegador puede guardarlas pero
+# debe revalidarlas siempre (If-None-Match) y ningún proxy compartido las almacena
+CACHE_CONTROL_ETAG = "private, no-cache"
+
+
+def etag_debil(*partes) -> str:
+    """ETag débil construido con las partes que identifican la versión del recurso"""
+    return 'W/"' + "-".join(str(parte) for parte in partes) + '"'
+
+
+def _coincide_etag(if_none_match: str, etag: str) -> bool:
+    # Comparación débil (RFC 9110 §13.1.2): se ignora el prefijo W/
+    if if_none_match.strip() == "*":
+        return True
+    valor = etag.removeprefix("W/")
+    return any(candidato.strip().removeprefix("W/") == valor for candidato in if_none_match.split(","))
+
+
+def cabeceras_etag(etag: str) -> Dict[str, str]:
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL_ETAG}
+
+
+def no_modificado(request: Request, etag: str) -> Optional[Response]:
+    """
+    Retorna un 304 si el cliente ya tiene esta versión (If-None-Match), o None si hay
+    que construir la respuesta. Debe llamarse después de verificar el acceso del usuario.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _coincide_etag(if_none_match, etag):
+        return Response(status_code=304, headers=cabeceras_etag(etag))
+    return None
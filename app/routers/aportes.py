@@ -1,11 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from app.database import get_db
+from app.database import get_db, get_async_db
 from app.schemas import AporteCreate, AporteResponse, AporteUpdate, AporteWithNatillera
-from app.models import User
-from app.auth.dependencies import get_current_user
+from app.models import User, Natillera, Aporte, AporteStatus
+from app.auth.dependencies import get_current_user, get_current_user_async
 from app.services.aporte_service import AporteService
+from app.respuestas import OrjsonResponse
 
 router = APIRouter(prefix="/aportes", tags=["aportes"])
 
@@ -34,7 +37,7 @@ def get_natillera_aportes(
     db: Session = Depends(get_db)
 ):
     """Obtiene todos los aportes de una natillera (solo creador)"""
-    return AporteService.get_natillera_aportes(db, natillera_id, current_user)
+    return OrjsonResponse(AporteService.get_natillera_aportes(db, natillera_id, current_user))
 
 @router.patch("/{aporte_id}", response_model=AporteResponse)
 def update_aporte_status(
@@ -47,38 +50,38 @@ def update_aporte_status(
     return AporteService.update_aporte_status(db, aporte_id, update, current_user)
 
 @router.get("/natillera/{natillera_id}/pendientes/count", response_model=dict)
-def get_aportes_pendientes_count(
+async def get_aportes_pendientes_count(
     natillera_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Cuenta los aportes pendientes de una natillera (solo creador)"""
-    from app.models import Natillera, Aporte, AporteStatus
-    natillera = db.query(Natillera).filter(Natillera.id == natillera_id).first()
-    if not natillera:
+    creator_id = await db.scalar(select(Natillera.creator_id).where(Natillera.id == natillera_id))
+    if creator_id is None:
         raise HTTPException(status_code=404, detail="Natillera no encontrada")
-    if natillera.creator_id != current_user.id:
+    if creator_id != current_user.id:
         raise HTTPException(status_code=403, detail="Solo el creador puede ver los conteos")
     
-    count = db.query(Aporte).filter(
-        Aporte.natillera_id == natillera_id,
-        Aporte.status == AporteStatus.PENDIENTE
-    ).count()
+    count = await db.scalar(
+        select(func.count(Aporte.id)).where(
+            Aporte.natillera_id == natillera_id,
+            Aporte.status == AporteStatus.PENDIENTE
+        )
+    )
     return {"count": count}
 
 @router.get("/my-aportes/aprobados/count", response_model=dict)
-def get_aportes_aprobados_count(
+async def get_aportes_aprobados_count(
     natillera_id: Optional[int] = None,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Cuenta los aportes aprobados del usuario actual"""
-    from app.models import Aporte, AporteStatus
-    query = db.query(Aporte).filter(
+    query = select(func.count(Aporte.id)).where(
         Aporte.user_id == current_user.id,
         Aporte.status == AporteStatus.APROBADO
     )
     if natillera_id:
-        query = query.filter(Aporte.natillera_id == natillera_id)
-    count = query.count()
+        query = query.where(Aporte.natillera_id == natillera_id)
+    count = await db.scalar(query)
     return {"count": count}
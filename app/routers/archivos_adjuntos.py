@@ -1,22 +1,25 @@
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException
-from fastapi.responses import Response
+from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app.services.archivo_adjunto_service import ArchivoAdjuntoService
+from app.services.membresia_service import MembresiaService
 from app.auth.dependencies import get_current_user
-from app.models import User
+from app.models import User, ArchivoAdjunto
+from app.schemas import ArchivoAdjuntoResponse
 from app.config import settings
-import boto3
-from botocore.client import Config
 from typing import List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(
     prefix="/archivos_adjuntos",
     tags=["archivos_adjuntos"]
 )
 
-@router.post("/subir")
-async def subir_archivo_adjunto(
+@router.post("/subir", response_model=ArchivoAdjuntoResponse)
+def subir_archivo_adjunto(
     archivo: UploadFile = File(...),
     id_aporte: Optional[int] = Form(None),
     id_pago_prestamo: Optional[int] = Form(None),
@@ -25,24 +28,18 @@ async def subir_archivo_adjunto(
 ):
     """
     Sube un archivo adjunto para un aporte o pago de préstamo.
+    Se define como función síncrona para que FastAPI la ejecute en el threadpool
+    y la subida a MinIO no bloquee el event loop.
     """
-    archivo_adjunto = ArchivoAdjuntoService.subir_archivo_adjunto(
+    return ArchivoAdjuntoService.subir_archivo_adjunto(
         db=db,
         archivo=archivo,
         id_usuario=current_user.id,
         id_aporte=id_aporte,
         id_pago_prestamo=id_pago_prestamo
     )
-    return {
-        "id": archivo_adjunto.id,
-        "nombre_archivo": archivo_adjunto.nombre_archivo,
-        "ruta_archivo": archivo_adjunto.ruta_archivo,
-        "tipo_archivo": archivo_adjunto.tipo_archivo,
-        "tamano": archivo_adjunto.tamano,
-        "fecha_subida": archivo_adjunto.fecha_subida
-    }
-
-@router.get("/aporte/{id_aporte}")
+
+@router.get("/aporte/{id_aporte}", response_model=List[ArchivoAdjuntoResponse])
 def obtener_archivos_por_aporte(
     id_aporte: int,
     db: Session = Depends(get_db),
@@ -51,24 +48,13 @@ def obtener_archivos_por_aporte(
     """
     Obtiene todos los archivos adjuntos de un aporte.
     """
-    archivos = ArchivoAdjuntoService.obtener_archivos_por_aporte(
+    return ArchivoAdjuntoService.obtener_archivos_por_aporte(
         db=db,
         id_aporte=id_aporte,
         id_usuario=current_user.id
     )
-    return [
-        {
-            "id": a.id,
-            "nombre_archivo": a.nombre_archivo,
-            "ruta_archivo": a.ruta_archivo,
-            "tipo_archivo": a.tipo_archivo,
-            "tamano": a.tamano,
-            "fecha_subida": a.fecha_subida
-        }
-        for a in archivos
-    ]
 
-@router.get("/pago_prestamo/{id_pago_prestamo}")
+@router.get("/pago_prestamo/{id_pago_prestamo}", response_model=List[ArchivoAdjuntoResponse])
 def obtener_archivos_por_pago_prestamo(
     id_pago_prestamo: int,
     db: Session = Depends(get_db),
@@ -77,22 +63,11 @@ def obtener_archivos_por_pago_prestamo(
     """
     Obtiene todos los archivos adjuntos de un pago de préstamo.
     """
-    archivos = ArchivoAdjuntoService.obtener_archivos_por_pago_prestamo(
+    return ArchivoAdjuntoService.obtener_archivos_por_pago_prestamo(
         db=db,
         id_pago_prestamo=id_pago_prestamo,
         id_usuario=current_user.id
     )
-    return [
-        {
-            "id": a.id,
-            "nombre_archivo": a.nombre_archivo,
-            "ruta_archivo": a.ruta_archivo,
-            "tipo_archivo": a.tipo_archivo,
-            "tamano": a.tamano,
-            "fecha_subida": a.fecha_subida
-        }
-        for a in archivos
-    ]
 
 @router.get("/{id_archivo}/descargar")
 def descargar_archivo(
@@ -108,7 +83,7 @@ def descargar_archivo(
         id_archivo=id_archivo,
         id_usuario=current_user.id
     )
-    # El método obtener_archivo_por_id ya genera la URL presigned en ruta_archivo
+    # El método obtener_archivo_por_id devuelve la URL presigned en ruta_archivo
     from fastapi.responses import RedirectResponse
     return RedirectResponse(url=archivo.ruta_archivo)
 
@@ -131,13 +106,17 @@ def eliminar_archivo(
 @router.get("/proxy/{id_archivo}")
 def proxy_archivo(
     id_archivo: int,
+    request: Request,
     token: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
     """
     Proxy para servir archivos adjuntos desde el mismo dominio, evitando problemas de CORS.
+    El archivo se transmite por bloques desde MinIO y se respetan las cabeceras
+    Range (206) e If-None-Match (304).
     """
     from app.auth.firebase_auth import verify_token
+    from botocore.exceptions import ClientError
 
     try:
         # Si no hay token, intentar obtener el usuario actual de la sesión
@@ -160,53 +139,63 @@ def proxy_archivo(
         if not archivo:
             raise HTTPException(status_code=404, detail="Archivo no encontrado")
 
-        print(f"Archivo encontrado: ID={archivo.id}, Ruta={archivo.ruta_archivo}")
-
         # Verificar permisos
         if archivo.id_usuario != current_user.id:
             # Si no es el propietario, verificar si es miembro de la natillera
             has_permission = False
-            if archivo.aporte and archivo.aporte.natillera:
-                has_permission = any(u.id == current_user.id for u in archivo.aporte.natillera.members)
-            elif archivo.pago_prestamo and archivo.pago_prestamo.prestamo and archivo.pago_prestamo.prestamo.natillera:
-                has_permission = any(u.id == current_user.id for u in archivo.pago_prestamo.prestamo.natillera.members)
+            if archivo.aporte:
+                has_permission = MembresiaService.es_miembro(db, archivo.aporte.natillera_id, current_user.id)
+            elif archivo.pago_prestamo and archivo.pago_prestamo.prestamo:
+                has_permission = MembresiaService.es_miembro(db, archivo.pago_prestamo.prestamo.natillera_id, current_user.id)
 
             if not has_permission:
                 raise HTTPException(status_code=403, detail="No tienes permisos para acceder a este archivo")
 
-        # Descargar el archivo desde MinIO
-        s3_client = boto3.client(
-            's3',
-            endpoint_url=settings.MINIO_ENDPOINT,
-            aws_access_key_id=settings.MINIO_ACCESS_KEY,
-            aws_secret_access_key=settings.MINIO_SECRET_KEY,
-            config=Config(
-                signature_version='s3v4',
-                region_name='us-east-1',
-                s3={'addressing_style': 'path'}
-            ),
-            verify=False
-        )
-
-        # Obtener el objeto desde MinIO
-        response = s3_client.get_object(Bucket=settings.MINIO_BUCKET_NAME, Key=archivo.ruta_archivo)
-
-        # Leer el contenido
-        file_content = response['Body'].read()
-
-        # Crear respuesta con el contenido del archivo
-        return Response(
-            content=file_content,
+        # Reenviar a MinIO las cabeceras de rango y condicionales del cliente
+        s3_client = ArchivoAdjuntoService._obtener_cliente_s3()
+        params = {'Bucket': settings.MINIO_BUCKET_NAME, 'Key': archivo.ruta_archivo}
+        rango = request.headers.get("range")
+        if_none_match = request.headers.get("if-none-match")
+        if rango:
+            params['Range'] = rango
+        if if_none_match:
+            params['IfNoneMatch'] = if_none_match
+
+        cache_control = "private, max-age=3600"
+        try:
+            objeto = s3_client.get_object(**params)
+        except ClientError as e:
+            metadata = e.response.get('ResponseMetadata', {})
+            codigo = metadata.get('HTTPStatusCode')
+            if codigo == 304:
+                etag = metadata.get('HTTPHeaders', {}).get('etag', if_none_match)
+                return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+            if codigo == 416:
+                raise HTTPException(status_code=416, detail="Rango solicitado no válido")
+            raise
+
+        headers = {
+            "Content-Disposition": f"inline; filename={archivo.nombre_archivo}",
+            "Cache-Control": cache_control,
+            "Accept-Ranges": "bytes",
+            "Content-Length": str(objeto['ContentLength']),
+        }
+        if objeto.get('ETag'):
+            headers["ETag"] = objeto['ETag']
+        if objeto.get('ContentRange'):
+            headers["Content-Range"] = objeto['ContentRange']
+
+        # Transmitir el contenido por bloques sin cargarlo completo en memoria
+        return StreamingResponse(
+            ArchivoAdjuntoService.iterar_objeto(objeto['Body']),
+            status_code=206 if objeto.get('ContentRange') else 200,
             media_type=archivo.tipo_archivo,
-            headers={
-                "Content-Disposition": f"inline; filename={archivo.nombre_archivo}",
-                "Cache-Control": "private, max-age=3600"
-            }
+            headers=headers
         )
 
     except HTTPException:
         # Re-lanzar excepciones HTTP
         raise
     except Exception as e:
-        print(f"Error en proxy_archivo: {str(e)}")
+        logger.exception("Error en proxy_archivo", extra={"id_archivo": id_archivo})
         raise HTTPException(status_code=500, detail=f"Error obteniendo archivo: {str(e)}")
\ No newline at end of file
@@ -1,10 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
-from app.database import get_db
+from app.database import get_db, get_async_db
 from app.schemas import InvitacionResponse, InvitacionCreate
-from app.models import User, Invitacion, Natillera, InvitacionEstado
-from app.auth.dependencies import get_current_user
+from app.models import User, Invitacion, Natillera, InvitacionEstado, user_natillera
+from app.auth.dependencies import get_current_user, get_current_user_async
+from app.services.membresia_service import MembresiaService
+from app.services.version_service import VersionService
 from datetime import datetime
 
 router = APIRouter(prefix="/invitaciones", tags=["invitaciones"])
@@ -17,7 +22,7 @@ def create_invitation(
 ):
     """Crea una invitación para unirse a una natillera"""
     # Verificar que la natillera existe
-    natillera = db.query(Natillera).filter(Natillera.id == invitacion.natillera_id).first()
+    natillera = db.get(Natillera, invitacion.natillera_id)
     if not natillera:
         raise HTTPException(status_code=404, detail="Natillera no encontrada")
     
@@ -35,7 +40,7 @@ def create_invitation(
         raise HTTPException(status_code=400, detail="No puedes invitarte a ti mismo")
     
     # Verificar que no sea ya miembro
-    if invited_user in natillera.members:
+    if MembresiaService.es_miembro(db, natillera.id, invited_user.id):
         raise HTTPException(status_code=400, detail="El usuario ya es miembro de esta natillera")
     
     # Verificar que no haya una invitación pendiente
@@ -56,32 +61,41 @@ def create_invitation(
     
     db.add(nueva_invitacion)
     db.commit()
-    db.refresh(nueva_invitacion)
     
     return nueva_invitacion
 
 @router.get("/", response_model=List[InvitacionResponse])
-def get_my_invitations(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+async def get_my_invitations(
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Obtiene las invitaciones pendientes del usuario actual"""
-    invitaciones = db.query(Invitacion).filter(
-        Invitacion.invited_user_id == current_user.id,
-        Invitacion.estado == InvitacionEstado.PENDIENTE
-    ).all()
-    return invitaciones
+    # Las relaciones se cargan por adelantado: en sesiones async no hay carga perezosa
+    resultado = await db.scalars(
+        select(Invitacion)
+        .where(
+            Invitacion.invited_user_id == current_user.id,
+            Invitacion.estado == InvitacionEstado.PENDIENTE
+        )
+        .options(
+            selectinload(Invitacion.natillera).selectinload(Natillera.creator),
+            selectinload(Invitacion.inviter_user)
+        )
+    )
+    return resultado.all()
 
 @router.get("/count", response_model=dict)
-def get_invitations_count(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+async def get_invitations_count(
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Obtiene el conteo de invitaciones pendientes"""
-    count = db.query(Invitacion).filter(
-        Invitacion.invited_user_id == current_user.id,
-        Invitacion.estado == InvitacionEstado.PENDIENTE
-    ).count()
+    count = await db.scalar(
+        select(func.count(Invitacion.id)).where(
+            Invitacion.invited_user_id == current_user.id,
+            Invitacion.estado == InvitacionEstado.PENDIENTE
+        )
+    )
     return {"count": count}
 
 @router.post("/{invitacion_id}/accept", response_model=InvitacionResponse)
@@ -114,23 +128,28 @@ def accept_invitation(
         )
     
     # Obtener la natillera
-    natillera = db.query(Natillera).filter(Natillera.id == invitacion.natillera_id).first()
+    natillera = db.get(Natillera, invitacion.natillera_id)
     if not natillera:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Natillera no encontrada"
         )
     
-    # Verificar si ya es miembro
-    if current_user not in natillera.members:
-        natillera.members.append(current_user)
+    # Agregar como miembro (sin cargar la lista de miembros; si ya lo es no hace nada)
+    db.execute(
+        pg_insert(user_natillera)
+        .values(user_id=current_user.id, natillera_id=natillera.id)
+        .on_conflict_do_nothing()
+    )
+    MembresiaService.registrar(db, natillera.id, current_user.id)
+    # El INSERT directo no pasa por el flush: la lista de miembros cambió
+    VersionService.incrementar(db, [natillera.id])
     
     # Actualizar estado de invitación
     invitacion.estado = InvitacionEstado.ACEPTADA
     invitacion.updated_at = datetime.utcnow()
     
     db.commit()
-    db.refresh(invitacion)
     return invitacion
 
 @router.post("/{invitacion_id}/reject", response_model=InvitacionResponse)
@@ -167,25 +186,25 @@ def reject_invitation(
     invitacion.updated_at = datetime.utcnow()
     
     db.commit()
-    db.refresh(invitacion)
     return invitacion
 
 @router.get("/natillera/{natillera_id}/respondidas/count", response_model=dict)
-def get_invitaciones_respondidas_count(
+async def get_invitaciones_respondidas_count(
     natillera_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Cuenta las invitaciones respondidas (aceptadas/rechazadas) de una natillera (solo creador)"""
-    from app.models import Natillera
-    natillera = db.query(Natillera).filter(Natillera.id == natillera_id).first()
-    if not natillera:
+    creator_id = await db.scalar(select(Natillera.creator_id).where(Natillera.id == natillera_id))
+    if creator_id is None:
         raise HTTPException(status_code=404, detail="Natillera no encontrada")
-    if natillera.creator_id != current_user.id:
+    if creator_id != current_user.id:
         raise HTTPException(status_code=403, detail="Solo el creador puede ver los conteos")
     
-    count = db.query(Invitacion).filter(
-        Invitacion.natillera_id == natillera_id,
-        Invitacion.estado.in_([InvitacionEstado.ACEPTADA, InvitacionEstado.RECHAZADA])
-    ).count()
+    count = await db.scalar(
+        select(func.count(Invitacion.id)).where(
+            Invitacion.natillera_id == natillera_id,
+            Invitacion.estado.in_([InvitacionEstado.ACEPTADA, InvitacionEstado.RECHAZADA])
+        )
+    )
     return {"count": count}
@@ -0,0 +1,40 @@
+import secrets
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from fastapi.responses import PlainTextResponse
+
+from app.config import settings
+from app.instrumentacion_db import obtener_consultas_lentas
+from app.metrics import registro
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+
+def verificar_token_metricas(authorization: Optional[str] = Header(None)):
+    """
+    Exige el token de métricas. Sin METRICS_TOKEN los endpoints quedan cerrados, salvo
+    que METRICS_PUBLICO permita el acceso sin autenticación.
+    """
+    if not settings.METRICS_TOKEN:
+        if settings.METRICS_PUBLICO:
+            return
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Métricas deshabilitadas: configure METRICS_TOKEN o METRICS_PUBLICO"
+        )
+    esperado = f"Bearer {settings.METRICS_TOKEN}"
+    if authorization is None or not secrets.compare_digest(authorization, esperado):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token de métricas inválido")
+
+
+@router.get("", response_class=PlainTextResponse, include_in_schema=False, dependencies=[Depends(verificar_token_metricas)])
+def get_metrics():
+    """Métricas del proceso en formato de texto de Prometheus"""
+    return PlainTextResponse(registro.exportar(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@router.get("/consultas-lentas", response_model=List[dict], include_in_schema=False, dependencies=[Depends(verificar_token_metricas)])
+def get_consultas_lentas():
+    """Muestras recientes de sentencias por encima de DB_CONSULTA_LENTA_MS"""
+    return obtener_consultas_lentas()
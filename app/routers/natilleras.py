@@ -1,11 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy.orm import Session
 from typing import List
 from app.database import get_db
 from app.schemas import NatilleraCreate, NatilleraResponse, NatilleraWithMembers, NatilleraUpdate
 from app.models import User
 from app.auth.dependencies import get_current_user
+from app.auth.contexto import ContextoAutorizacion, get_contexto_autorizacion
 from app.services.natillera_service import NatilleraService
+from app.cache import cache_respuestas
+from app.coalescencia import coalescedor
+from app.respuestas import cabeceras_etag, etag_debil, no_modificado
 
 router = APIRouter(prefix="/natilleras", tags=["natilleras"])
 
@@ -45,20 +49,23 @@ def get_created_natilleras(
 @router.get("/{natillera_id}", response_model=NatilleraWithMembers)
 def get_natillera(
     natillera_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    request: Request,
+    response: Response,
+    contexto: ContextoAutorizacion = Depends(get_contexto_autorizacion)
 ):
     """Obtiene una natillera por ID"""
-    natillera = NatilleraService.get_natillera_by_id(db, natillera_id)
-    if not natillera:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Natillera no encontrada")
+    # Verificar que la natillera existe y el usuario es miembro
+    natillera = contexto.requerir_miembro(natillera_id)
     
-    # Verificar que el usuario es miembro
-    if not NatilleraService.is_member(natillera, current_user):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No eres miembro de esta natillera")
+    # El creador recibe la lista de miembros: el rol forma parte de la versión
+    etag = etag_debil("natillera", natillera_id, natillera.version, contexto.rol(natillera_id).value)
+    respuesta_304 = no_modificado(request, etag)
+    if respuesta_304:
+        return respuesta_304
+    response.headers.update(cabeceras_etag(etag))
     
     # Si el usuario NO es el creador, devolver la natillera sin la lista de miembros
-    if natillera.creator_id != current_user.id:
+    if not contexto.es_creador(natillera_id):
         # Crear una respuesta personalizada sin miembros
         natillera_data = NatilleraWithMembers.from_orm(natillera)
         # Convertir a dict para modificar
@@ -83,17 +90,12 @@ def add_member(
 def update_natillera(
     natillera_id: int,
     natillera_update: NatilleraUpdate,
-    current_user: User = Depends(get_current_user),
+    contexto: ContextoAutorizacion = Depends(get_contexto_autorizacion),
     db: Session = Depends(get_db)
 ):
     """Actualiza una natillera (incluyendo su estado)"""
-    natillera = NatilleraService.get_natillera_by_id(db, natillera_id)
-    if not natillera:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Natillera no encontrada")
-    
     # Solo el creador puede actualizar
-    if natillera.creator_id != current_user.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Solo el creador puede actualizar la natillera")
+    natillera = contexto.requerir_creador(natillera_id, "Solo el creador puede actualizar la natillera")
     
     # Actualizar campos
     if natillera_update.estado is not None:
@@ -105,26 +107,28 @@ def update_natillera(
         natillera.monthly_amount = natillera_update.monthly_amount
     
     db.commit()
-    db.refresh(natillera)
     return natillera
 
 @router.get("/{natillera_id}/estadisticas")
 def get_natillera_estadisticas(
     natillera_id: int,
     current_user: User = Depends(get_current_user),
+    contexto: ContextoAutorizacion = Depends(get_contexto_autorizacion),
     db: Session = Depends(get_db)
 ):
     """Obtiene estadísticas de una natillera"""
     from app.models import Aporte, AporteStatus
     from sqlalchemy import func
     
-    natillera = NatilleraService.get_natillera_by_id(db, natillera_id)
-    if not natillera:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Natillera no encontrada")
+    # Verificar que la natillera existe y el usuario es miembro
+    natillera = contexto.requerir_miembro(natillera_id)
     
-    # Verificar que el usuario es miembro
-    if not NatilleraService.is_member(natillera, current_user):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No eres miembro de esta natillera")
+    # Los totales dependen del usuario: la entrada es por usuario
+    respuesta, clave_cache = cache_respuestas.obtener(
+        "estadisticas", natillera_id, f"u{current_user.id}", natillera.version
+    )
+    if respuesta:
+        return respuesta
     
     # Calcular total ahorrado por el usuario actual (aportes aprobados)
     total_ahorrado = db.query(func.sum(Aporte.amount)).filter(
@@ -146,60 +150,65 @@ def get_natillera_estadisticas(
         Aporte.status == AporteStatus.PENDIENTE
     ).scalar() or 0
     
-    return {
+    return cache_respuestas.guardar(clave_cache, {
         "total_ahorrado": float(total_ahorrado),
         "total_global_ahorrado": float(total_global_ahorrado),
         "aportes_pendientes": aportes_pendientes,
-        "es_creador": natillera.creator_id == current_user.id
-    }
+        "es_creador": contexto.es_creador(natillera_id)
+    })
 
 @router.get("/{natillera_id}/participacion")
 def get_natillera_participacion(
     natillera_id: int,
-    current_user: User = Depends(get_current_user),
+    contexto: ContextoAutorizacion = Depends(get_contexto_autorizacion),
     db: Session = Depends(get_db)
 ):
     """Obtiene estadísticas de participación de cada miembro en la natillera"""
     from app.models import Aporte, AporteStatus
     from sqlalchemy import func
     
-    natillera = NatilleraService.get_natillera_by_id(db, natillera_id)
-    if not natillera:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Natillera no encontrada")
-    
     # Verificar que el usuario es creador
-    if natillera.creator_id != current_user.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Solo el creador puede ver esta información")
+    natillera = contexto.requerir_creador(natillera_id, "Solo el creador puede ver esta información")
     
-    # Calcular total global ahorrado
-    total_global = db.query(func.sum(Aporte.amount)).filter(
-        Aporte.natillera_id == natillera_id,
-        Aporte.status == AporteStatus.APROBADO
-    ).scalar() or 0
+    respuesta, clave_cache = cache_respuestas.obtener("participacion", natillera_id, "creador", natillera.version)
+    if respuesta:
+        return respuesta
     
-    # Calcular total por cada miembro
-    participacion = []
-    for miembro in natillera.members:
-        total_miembro = db.query(func.sum(Aporte.amount)).filter(
+    def calcular_participacion() -> dict:
+        # Calcular total global ahorrado
+        total_global = db.query(func.sum(Aporte.amount)).filter(
             Aporte.natillera_id == natillera_id,
-            Aporte.user_id == miembro.id,
             Aporte.status == AporteStatus.APROBADO
         ).scalar() or 0
         
-        porcentaje = (float(total_miembro) / float(total_global) * 100) if total_global > 0 else 0
+        # Calcular total por cada miembro
+        participacion = []
+        for miembro in natillera.members:
+            total_miembro = db.query(func.sum(Aporte.amount)).filter(
+                Aporte.natillera_id == natillera_id,
+                Aporte.user_id == miembro.id,
+                Aporte.status == AporteStatus.APROBADO
+            ).scalar() or 0
+            
+            porcentaje = (float(total_miembro) / float(total_global) * 100) if total_global > 0 else 0
+            
+            participacion.append({
+                "user_id": miembro.id,
+                "full_name": miembro.full_name,
+                "username": miembro.username,
+                "total_aportado": float(total_miembro),
+                "porcentaje": round(porcentaje, 2)
+            })
         
-        participacion.append({
-            "user_id": miembro.id,
-            "full_name": miembro.full_name,
-            "username": miembro.username,
-            "total_aportado": float(total_miembro),
-            "porcentaje": round(porcentaje, 2)
-        })
-    
-    # Ordenar por mayor aporte
-    participacion.sort(key=lambda x: x["total_aportado"], reverse=True)
-    
-    return {
-        "total_global": float(total_global),
-        "participacion": participacion
-    }
+        # Ordenar por mayor aporte
+        participacion.sort(key=lambda x: x["total_aportado"], reverse=True)
+        
+        return {
+            "total_global": float(total_global),
+            "participacion": participacion
+        }
+    
+    # Peticiones simultáneas de la misma participación comparten un solo cálculo
+    return cache_respuestas.guardar(
+        clave_cache, coalescedor.ejecutar("participacion", clave_cache, calcular_participacion)
+    )
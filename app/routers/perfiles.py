@@ -0,0 +1,50 @@
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import PlainTextResponse
+
+from app.auth.dependencies import get_admin_user
+from app.perfilador import perfilador
+from app.schemas import PerfiladoActivar
+
+router = APIRouter(prefix="/admin/perfiles", tags=["admin"], dependencies=[Depends(get_admin_user)])
+
+
+@router.get("/estado", response_model=dict, include_in_schema=False)
+def get_estado():
+    """Configuración actual del perfilador"""
+    return perfilador.estado()
+
+
+@router.post("/activar", response_model=dict, include_in_schema=False)
+def activar(config: PerfiladoActivar):
+    """Activa el perfilado por muestreo durante `duracion_segundos`"""
+    if not config.ruta and not config.fraccion:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Debe indicar una ruta o una fracción")
+    perfilador.activar(config.ruta, config.fraccion, config.duracion_segundos, config.intervalo_ms)
+    return perfilador.estado()
+
+
+@router.post("/desactivar", response_model=dict, include_in_schema=False)
+def desactivar():
+    perfilador.desactivar()
+    return perfilador.estado()
+
+
+@router.get("", response_model=List[dict], include_in_schema=False)
+def listar_perfiles():
+    """Perfiles guardados, del más reciente al más antiguo (sin las pilas)"""
+    return perfilador.listar()
+
+
+@router.get("/colapsado", response_class=PlainTextResponse, include_in_schema=False)
+def descargar_perfil(perfil_id: Optional[int] = None):
+    """
+    Pilas en formato colapsado de un perfil (o de todos los guardados), para
+    flamegraph.pl o speedscope.
+    """
+    contenido = perfilador.colapsado(perfil_id)
+    if contenido is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Perfil no encontrado")
+    nombre = f"perfil-{perfil_id}.folded" if perfil_id else "perfiles.folded"
+    return PlainTextResponse(contenido, headers={"Content-Disposition": f'attachment; filename="{nombre}"'})
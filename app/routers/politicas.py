@@ -1,31 +1,56 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
-from app.database import get_db
+from app.database import get_db, get_async_db
 from app.schemas import PoliticaCreate, PoliticaResponse, PoliticaUpdate
-from app.models import User, Natillera
-from app.auth.dependencies import get_current_user
+from app.models import User, Natillera, Politica
+from app.auth.dependencies import get_current_user, get_current_user_async
 from app.services.politica_service import PoliticaService
 from app.services.natillera_service import NatilleraService
+from app.services.membresia_service import MembresiaService
+from app.cache import cache_respuestas
+from app.respuestas import cabeceras_etag, etag_debil, no_modificado
 
 router = APIRouter(prefix="/politicas", tags=["politicas"])
 
 @router.get("/natillera/{natillera_id}", response_model=List[PoliticaResponse])
-def get_politicas_by_natillera(
+async def get_politicas_by_natillera(
     natillera_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    request: Request,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Obtiene todas las políticas de una natillera"""
     # Verificar que el usuario pertenece a la natillera
-    natillera = NatilleraService.get_natillera_by_id(db, natillera_id)
-    if not natillera:
+    natillera = (await db.execute(
+        select(Natillera.creator_id, Natillera.version).where(Natillera.id == natillera_id)
+    )).first()
+    if natillera is None:
         raise HTTPException(status_code=404, detail="Natillera no encontrada")
     
-    if current_user.id not in [member.id for member in natillera.members] and natillera.creator_id != current_user.id:
-        raise HTTPException(status_code=403, detail="No tienes acceso a esta natillera")
+    if natillera.creator_id != current_user.id:
+        if not await MembresiaService.es_miembro_async(db, natillera_id, current_user.id):
+            raise HTTPException(status_code=403, detail="No tienes acceso a esta natillera")
+    
+    etag = etag_debil("politicas", natillera_id, natillera.version)
+    respuesta_304 = no_modificado(request, etag)
+    if respuesta_304:
+        return respuesta_304
+    
+    rol = "creador" if natillera.creator_id == current_user.id else "miembro"
+    respuesta, clave_cache = await cache_respuestas.obtener_async("politicas", natillera_id, rol, natillera.version)
+    if respuesta:
+        respuesta.headers.update(cabeceras_etag(etag))
+        return respuesta
     
-    return PoliticaService.get_politicas_by_natillera(db, natillera_id)
+    resultado = await db.scalars(
+        select(Politica).where(Politica.natillera_id == natillera_id).order_by(Politica.orden)
+    )
+    respuesta = await cache_respuestas.guardar_async(clave_cache, resultado.all(), esquema=List[PoliticaResponse])
+    respuesta.headers.update(cabeceras_etag(etag))
+    return respuesta
 
 @router.post("/", response_model=PoliticaResponse, status_code=status.HTTP_201_CREATED)
 def create_politica(
@@ -3,16 +3,22 @@
 # Endpoint para ver pagos de un préstamo
 
 from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from decimal import Decimal
 from pydantic import BaseModel
 
-from app.database import get_db
-from app.auth.dependencies import get_current_user
-from app.models import User, Natillera
+from app.database import get_db, get_async_db
+from app.auth.dependencies import get_current_user, get_current_user_async
+from app.auth.contexto import ContextoAutorizacion, get_contexto_autorizacion
+from app.models import User, Natillera, Prestamo, EstadoPrestamo, PagoPrestamo, EstadoPago
 from app.schemas import PrestamoCreate, PrestamoUpdate, PrestamoResponse, PrestamoDetalle, PagoRequest, PagoPendienteResponse, PagosPrestamoResponse
 from app.services.prestamo_service import PrestamoService
+from app.cache import cache_respuestas
+from app.coalescencia import coalescedor
+from app.respuestas import OrjsonResponse
 
 router = APIRouter(prefix="/prestamos", tags=["prestamos"])
 
@@ -36,19 +42,15 @@ class PrestamosAgrupadosResponse(BaseModel):
 def create_prestamo(
     prestamo: PrestamoCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    contexto: ContextoAutorizacion = Depends(get_contexto_autorizacion)
 ):
     """
     Crea un nuevo préstamo y genera una transacción asociada.
     El creador de la natillera lo crea como aprobado, los miembros como pendiente.
     """
-    natillera = PrestamoService.get_natillera_by_id(db, prestamo.natillera_id)
-    if not natillera:
-        raise HTTPException(status_code=404, detail="Natillera no encontrada")
     # Permitir que el creador o cualquier miembro cree préstamos
-    is_member = PrestamoService.user_is_natillera_member(natillera, current_user)
-    if not is_member:
-        raise HTTPException(status_code=403, detail="Solo miembros de la natillera pueden crear préstamos")
+    contexto.requerir_miembro(prestamo.natillera_id, "Solo miembros de la natillera pueden crear préstamos")
     try:
         nuevo_prestamo = PrestamoService.create_prestamo(db, prestamo, current_user.id)
         return nuevo_prestamo
@@ -62,43 +64,36 @@ def get_prestamos_by_natillera(
     estado: Optional[str] = Query(None, description="Filtrar por estado: activo, pagado, vencido, cancelado"),
     referente_id: Optional[int] = Query(None, description="Filtrar por ID del referente"),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    contexto: ContextoAutorizacion = Depends(get_contexto_autorizacion)
 ):
     """
     Obtiene todos los préstamos de una natillera con filtros opcionales.
     Solo miembros de la natillera pueden ver los préstamos.
     """
     # Verificar que la natillera existe y el usuario es miembro
-    natillera = PrestamoService.get_natillera_by_id(db, natillera_id)
-    if not natillera:
-        raise HTTPException(status_code=404, detail="Natillera no encontrada")
-    if not PrestamoService.user_is_natillera_member(natillera, current_user):
-        raise HTTPException(
-            status_code=403,
-            detail="No tienes permiso para ver los préstamos de esta natillera"
-        )
+    contexto.requerir_miembro(natillera_id, "No tienes permiso para ver los préstamos de esta natillera")
     
     prestamos = PrestamoService.get_prestamos_by_natillera(
         db, natillera_id, estado, referente_id
     )
 
-    # Agrupar préstamos por estado de aprobación
-    aprobados = [p for p in prestamos if getattr(p, 'aprobado', None) is True]
-    rechazados = [p for p in prestamos if getattr(p, 'aprobado', None) is False]
-    pendientes = [p for p in prestamos if getattr(p, 'aprobado', None) is None]
+    # Agrupar préstamos por estado de aprobación (el campo no forma parte de la respuesta)
+    grupos = {True: [], False: [], None: []}
+    for prestamo in prestamos:
+        grupos[prestamo.pop("aprobado")].append(prestamo)
 
-    return {
-        "aprobados": aprobados,
-        "rechazados": rechazados,
-        "pendientes": pendientes
-    }
+    return OrjsonResponse({
+        "aprobados": grupos[True],
+        "rechazados": grupos[False],
+        "pendientes": grupos[None]
+    })
 
 
 @router.get("/{prestamo_id}", response_model=PrestamoDetalle)
 def get_prestamo_detalle(
     prestamo_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    contexto: ContextoAutorizacion = Depends(get_contexto_autorizacion)
 ):
     """
     Obtiene los detalles completos de un préstamo con cálculos de interés y saldo pendiente.
@@ -109,14 +104,7 @@ def get_prestamo_detalle(
         raise HTTPException(status_code=404, detail="Préstamo no encontrado")
     
     # Verificar que el usuario tiene permiso para ver este préstamo
-    natillera = PrestamoService.get_natillera_by_id(db, prestamo_detalle.natillera_id)
-    if not natillera:
-        raise HTTPException(status_code=404, detail="Natillera no encontrada")
-    if not PrestamoService.user_is_natillera_member(natillera, current_user):
-        raise HTTPException(
-            status_code=403,
-            detail="No tienes permiso para ver este préstamo"
-        )
+    contexto.requerir_miembro(prestamo_detalle.natillera_id, "No tienes permiso para ver este préstamo")
     
     return prestamo_detalle
 
@@ -142,7 +130,8 @@ def registrar_pago_prestamo(
     prestamo_id: int,
     pago_request: PagoRequest,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    contexto: ContextoAutorizacion = Depends(get_contexto_autorizacion)
 ):
     """
     Registra un pago parcial o total de un préstamo.
@@ -152,16 +141,7 @@ def registrar_pago_prestamo(
     prestamo = PrestamoService.get_prestamo_by_id_simple(db, prestamo_id)
     if not prestamo:
         raise HTTPException(status_code=404, detail="Préstamo no encontrado")
-    natillera = PrestamoService.get_natillera_by_id(db, prestamo.natillera_id)
-    if not natillera:
-        raise HTTPException(status_code=404, detail="Natillera no encontrada")
-    is_creator = PrestamoService.user_is_natillera_creator(natillera, current_user)
-    is_member = PrestamoService.user_is_natillera_member(natillera, current_user)
-    if not is_member:
-        raise HTTPException(
-            status_code=403,
-            detail="Solo miembros de la natillera pueden registrar pagos"
-        )
+    contexto.requerir_miembro(prestamo.natillera_id, "Solo miembros de la natillera pueden registrar pagos")
     
     try:
         prestamo_actualizado = PrestamoService.registrar_pago(
@@ -191,97 +171,104 @@ def get_pagos_pendientes(
 def get_resumen_prestamos(
     natillera_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    contexto: ContextoAutorizacion = Depends(get_contexto_autorizacion)
 ):
     """
     Obtiene el resumen agregado de préstamos de una natillera (optimizado).
     Retorna estadísticas calculadas en el backend para mejor rendimiento.
     """
     # Verificar que la natillera existe y el usuario es miembro
-    natillera = PrestamoService.get_natillera_by_id(db, natillera_id)
-    if not natillera:
-        raise HTTPException(status_code=404, detail="Natillera no encontrada")
-    if not PrestamoService.user_is_natillera_member(natillera, current_user):
-        raise HTTPException(
-            status_code=403,
-            detail="No tienes permiso para ver el resumen de esta natillera"
-        )
+    natillera = contexto.requerir_miembro(natillera_id, "No tienes permiso para ver el resumen de esta natillera")
     
-    resumen = PrestamoService.get_resumen_prestamos(db, natillera_id)
-    return resumen
+    rol = contexto.rol(natillera_id).value
+    respuesta, clave_cache = cache_respuestas.obtener("resumen_prestamos", natillera_id, rol, natillera.version)
+    if respuesta:
+        return respuesta
+    
+    # Peticiones simultáneas del mismo resumen comparten un solo cálculo
+    resumen = coalescedor.ejecutar(
+        "resumen_prestamos", clave_cache, lambda: PrestamoService.get_resumen_prestamos(db, natillera_id)
+    )
+    return cache_respuestas.guardar(clave_cache, resumen, esquema=ResumenPrestamos)
 
 @router.get("/natillera/{natillera_id}/pendientes/count", response_model=dict)
-def get_prestamos_pendientes_count(
+async def get_prestamos_pendientes_count(
     natillera_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Cuenta los préstamos pendientes de una natillera (solo creador)"""
-    from app.models import Prestamo
-    natillera = PrestamoService.get_natillera_by_id(db, natillera_id)
-    if not natillera:
+    creator_id = await db.scalar(select(Natillera.creator_id).where(Natillera.id == natillera_id))
+    if creator_id is None:
         raise HTTPException(status_code=404, detail="Natillera no encontrada")
-    if natillera.creator_id != current_user.id:
+    if creator_id != current_user.id:
         raise HTTPException(status_code=403, detail="Solo el creador puede ver los conteos")
     
-    count = db.query(Prestamo).filter(
-        Prestamo.natillera_id == natillera_id,
-        Prestamo.aprobado.is_(None)
-    ).count()
+    count = await db.scalar(
+        select(func.count(Prestamo.id)).where(
+            Prestamo.natillera_id == natillera_id,
+            Prestamo.aprobado.is_(None)
+        )
+    )
     return {"count": count}
 
 @router.get("/my-prestamos/aprobados/count", response_model=dict)
-def get_prestamos_aprobados_count(
+async def get_prestamos_aprobados_count(
     natillera_id: Optional[int] = None,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Cuenta los préstamos aprobados del usuario actual"""
-    from app.models import Prestamo, EstadoPrestamo
-    query = db.query(Prestamo).filter(
+    query = select(func.count(Prestamo.id)).where(
         Prestamo.referente_id == current_user.id,
         Prestamo.estado == EstadoPrestamo.ACTIVO
     )
     if natillera_id:
-        query = query.filter(Prestamo.natillera_id == natillera_id)
-    count = query.count()
+        query = query.where(Prestamo.natillera_id == natillera_id)
+    count = await db.scalar(query)
     return {"count": count}
 
 @router.get("/pagos/natillera/{natillera_id}/pendientes/count", response_model=dict)
-def get_pagos_pendientes_count(
+async def get_pagos_pendientes_count(
     natillera_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Cuenta los pagos pendientes de una natillera (solo creador)"""
-    from app.models import PagoPrestamo, EstadoPago, Prestamo
-    natillera = PrestamoService.get_natillera_by_id(db, natillera_id)
-    if not natillera:
+    creator_id = await db.scalar(select(Natillera.creator_id).where(Natillera.id == natillera_id))
+    if creator_id is None:
         raise HTTPException(status_code=404, detail="Natillera no encontrada")
-    if natillera.creator_id != current_user.id:
+    if creator_id != current_user.id:
         raise HTTPException(status_code=403, detail="Solo el creador puede ver los conteos")
     
-    count = db.query(PagoPrestamo).join(Prestamo).filter(
-        Prestamo.natillera_id == natillera_id,
-        PagoPrestamo.estado == EstadoPago.PENDIENTE
-    ).count()
+    count = await db.scalar(
+        select(func.count(PagoPrestamo.id))
+        .join(Prestamo, PagoPrestamo.prestamo_id == Prestamo.id)
+        .where(
+            Prestamo.natillera_id == natillera_id,
+            PagoPrestamo.estado == EstadoPago.PENDIENTE
+        )
+    )
     return {"count": count}
 
 @router.get("/pagos/my-pagos/aprobados/count", response_model=dict)
-def get_pagos_aprobados_count(
+async def get_pagos_aprobados_count(
     natillera_id: Optional[int] = None,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Cuenta los pagos aprobados del usuario actual"""
-    from app.models import PagoPrestamo, EstadoPago, Prestamo
-    query = db.query(PagoPrestamo).join(Prestamo).filter(
-        Prestamo.referente_id == current_user.id,
-        PagoPrestamo.estado == EstadoPago.APROBADO
+    query = (
+        select(func.count(PagoPrestamo.id))
+        .join(Prestamo, PagoPrestamo.prestamo_id == Prestamo.id)
+        .where(
+            Prestamo.referente_id == current_user.id,
+            PagoPrestamo.estado == EstadoPago.APROBADO
+        )
     )
     if natillera_id:
-        query = query.filter(Prestamo.natillera_id == natillera_id)
-    count = query.count()
+        query = query.where(Prestamo.natillera_id == natillera_id)
+    count = await db.scalar(query)
     return {"count": count}
 
 
@@ -341,7 +328,8 @@ def update_prestamo(
     prestamo_id: int,
     prestamo_update: PrestamoUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    contexto: ContextoAutorizacion = Depends(get_contexto_autorizacion)
 ):
     """
     Actualiza un préstamo (estado, monto pagado, notas).
@@ -351,14 +339,7 @@ def update_prestamo(
     prestamo_obj = PrestamoService.get_prestamo_by_id_simple(db, prestamo_id)
     if not prestamo_obj:
         raise HTTPException(status_code=404, detail="Préstamo no encontrado")
-    natillera = PrestamoService.get_natillera_by_id(db, prestamo_obj.natillera_id)
-    if not natillera:
-        raise HTTPException(status_code=404, detail="Natillera no encontrada")
-    if not PrestamoService.user_is_natillera_creator(natillera, current_user):
-        raise HTTPException(
-            status_code=403,
-            detail="Solo el creador de la natillera puede actualizar préstamos"
-        )
+    contexto.requerir_creador(prestamo_obj.natillera_id, "Solo el creador de la natillera puede actualizar préstamos")
     
     try:
         prestamo_actualizado = PrestamoService.update_prestamo(
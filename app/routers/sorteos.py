@@ -1,12 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional, Any
+import logging
 from app.database import get_db
 from app.schemas import SorteoCreate, SorteoResponse, SorteoFinalizadoResponse, BilleteLoteriaResponse, BilleteLoteriaAdmin, FinalizarSorteoRequest
 from app.models import User
 from app.auth.dependencies import get_current_user
 from app.services.sorteo_service import SorteoService
+from app.services.membresia_service import MembresiaService
+from app.services.version_service import VersionService
+from app.respuestas import OrjsonResponse, cabeceras_etag, etag_debil, no_modificado
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/sorteos", tags=["sorteos"])
 
@@ -17,8 +23,7 @@ def create_sorteo(
     db: Session = Depends(get_db)
 ):
     """Crea un nuevo sorteo"""
-    print(f"Datos recibidos: {sorteo}")
-    print(f"Usuario: {current_user.id}")
+    logger.debug("Creando sorteo", extra={"user_id": current_user.id, "natillera_id": sorteo.natillera_id})
     return SorteoService.create_sorteo(db, sorteo, current_user)
 
 @router.get("/activos", response_model=List[SorteoResponse])
@@ -35,7 +40,6 @@ def get_finalized_sorteos(
     db: Session = Depends(get_db)
 ):
     """Obtiene todos los sorteos finalizados de las natilleras del usuario"""
-    print(f"Obteniendo sorteos finalizados para el usuario {current_user.id}")
     result = SorteoService.get_finalized_sorteos_for_user(db, current_user)
     return result
 
@@ -51,7 +55,7 @@ def get_sorteo(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Sorteo no encontrado")
     
     # Verificar que el usuario pertenece a la natillera
-    if sorteo.natillera_id not in [n.id for n in current_user.natilleras]:
+    if not MembresiaService.es_miembro(db, sorteo.natillera_id, current_user.id):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No tienes acceso a este sorteo")
     
     return sorteo
@@ -59,6 +63,7 @@ def get_sorteo(
 @router.get("/{sorteo_id}/billetes", response_model=List[BilleteLoteriaResponse])
 def get_billetes_loteria(
     sorteo_id: int,
+    request: Request,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -68,10 +73,16 @@ def get_billetes_loteria(
     if not sorteo:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Sorteo no encontrado")
     
-    if sorteo.natillera_id not in [n.id for n in current_user.natilleras]:
+    if not MembresiaService.es_miembro(db, sorteo.natillera_id, current_user.id):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No tienes acceso a este sorteo")
     
-    return SorteoService.get_billetes_loteria(db, sorteo_id)
+    # Tomar o pagar un billete incrementa la versión de la natillera del sorteo
+    etag = etag_debil("billetes", sorteo_id, VersionService.obtener(db, sorteo.natillera_id))
+    respuesta_304 = no_modificado(request, etag)
+    if respuesta_304:
+        return respuesta_304
+    
+    return OrjsonResponse(SorteoService.get_billetes_loteria(db, sorteo_id), headers=cabeceras_etag(etag))
 
 @router.post("/{sorteo_id}/billetes/{numero}/tomar", response_model=BilleteLoteriaResponse)
 def tomar_billete_loteria(
@@ -106,11 +117,22 @@ def marcar_billete_pagado(
 @router.get("/{sorteo_id}/billetes/admin", response_model=List[BilleteLoteriaResponse])
 def get_billetes_admin(
     sorteo_id: int,
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Obtiene todos los billetes con información completa para el admin/creador"""
-    print(f"Endpoint admin llamado para sorteo {sorteo_id}, usuario {current_user.id}")
-    result = SorteoService.get_billetes_admin(db, sorteo_id, current_user)
-    print(f"Retornando {len(result)} billetes")
-    return result
\ No newline at end of file
+    sorteo = SorteoService.get_sorteo_by_id(db, sorteo_id)
+    if not sorteo:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Sorteo no encontrado")
+    if sorteo.creador_id != current_user.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No tienes acceso a esta información")
+    
+    etag = etag_debil("billetes-admin", sorteo_id, VersionService.obtener(db, sorteo.natillera_id))
+    respuesta_304 = no_modificado(request, etag)
+    if respuesta_304:
+        return respuesta_304
+    response.headers.update(cabeceras_etag(etag))
+    
+    return SorteoService.get_billetes_admin(db, sorteo_id, current_user)
\ No newline at end of file
@@ -1,61 +1,87 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func, and_
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import func, and_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from datetime import datetime
 from decimal import Decimal
 
-from app.database import get_db
+from app.database import get_db, get_async_db
 from app.models import Transaccion, Natillera, User, TipoTransaccion, Prestamo, Aporte
 from app.schemas import TransaccionCreate, TransaccionResponse, TransaccionUpdate, BalanceResponse, TipoTransaccionEnum
-from app.auth.dependencies import get_current_user
+from app.auth.dependencies import get_current_user, get_current_user_async
+from app.cache import cache_respuestas
+from app.coalescencia import coalescedor
+from app.respuestas import OrjsonResponse, cabeceras_etag, columnas_usuario, etag_debil, no_modificado, usuario_desde_fila
 
 router = APIRouter(prefix="/transacciones", tags=["transacciones"])
 
+# Campos de TransaccionResponse leídos directamente como columnas
+CAMPOS_TRANSACCION = (
+    "tipo", "categoria", "monto", "descripcion", "fecha", "id", "natillera_id",
+    "creado_por", "aporte_id", "prestamo_id", "created_at"
+)
+
 
 @router.get("/natilleras/{natillera_id}/balance", response_model=BalanceResponse)
-def get_balance(
+async def get_balance(
     natillera_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Obtener balance financiero de una natillera"""
     # Verificar que la natillera existe
-    natillera = db.query(Natillera).filter(Natillera.id == natillera_id).first()
-    if not natillera:
+    version = await db.scalar(select(Natillera.version).where(Natillera.id == natillera_id))
+    if version is None:
         raise HTTPException(status_code=404, detail="Natillera no encontrada")
     
     # Verificar que el usuario es el creador de la natillera
     # if natillera.creator_id != current_user.id:
     #     raise HTTPException(status_code=403, detail="Solo el creador puede acceder al balance de esta natillera")
     
-    # Calcular totales por tipo
-    efectivo = db.query(func.sum(Transaccion.monto)).filter(
-        and_(Transaccion.natillera_id == natillera_id, Transaccion.tipo == TipoTransaccion.EFECTIVO)
-    ).scalar() or Decimal(0)
-    
-    prestamos = db.query(func.sum(Transaccion.monto)).filter(
-        and_(Transaccion.natillera_id == natillera_id, Transaccion.tipo == TipoTransaccion.PRESTAMO)
-    ).scalar() or Decimal(0)
-    
-    ingresos = db.query(func.sum(Transaccion.monto)).filter(
-        and_(Transaccion.natillera_id == natillera_id, Transaccion.tipo == TipoTransaccion.INGRESO)
-    ).scalar() or Decimal(0)
+    # Sin transacciones nuevas desde la versión del cliente no se recalcula el balance
+    etag = etag_debil("balance", natillera_id, version)
+    respuesta_304 = no_modificado(request, etag)
+    if respuesta_304:
+        return respuesta_304
     
-    gastos = db.query(func.sum(Transaccion.monto)).filter(
-        and_(Transaccion.natillera_id == natillera_id, Transaccion.tipo == TipoTransaccion.GASTO)
-    ).scalar() or Decimal(0)
+    # El balance es el mismo para cualquier miembro
+    respuesta, clave_cache = await cache_respuestas.obtener_async("balance", natillera_id, "todos", version)
+    if respuesta:
+        respuesta.headers.update(cabeceras_etag(etag))
+        return respuesta
     
-    # Capital disponible = Efectivo - Préstamos + Ingresos - Gastos
-    capital_disponible = efectivo - prestamos + ingresos - gastos
+    async def calcular_balance() -> BalanceResponse:
+        # Calcular totales por tipo en una sola consulta agrupada
+        resultado = await db.execute(
+            select(Transaccion.tipo, func.sum(Transaccion.monto))
+            .where(Transaccion.natillera_id == natillera_id)
+            .group_by(Transaccion.tipo)
+        )
+        totales = {tipo: total or Decimal(0) for tipo, total in resultado.all()}
+        
+        efectivo = totales.get(TipoTransaccion.EFECTIVO, Decimal(0))
+        prestamos = totales.get(TipoTransaccion.PRESTAMO, Decimal(0))
+        ingresos = totales.get(TipoTransaccion.INGRESO, Decimal(0))
+        gastos = totales.get(TipoTransaccion.GASTO, Decimal(0))
+        
+        # Capital disponible = Efectivo - Préstamos + Ingresos - Gastos
+        capital_disponible = efectivo - prestamos + ingresos - gastos
+        
+        return BalanceResponse(
+            efectivo=efectivo,
+            prestamos=prestamos,
+            ingresos=ingresos,
+            gastos=gastos,
+            capital_disponible=capital_disponible
+        )
     
-    return BalanceResponse(
-        efectivo=efectivo,
-        prestamos=prestamos,
-        ingresos=ingresos,
-        gastos=gastos,
-        capital_disponible=capital_disponible
-    )
+    # Peticiones simultáneas del mismo balance comparten una sola consulta
+    balance = await coalescedor.ejecutar_async("balance", clave_cache, calcular_balance)
+    respuesta = await cache_respuestas.guardar_async(clave_cache, balance)
+    respuesta.headers.update(cabeceras_etag(etag))
+    return respuesta
 
 
 @router.get("/natilleras/{natillera_id}/transacciones", response_model=List[TransaccionResponse])
@@ -69,7 +95,7 @@ def get_transacciones(
 ):
     """Obtener transacciones de una natillera con filtros opcionales"""
     # Verificar que la natillera existe
-    natillera = db.query(Natillera).filter(Natillera.id == natillera_id).first()
+    natillera = db.get(Natillera, natillera_id)
     if not natillera:
         raise HTTPException(status_code=404, detail="Natillera no encontrada")
     
@@ -77,32 +103,46 @@ def get_transacciones(
     if natillera.creator_id != current_user.id:
         raise HTTPException(status_code=403, detail="Solo el creador puede acceder a las transacciones de esta natillera")
     
-    # Query base con joins para cargar relaciones
-    query = db.query(Transaccion).options(
-        joinedload(Transaccion.creador),
-        joinedload(Transaccion.aporte).joinedload(Aporte.user),
-        joinedload(Transaccion.prestamo).joinedload(Prestamo.referente)
-    ).filter(Transaccion.natillera_id == natillera_id)
+    # Consulta por columnas: el creador y el miembro (usuario del aporte o referente del préstamo)
+    # se leen con joins, sin construir objetos ORM
+    creador = aliased(User)
+    usuario_aporte = aliased(User)
+    referente = aliased(User)
+    query = (
+        select(
+            *[getattr(Transaccion, campo) for campo in CAMPOS_TRANSACCION],
+            *columnas_usuario(creador, "creador"),
+            *columnas_usuario(usuario_aporte, "aporte_user"),
+            *columnas_usuario(referente, "referente")
+        )
+        .join(creador, Transaccion.creado_por == creador.id)
+        .outerjoin(Aporte, Transaccion.aporte_id == Aporte.id)
+        .outerjoin(usuario_aporte, Aporte.user_id == usuario_aporte.id)
+        .outerjoin(Prestamo, Transaccion.prestamo_id == Prestamo.id)
+        .outerjoin(referente, Prestamo.referente_id == referente.id)
+        .where(Transaccion.natillera_id == natillera_id)
+    )
     
     # Aplicar filtros
     if tipo:
-        query = query.filter(Transaccion.tipo == tipo)
+        query = query.where(Transaccion.tipo == tipo)
     if mes:
-        query = query.filter(func.extract('month', Transaccion.fecha) == mes)
+        query = query.where(func.extract('month', Transaccion.fecha) == mes)
     if anio:
-        query = query.filter(func.extract('year', Transaccion.fecha) == anio)
+        query = query.where(func.extract('year', Transaccion.fecha) == anio)
     
     # Ordenar por fecha descendente
-    transacciones = query.order_by(Transaccion.fecha.desc()).all()
-    
-    # Asignar miembro a cada transacción
-    for transaccion in transacciones:
-        if transaccion.aporte:
-            transaccion.miembro = transaccion.aporte.user
-        elif transaccion.prestamo:
-            transaccion.miembro = transaccion.prestamo.referente
+    filas = db.execute(query.order_by(Transaccion.fecha.desc())).all()
     
-    return transacciones
+    return OrjsonResponse([
+        {
+            **{campo: fila._mapping[campo] for campo in CAMPOS_TRANSACCION},
+            "creador": usuario_desde_fila(fila, "creador"),
+            # Miembro asociado: usuario del aporte o, si no hay, referente del préstamo
+            "miembro": usuario_desde_fila(fila, "aporte_user") or usuario_desde_fila(fila, "referente")
+        }
+        for fila in filas
+    ])
 
 
 @router.post("/", response_model=TransaccionResponse, status_code=status.HTTP_201_CREATED)
@@ -113,7 +153,7 @@ def create_transaccion(
 ):
     """Crear una nueva transacción (manual, no efectivo)"""
     # Verificar que la natillera existe
-    natillera = db.query(Natillera).filter(Natillera.id == transaccion.natillera_id).first()
+    natillera = db.get(Natillera, transaccion.natillera_id)
     if not natillera:
         raise HTTPException(status_code=404, detail="Natillera no encontrada")
     
@@ -145,7 +185,6 @@ def create_transaccion(
     
     db.add(nueva_transaccion)
     db.commit()
-    db.refresh(nueva_transaccion)
     
     return nueva_transaccion
 
@@ -164,7 +203,7 @@ def update_transaccion(
         raise HTTPException(status_code=404, detail="Transacción no encontrada")
     
     # Verificar que el usuario es el creador de la natillera
-    natillera = db.query(Natillera).filter(Natillera.id == transaccion.natillera_id).first()
+    natillera = db.get(Natillera, transaccion.natillera_id)
     if natillera.creator_id != current_user.id:
         raise HTTPException(status_code=403, detail="Solo el creador puede editar transacciones")
     
@@ -188,7 +227,6 @@ def update_transaccion(
         transaccion.fecha = transaccion_update.fecha
     
     db.commit()
-    db.refresh(transaccion)
     
     return transaccion
 
@@ -206,7 +244,7 @@ def delete_transaccion(
         raise HTTPException(status_code=404, detail="Transacción no encontrada")
     
     # Verificar que el usuario es el creador de la natillera
-    natillera = db.query(Natillera).filter(Natillera.id == transaccion.natillera_id).first()
+    natillera = db.get(Natillera, transaccion.natillera_id)
     if natillera.creator_id != current_user.id:
         raise HTTPException(status_code=403, detail="Solo el creador puede eliminar transacciones")
     
@@ -3,12 +3,12 @@ from sqlalchemy.orm import Session
 from app.database import get_db
 from app.schemas import UserResponse
 from app.models import User
-from app.auth.dependencies import get_current_user
+from app.auth.dependencies import get_current_user, get_current_user_async
 
 router = APIRouter(prefix="/users", tags=["users"])
 
 @router.get("/me", response_model=UserResponse)
-def get_current_user_info(current_user: User = Depends(get_current_user)):
+async def get_current_user_info(current_user: User = Depends(get_current_user_async)):
     """Obtiene la información del usuario actual"""
     return current_user
 
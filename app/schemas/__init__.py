@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from typing import Optional, List
 from datetime import datetime, date
 from decimal import Decimal
@@ -320,6 +320,18 @@ class PoliticaResponse(PoliticaBase):
         from_attributes = True
 
 
+# Archivo Adjunto Schemas
+class ArchivoAdjuntoResponse(BaseModel):
+    """Respuesta de un archivo adjunto; ruta_archivo contiene la URL presigned de descarga"""
+    id: int
+    nombre_archivo: str
+    ruta_archivo: str
+    tipo_archivo: str
+    tamano: int
+    fecha_subida: datetime
+    url_miniatura: Optional[str] = None
+
+
 # Sorteo Schemas
 class SorteoBase(BaseModel):
     tipo: TipoSorteoEnum
@@ -388,3 +400,11 @@ class BilleteLoteriaAdmin(BilleteLoteriaWithUser):
 class FinalizarSorteoRequest(BaseModel):
     """Esquema para la petición de finalizar sorteo"""
     numero_ganador: Optional[str] = None
+
+
+class PerfiladoActivar(BaseModel):
+    """Activación del perfilador: una ruta (plantilla de path) y/o una fracción de todas las peticiones"""
+    ruta: Optional[str] = None
+    fraccion: float = Field(0.0, ge=0, le=1)
+    duracion_segundos: float = Field(300.0, gt=0, le=3600)
+    intervalo_ms: float = Field(5.0, ge=1, le=1000)
@@ -1,5 +1,5 @@
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_, func
+from sqlalchemy import and_, func, select
 from sqlalchemy.exc import IntegrityError
 from app.models import Aporte, Natillera, User, AporteStatus, Transaccion, TipoTransaccion, ArchivoAdjunto
 from app.schemas import AporteCreate, AporteUpdate
@@ -7,6 +7,13 @@ from typing import List, Optional
 from fastapi import HTTPException, status
 from datetime import datetime
 from app.services.natillera_service import NatilleraService
+from app.respuestas import columnas_usuario, usuario_desde_fila
+
+# Campos de AporteResponse leídos directamente como columnas
+CAMPOS_APORTE = (
+    "amount", "month", "year", "id", "user_id", "natillera_id",
+    "status", "rejection_reason", "created_at", "updated_at"
+)
 
 class AporteService:
     @staticmethod
@@ -18,7 +25,7 @@ class AporteService:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Natillera no encontrada")
         
         # Verificar que el usuario es miembro
-        if not NatilleraService.is_member(natillera, user):
+        if not NatilleraService.is_member(db, natillera, user):
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No eres miembro de esta natillera")
         
         # Permitir múltiples aportes por mes - comentamos la validación
@@ -48,7 +55,6 @@ class AporteService:
         
         db.add(db_aporte)
         db.commit()
-        db.refresh(db_aporte)
         return db_aporte
     
     @staticmethod
@@ -70,8 +76,11 @@ class AporteService:
         return aportes
     
     @staticmethod
-    def get_natillera_aportes(db: Session, natillera_id: int, current_user: User) -> List[Aporte]:
-        """Obtiene todos los aportes de una natillera (solo creador)"""
+    def get_natillera_aportes(db: Session, natillera_id: int, current_user: User) -> List[dict]:
+        """
+        Obtiene todos los aportes de una natillera (solo creador) como dicts con la
+        forma de AporteResponse, consultando solo las columnas necesarias.
+        """
         natillera = NatilleraService.get_natillera_by_id(db, natillera_id)
         if not natillera:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Natillera no encontrada")
@@ -83,15 +92,31 @@ class AporteService:
                 detail="Solo el creador puede ver todos los aportes"
             )
         
-        aportes = db.query(Aporte).filter(Aporte.natillera_id == natillera_id).options(joinedload(Aporte.user)).all()
-        
-        # Agregar conteo de archivos adjuntos a cada aporte
-        for aporte in aportes:
-            aporte.archivos_adjuntos_count = db.query(func.count(ArchivoAdjunto.id)).filter(
-                ArchivoAdjunto.id_aporte == aporte.id
-            ).scalar() or 0
-        
-        return aportes
+        # Conteo de archivos adjuntos como subconsulta correlacionada (una sola consulta)
+        conteo_archivos = (
+            select(func.count(ArchivoAdjunto.id))
+            .where(ArchivoAdjunto.id_aporte == Aporte.id)
+            .correlate(Aporte)
+            .scalar_subquery()
+        )
+        filas = db.execute(
+            select(
+                *[getattr(Aporte, campo) for campo in CAMPOS_APORTE],
+                *columnas_usuario(User, "user"),
+                conteo_archivos.label("archivos_adjuntos_count")
+            )
+            .join(User, Aporte.user_id == User.id)
+            .where(Aporte.natillera_id == natillera_id)
+        ).all()
+        
+        return [
+            {
+                **{campo: fila._mapping[campo] for campo in CAMPOS_APORTE},
+                "user": usuario_desde_fila(fila, "user"),
+                "archivos_adjuntos_count": fila.archivos_adjuntos_count or 0
+            }
+            for fila in filas
+        ]
     
     @staticmethod
     def update_aporte_status(
@@ -147,7 +172,6 @@ class AporteService:
         
         try:
             db.commit()
-            db.refresh(aporte)
         except IntegrityError as e:
             # Si hay error de duplicado en transacción, hacer rollback y solo actualizar el aporte
             db.rollback()
@@ -156,7 +180,6 @@ class AporteService:
             if new_status == AporteStatus.RECHAZADO:
                 aporte.rejection_reason = update.rejection_reason
             db.commit()
-            db.refresh(aporte)
         
         return aporte
     
@@ -1,15 +1,132 @@
 from sqlalchemy.orm import Session
-from app.models import ArchivoAdjunto, Aporte, PagoPrestamo, User
+from sqlalchemy import update, delete
+from sqlalchemy.exc import IntegrityError
+from app.models import ArchivoAdjunto, Aporte, PagoPrestamo, User, ObjetoAlmacenado
+from app.schemas import ArchivoAdjuntoResponse
 from app.config import settings
-import boto3
-from botocore.client import Config
+from app.services.presigned_url_cache import presigned_url_cache
+from app.services.miniatura_service import MiniaturaService
+from app.services.membresia_service import MembresiaService
 from fastapi import UploadFile, HTTPException
-import uuid
+from typing import Optional
 from datetime import datetime
-import mimetypes
+import hashlib
+import logging
+import threading
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Tamaño de los bloques usados al transmitir archivos desde MinIO
+CHUNK_SIZE_DESCARGA = 64 * 1024  # 64KB
+
+# Tamaño máximo permitido para un archivo adjunto
+TAMANO_MAXIMO_ARCHIVO = 5 * 1024 * 1024  # 5MB
+
+# Cliente S3 compartido (los clientes de boto3 son thread-safe); se crea en el primer uso
+_cliente_s3 = None
+_cliente_s3_lock = threading.Lock()
+
+
+class ArchivoDemasiadoGrande(Exception):
+    """Se lanza cuando el archivo supera el tamaño máximo mientras se transmite"""
+    pass
+
+
+class _LectorLimitado:
+    """
+    Envuelve el archivo temporal de la subida y lo entrega por bloques,
+    contando los bytes leídos y cortando la lectura si supera el límite.
+    """
+
+    def __init__(self, archivo, limite: int):
+        self._archivo = archivo
+        self._limite = limite
+        self.leidos = 0
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            # Nunca leer más de lo necesario para detectar que se superó el límite
+            size = self._limite - self.leidos + 1
+        bloque = self._archivo.read(size)
+        self.leidos += len(bloque)
+        if self.leidos > self._limite:
+            raise ArchivoDemasiadoGrande()
+        return bloque
+
 
 class ArchivoAdjuntoService:
 
+    @staticmethod
+    def _obtener_cliente_s3():
+        """
+        Retorna el cliente S3 configurado para MinIO. boto3 se importa y el cliente se
+        crea en la primera llamada (no al importar el módulo) y luego se reutiliza.
+        """
+        global _cliente_s3
+        if _cliente_s3 is None:
+            with _cliente_s3_lock:
+                if _cliente_s3 is None:
+                    import boto3
+                    from botocore.client import Config
+
+                    _cliente_s3 = boto3.client(
+                        's3',
+                        endpoint_url=settings.MINIO_ENDPOINT,
+                        aws_access_key_id=settings.MINIO_ACCESS_KEY,
+                        aws_secret_access_key=settings.MINIO_SECRET_KEY,
+                        config=Config(
+                            signature_version='s3v4',
+                            region_name='us-east-1',
+                            s3={'addressing_style': 'path'}
+                        ),
+                        verify=False
+                    )
+        return _cliente_s3
+
+    @staticmethod
+    def iterar_objeto(cuerpo, chunk_size: int = CHUNK_SIZE_DESCARGA):
+        """
+        Recorre el cuerpo de un objeto de MinIO por bloques, cerrando la conexión al terminar.
+        Mantiene constante la memoria usada por cada descarga.
+        """
+        try:
+            for bloque in cuerpo.iter_chunks(chunk_size=chunk_size):
+                yield bloque
+        finally:
+            cuerpo.close()
+
+    @staticmethod
+    def _firmar_url(key: str, expiracion: int) -> str:
+        """
+        Genera una URL presigned de descarga para la key indicada.
+        """
+        s3_client = ArchivoAdjuntoService._obtener_cliente_s3()
+        return s3_client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': settings.MINIO_BUCKET_NAME, 'Key': key},
+            ExpiresIn=expiracion
+        )
+
+    @staticmethod
+    def _a_respuesta(archivo: ArchivoAdjunto) -> ArchivoAdjuntoResponse:
+        """
+        Construye la respuesta de un archivo con su URL de descarga (1 hora).
+        La key guardada en el modelo nunca se modifica.
+        """
+        return ArchivoAdjuntoResponse(
+            id=archivo.id,
+            nombre_archivo=archivo.nombre_archivo,
+            ruta_archivo=presigned_url_cache.obtener(archivo.ruta_archivo, ArchivoAdjuntoService._firmar_url),
+            tipo_archivo=archivo.tipo_archivo,
+            tamano=archivo.tamano,
+            fecha_subida=archivo.fecha_subida,
+            url_miniatura=(
+                presigned_url_cache.obtener(archivo.ruta_miniatura, ArchivoAdjuntoService._firmar_url)
+                if archivo.ruta_miniatura else None
+            )
+        )
+
     @staticmethod
     def subir_archivo_adjunto(
         db: Session,
@@ -17,9 +134,11 @@ class ArchivoAdjuntoService:
         id_usuario: int,
         id_aporte: int = None,
         id_pago_prestamo: int = None
-    ) -> ArchivoAdjunto:
+    ) -> ArchivoAdjuntoResponse:
         """
-        Sube un archivo adjunto a Firebase Storage y crea el registro en la base de datos.
+        Sube un archivo adjunto a MinIO y crea el registro en la base de datos.
+        Los objetos se guardan direccionados por su SHA-256, así que un contenido
+        repetido se almacena y transfiere una sola vez.
         """
         # Validar que se proporcione al menos un ID de aporte o pago
         if not id_aporte and not id_pago_prestamo:
@@ -30,8 +149,7 @@ class ArchivoAdjuntoService:
         if not usuario:
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
 
-        # Validar aporte si se proporciona y obtener natillera_id
-        natillera_id = None
+        # Validar aporte si se proporciona
         if id_aporte:
             aporte = db.query(Aporte).filter(Aporte.id == id_aporte).first()
             if not aporte:
@@ -39,9 +157,8 @@ class ArchivoAdjuntoService:
             # Verificar que el usuario es el propietario del aporte
             if aporte.user_id != id_usuario:
                 raise HTTPException(status_code=403, detail="No tienes permisos para subir archivos a este aporte")
-            natillera_id = aporte.natillera_id
 
-        # Validar pago de préstamo si se proporciona y obtener natillera_id
+        # Validar pago de préstamo si se proporciona
         if id_pago_prestamo:
             pago = db.query(PagoPrestamo).filter(PagoPrestamo.id == id_pago_prestamo).first()
             if not pago:
@@ -49,7 +166,6 @@ class ArchivoAdjuntoService:
             # Verificar que el usuario es el registrador del pago
             if pago.registrado_por != id_usuario:
                 raise HTTPException(status_code=403, detail="No tienes permisos para subir archivos a este pago")
-            natillera_id = pago.prestamo.natillera_id
 
         # Validar tipo de archivo (solo PDFs, imágenes, documentos comunes)
         tipos_permitidos = [
@@ -60,77 +176,138 @@ class ArchivoAdjuntoService:
         if archivo.content_type not in tipos_permitidos:
             raise HTTPException(status_code=400, detail="Tipo de archivo no permitido")
 
-        # Validar tamaño (máximo 5MB)
-        max_size = 5 * 1024 * 1024  # 5MB
-        contenido = archivo.file.read()
-        if len(contenido) > max_size:
-            raise HTTPException(status_code=400, detail="Archivo demasiado grande (máximo 5MB)")
-
-        # Generar nombre único para el archivo
-        extension = mimetypes.guess_extension(archivo.content_type) or '.bin'
-        nombre_unico = f"{uuid.uuid4()}{extension}"
-
-        # Subir a MinIO (compatible con S3)
+        # Calcular el SHA-256 leyendo el archivo temporal por bloques, validando el tamaño
+        # máximo (5MB) mientras se recorre. El hash se necesita antes de subir: si el
+        # contenido ya está almacenado no se transfiere de nuevo
         try:
-            print(f"MinIO config: endpoint={settings.MINIO_ENDPOINT}, bucket={settings.MINIO_BUCKET_NAME}")
-            s3_client = boto3.client(
-                's3',
-                endpoint_url=settings.MINIO_ENDPOINT,
-                aws_access_key_id=settings.MINIO_ACCESS_KEY,
-                aws_secret_access_key=settings.MINIO_SECRET_KEY,
-                config=Config(
-                    signature_version='s3v4',
-                    region_name='us-east-1',
-                    s3={'addressing_style': 'path'}
-                ),
-                verify=False
-            )
+            hash_sha256, tamano = ArchivoAdjuntoService._calcular_hash(archivo.file)
+        except ArchivoDemasiadoGrande:
+            raise HTTPException(status_code=400, detail="Archivo demasiado grande (máximo 5MB)")
 
-            key = f"{natillera_id}/archivos_adjuntos/{nombre_unico}"
-            print(f"Uploading to key: {key}")
-            s3_client.put_object(
-                Bucket=settings.MINIO_BUCKET_NAME,
-                Key=key,
-                Body=contenido,
-                ContentType=archivo.content_type
-                # Removido ACL para evitar errores en MinIO
-            )
-            print(f"File uploaded to MinIO with key: {key}")
-            # Generar URL presigned para acceso temporal (1 hora)
-            url = s3_client.generate_presigned_url(
-                'get_object',
-                Params={'Bucket': settings.MINIO_BUCKET_NAME, 'Key': key},
-                ExpiresIn=3600  # 1 hora
-            )
-            print(f"Generated presigned URL: {url}")
-
-        except Exception as e:
-            print(f"Error subiendo a MinIO: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Error subiendo archivo a MinIO: {str(e)}")
+        # Si el contenido ya existe solo se suma una referencia; no se vuelve a subir
+        key = ArchivoAdjuntoService._agregar_referencia(db, hash_sha256)
+        ruta_miniatura = None
+        reutilizado = key is not None
+        if reutilizado:
+            # Reutilizar la miniatura ya generada para el mismo contenido
+            ruta_miniatura = db.query(ArchivoAdjunto.ruta_miniatura).filter(
+                ArchivoAdjunto.hash_sha256 == hash_sha256,
+                ArchivoAdjunto.ruta_miniatura.isnot(None)
+            ).limit(1).scalar()
+        else:
+            # Key única por objeto almacenado (la deduplicación usa la key guardada en
+            # ObjetoAlmacenado): una subida nunca reutiliza una key que se está borrando
+            key = f"archivos_adjuntos/sha256/{hash_sha256}/{uuid.uuid4().hex}"
+            ArchivoAdjuntoService._subir_objeto(archivo, key, tamano)
+            try:
+                # SAVEPOINT: si falla solo se deshace este INSERT, no el resto de la sesión
+                with db.begin_nested():
+                    db.add(ObjetoAlmacenado(
+                        hash_sha256=hash_sha256,
+                        ruta_archivo=key,
+                        tipo_archivo=archivo.content_type,
+                        tamano=tamano,
+                        referencias=1
+                    ))
+            except IntegrityError:
+                # Otra subida concurrente registró el mismo contenido primero: se usa su objeto
+                ArchivoAdjuntoService._borrar_de_minio(key)
+                reutilizado = True
+                key = ArchivoAdjuntoService._agregar_referencia(db, hash_sha256)
+                if key is None:
+                    raise HTTPException(status_code=500, detail="Error registrando el archivo, intenta de nuevo")
 
         # Crear registro en la base de datos
         nuevo_archivo = ArchivoAdjunto(
             nombre_archivo=archivo.filename,
             ruta_archivo=key,  # Guardar la key
             tipo_archivo=archivo.content_type,
-            tamano=len(contenido),
+            tamano=tamano,
             fecha_subida=datetime.utcnow(),
             id_aporte=id_aporte,
             id_pago_prestamo=id_pago_prestamo,
-            id_usuario=id_usuario
+            id_usuario=id_usuario,
+            hash_sha256=hash_sha256,
+            ruta_miniatura=ruta_miniatura
         )
 
         db.add(nuevo_archivo)
         db.commit()
-        db.refresh(nuevo_archivo)
 
-        # Generar URL para el response
-        nuevo_archivo.ruta_archivo = url  # Cambiar temporalmente para response
+        # Generar la miniatura en segundo plano para que los listados no descarguen el original.
+        # Solo la subida que almacenó el objeto la encola: el worker la asocia a todas las
+        # filas con la misma key
+        if not reutilizado:
+            MiniaturaService.encolar(key, archivo.content_type)
+        elif ruta_miniatura is None:
+            # La miniatura del objeto se estaba generando: si el worker la asoció antes de
+            # este commit, esta fila no la recibió
+            ruta_miniatura = db.query(ArchivoAdjunto.ruta_miniatura).filter(
+                ArchivoAdjunto.ruta_archivo == key,
+                ArchivoAdjunto.ruta_miniatura.isnot(None)
+            ).limit(1).scalar()
+            if ruta_miniatura is not None:
+                nuevo_archivo.ruta_miniatura = ruta_miniatura
+                db.commit()
+
+        return ArchivoAdjuntoService._a_respuesta(nuevo_archivo)
+
+    @staticmethod
+    def _calcular_hash(archivo_temporal) -> tuple[str, int]:
+        """
+        Calcula el SHA-256 y el tamaño del archivo temporal leyéndolo por bloques.
+        Lanza ArchivoDemasiadoGrande si supera el tamaño máximo.
+        """
+        archivo_temporal.seek(0)
+        lector = _LectorLimitado(archivo_temporal, TAMANO_MAXIMO_ARCHIVO)
+        sha256 = hashlib.sha256()
+        while True:
+            bloque = lector.read(CHUNK_SIZE_DESCARGA)
+            if not bloque:
+                break
+            sha256.update(bloque)
+        return sha256.hexdigest(), lector.leidos
 
-        return nuevo_archivo
+    @staticmethod
+    def _agregar_referencia(db: Session, hash_sha256: str) -> Optional[str]:
+        """
+        Incrementa de forma atómica las referencias de un objeto existente.
+        Retorna su key, o None si el contenido aún no está almacenado.
+        """
+        return db.execute(
+            update(ObjetoAlmacenado)
+            .where(ObjetoAlmacenado.hash_sha256 == hash_sha256)
+            .values(referencias=ObjetoAlmacenado.referencias + 1)
+            .returning(ObjetoAlmacenado.ruta_archivo)
+        ).scalar()
 
     @staticmethod
-    def obtener_archivos_por_aporte(db: Session, id_aporte: int, id_usuario: int) -> list[ArchivoAdjunto]:
+    def _subir_objeto(archivo: UploadFile, key: str, tamano: int):
+        """
+        Sube a MinIO (compatible con S3) el archivo temporal en un solo PUT: botocore
+        lo transmite por bloques desde el disco. El tamaño ya se validó al calcular el
+        hash y no supera los 5MB de una parte de S3, así que no hace falta multipart.
+        """
+        archivo.file.seek(0)
+        try:
+            s3_client = ArchivoAdjuntoService._obtener_cliente_s3()
+
+            s3_client.put_object(
+                Bucket=settings.MINIO_BUCKET_NAME,
+                Key=key,
+                Body=archivo.file,
+                ContentLength=tamano,
+                ContentType=archivo.content_type
+                # Removido ACL para evitar errores en MinIO
+            )
+            logger.debug("Archivo subido a MinIO", extra={"key": key, "bucket": settings.MINIO_BUCKET_NAME})
+
+        except Exception as e:
+            logger.exception("Error subiendo a MinIO", extra={"key": key})
+            raise HTTPException(status_code=500, detail=f"Error subiendo archivo a MinIO: {str(e)}")
+
+    @staticmethod
+    def obtener_archivos_por_aporte(db: Session, id_aporte: int, id_usuario: int) -> list[ArchivoAdjuntoResponse]:
         """
         Obtiene todos los archivos adjuntos de un aporte.
         """
@@ -139,33 +316,15 @@ class ArchivoAdjuntoService:
             raise HTTPException(status_code=404, detail="Aporte no encontrado")
 
         # Verificar permisos (usuario debe ser miembro de la natillera)
-        if aporte.user_id != id_usuario and not any(u.id == id_usuario for u in aporte.natillera.members):
+        if aporte.user_id != id_usuario and not MembresiaService.es_miembro(db, aporte.natillera_id, id_usuario):
             raise HTTPException(status_code=403, detail="No tienes permisos para ver estos archivos")
 
         archivos = db.query(ArchivoAdjunto).filter(ArchivoAdjunto.id_aporte == id_aporte).all()
-        # Generar URLs para cada archivo
-        s3_client = boto3.client(
-            's3',
-            endpoint_url=settings.MINIO_ENDPOINT,
-            aws_access_key_id=settings.MINIO_ACCESS_KEY,
-            aws_secret_access_key=settings.MINIO_SECRET_KEY,
-            config=Config(
-                signature_version='s3v4',
-                region_name='us-east-1',
-                s3={'addressing_style': 'path'}
-            ),
-            verify=False
-        )
-        for archivo in archivos:
-            archivo.ruta_archivo = s3_client.generate_presigned_url(
-                'get_object',
-                Params={'Bucket': settings.MINIO_BUCKET_NAME, 'Key': archivo.ruta_archivo},
-                ExpiresIn=3600
-            )
-        return archivos
+        # Generar URLs (reutilizando las que siguen vigentes en caché)
+        return [ArchivoAdjuntoService._a_respuesta(archivo) for archivo in archivos]
 
     @staticmethod
-    def obtener_archivos_por_pago_prestamo(db: Session, id_pago_prestamo: int, id_usuario: int) -> list[ArchivoAdjunto]:
+    def obtener_archivos_por_pago_prestamo(db: Session, id_pago_prestamo: int, id_usuario: int) -> list[ArchivoAdjuntoResponse]:
         """
         Obtiene todos los archivos adjuntos de un pago de préstamo.
         """
@@ -174,35 +333,17 @@ class ArchivoAdjuntoService:
             raise HTTPException(status_code=404, detail="Pago de préstamo no encontrado")
 
         # Verificar permisos (usuario debe ser miembro de la natillera)
-        if pago.registrado_por != id_usuario and not any(u.id == id_usuario for u in pago.prestamo.natillera.members):
+        if pago.registrado_por != id_usuario and not MembresiaService.es_miembro(db, pago.prestamo.natillera_id, id_usuario):
             raise HTTPException(status_code=403, detail="No tienes permisos para ver estos archivos")
 
         archivos = db.query(ArchivoAdjunto).filter(ArchivoAdjunto.id_pago_prestamo == id_pago_prestamo).all()
-        # Generar URLs
-        s3_client = boto3.client(
-            's3',
-            endpoint_url=settings.MINIO_ENDPOINT,
-            aws_access_key_id=settings.MINIO_ACCESS_KEY,
-            aws_secret_access_key=settings.MINIO_SECRET_KEY,
-            config=Config(
-                signature_version='s3v4',
-                region_name='us-east-1',
-                s3={'addressing_style': 'path'}
-            ),
-            verify=False
-        )
-        for archivo in archivos:
-            archivo.ruta_archivo = s3_client.generate_presigned_url(
-                'get_object',
-                Params={'Bucket': settings.MINIO_BUCKET_NAME, 'Key': archivo.ruta_archivo},
-                ExpiresIn=3600
-            )
-        return archivos
+        # Generar URLs (reutilizando las que siguen vigentes en caché)
+        return [ArchivoAdjuntoService._a_respuesta(archivo) for archivo in archivos]
 
     @staticmethod
-    def obtener_archivo_por_id(db: Session, id_archivo: int, id_usuario: int) -> ArchivoAdjunto:
+    def _obtener_archivo_autorizado(db: Session, id_archivo: int, id_usuario: int) -> ArchivoAdjunto:
         """
-        Obtiene un archivo adjunto por ID con verificación de permisos.
+        Obtiene el modelo de un archivo adjunto verificando que el usuario pueda acceder a él.
         """
         archivo = db.query(ArchivoAdjunto).filter(ArchivoAdjunto.id == id_archivo).first()
         if not archivo:
@@ -212,65 +353,73 @@ class ArchivoAdjuntoService:
         if archivo.id_usuario != id_usuario:
             # Si no es el propietario, verificar si es miembro de la natillera relacionada
             if archivo.aporte:
-                if not any(u.id == id_usuario for u in archivo.aporte.natillera.members):
+                if not MembresiaService.es_miembro(db, archivo.aporte.natillera_id, id_usuario):
                     raise HTTPException(status_code=403, detail="No tienes permisos para acceder a este archivo")
             elif archivo.pago_prestamo:
-                if not any(u.id == id_usuario for u in archivo.pago_prestamo.prestamo.natillera.members):
+                if not MembresiaService.es_miembro(db, archivo.pago_prestamo.prestamo.natillera_id, id_usuario):
                     raise HTTPException(status_code=403, detail="No tienes permisos para acceder a este archivo")
 
-        # Generar URL
-        s3_client = boto3.client(
-            's3',
-            endpoint_url=settings.MINIO_ENDPOINT,
-            aws_access_key_id=settings.MINIO_ACCESS_KEY,
-            aws_secret_access_key=settings.MINIO_SECRET_KEY,
-            config=Config(
-                signature_version='s3v4',
-                region_name='us-east-1',
-                s3={'addressing_style': 'path'}
-            ),
-            verify=False
-        )
-        archivo.ruta_archivo = s3_client.generate_presigned_url(
-            'get_object',
-            Params={'Bucket': settings.MINIO_BUCKET_NAME, 'Key': archivo.ruta_archivo},
-            ExpiresIn=3600
-        )
         return archivo
 
+    @staticmethod
+    def obtener_archivo_por_id(db: Session, id_archivo: int, id_usuario: int) -> ArchivoAdjuntoResponse:
+        """
+        Obtiene un archivo adjunto por ID con verificación de permisos.
+        """
+        archivo = ArchivoAdjuntoService._obtener_archivo_autorizado(db, id_archivo, id_usuario)
+        return ArchivoAdjuntoService._a_respuesta(archivo)
+
     @staticmethod
     def eliminar_archivo(db: Session, id_archivo: int, id_usuario: int):
         """
-        Elimina un archivo adjunto y lo borra de Firebase Storage.
+        Elimina un archivo adjunto. El objeto en MinIO solo se borra cuando
+        ningún otro archivo adjunto hace referencia a su contenido.
         """
-        archivo = ArchivoAdjuntoService.obtener_archivo_por_id(db, id_archivo, id_usuario)
+        archivo = ArchivoAdjuntoService._obtener_archivo_autorizado(db, id_archivo, id_usuario)
 
         # Solo el propietario puede eliminar
         if archivo.id_usuario != id_usuario:
             raise HTTPException(status_code=403, detail="Solo el propietario puede eliminar este archivo")
 
-        # Eliminar de MinIO
-        try:
-            s3_client = boto3.client(
-                's3',
-                endpoint_url=settings.MINIO_ENDPOINT,
-                aws_access_key_id=settings.MINIO_ACCESS_KEY,
-                aws_secret_access_key=settings.MINIO_SECRET_KEY,
-                config=Config(
-                    signature_version='s3v4',
-                    region_name='us-east-1',
-                    s3={'addressing_style': 'path'}
-                ),
-                verify=False
-            )
-            # La ruta_archivo ahora es la key
-            key = archivo.ruta_archivo
-            print(f"Deleting key: {key}")
-            s3_client.delete_object(Bucket=settings.MINIO_BUCKET_NAME, Key=key)
-        except Exception as e:
-            # Loggear error pero continuar con eliminación de DB
-            print(f"Error eliminando archivo de MinIO: {str(e)}")
+        key = archivo.ruta_archivo
+        if archivo.hash_sha256:
+            # Contenido compartido: descontar la referencia y solo borrar de MinIO con la última
+            referencias = db.execute(
+                update(ObjetoAlmacenado)
+                .where(ObjetoAlmacenado.hash_sha256 == archivo.hash_sha256)
+                .values(referencias=ObjetoAlmacenado.referencias - 1)
+                .returning(ObjetoAlmacenado.referencias)
+            ).scalar()
+            borrar_de_minio = referencias is not None and referencias <= 0
+            if borrar_de_minio:
+                db.execute(
+                    delete(ObjetoAlmacenado)
+                    .where(ObjetoAlmacenado.hash_sha256 == archivo.hash_sha256)
+                )
+        else:
+            # Archivos subidos antes de la deduplicación tienen su propio objeto
+            borrar_de_minio = True
 
         # Eliminar de base de datos
+        ruta_miniatura = archivo.ruta_miniatura
         db.delete(archivo)
         db.commit()
+
+        # Eliminar de MinIO después del commit: si el commit falla ninguna fila queda
+        # apuntando a un objeto borrado. Las keys son únicas por objeto almacenado, así
+        # que una subida concurrente del mismo contenido no reutiliza esta
+        if borrar_de_minio:
+            ArchivoAdjuntoService._borrar_de_minio(key, ruta_miniatura)
+
+    @staticmethod
+    def _borrar_de_minio(key: str, ruta_miniatura: Optional[str] = None):
+        """Borra un objeto (y su miniatura) de MinIO; un error solo se registra"""
+        try:
+            s3_client = ArchivoAdjuntoService._obtener_cliente_s3()
+            s3_client.delete_object(Bucket=settings.MINIO_BUCKET_NAME, Key=key)
+            presigned_url_cache.invalidar(key)
+            if ruta_miniatura:
+                s3_client.delete_object(Bucket=settings.MINIO_BUCKET_NAME, Key=ruta_miniatura)
+                presigned_url_cache.invalidar(ruta_miniatura)
+        except Exception:
+            logger.exception("Error eliminando archivo de MinIO", extra={"key": key})
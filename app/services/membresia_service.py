@@ -0,0 +1,62 @@
+from typing import Optional
+
+from sqlalchemy import exists, select
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import user_natillera
+
+# Clave en session.info donde se memorizan las respuestas durante la petición
+CLAVE_MEMO = "membresias"
+
+
+def _condicion(natillera_id: int, user_id: int):
+    return exists().where(
+        user_natillera.c.natillera_id == natillera_id,
+        user_natillera.c.user_id == user_id
+    )
+
+
+class MembresiaService:
+    """
+    Verificaciones de pertenencia a una natillera con un EXISTS sobre la llave primaria
+    de user_natillera, sin cargar la lista de miembros. Las respuestas se memorizan en
+    la sesión, que vive lo mismo que la petición.
+    """
+
+    @staticmethod
+    def es_miembro(db: Session, natillera_id: int, user_id: int, memo: bool = True) -> bool:
+        """Indica si el usuario está en la tabla de miembros de la natillera"""
+        cache = db.info.setdefault(CLAVE_MEMO, {}) if memo else {}
+        clave = (natillera_id, user_id)
+        if clave not in cache:
+            cache[clave] = bool(db.execute(select(_condicion(natillera_id, user_id))).scalar())
+        return cache[clave]
+
+    @staticmethod
+    def es_miembro_o_creador(db: Session, natillera, user_id: int, memo: bool = True) -> bool:
+        """Miembro o creador; `natillera` puede ser el objeto o una fila con id y creator_id"""
+        return natillera.creator_id == user_id or MembresiaService.es_miembro(db, natillera.id, user_id, memo)
+
+    @staticmethod
+    async def es_miembro_async(db: AsyncSession, natillera_id: int, user_id: int, memo: bool = True) -> bool:
+        """Versión para AsyncSession de es_miembro"""
+        cache = db.info.setdefault(CLAVE_MEMO, {}) if memo else {}
+        clave = (natillera_id, user_id)
+        if clave not in cache:
+            cache[clave] = bool(await db.scalar(select(_condicion(natillera_id, user_id))))
+        return cache[clave]
+
+    @staticmethod
+    def subconsulta_natilleras(user_id: int):
+        """Subconsulta con los IDs de las natilleras del usuario, para filtros `IN`"""
+        return select(user_natillera.c.natillera_id).where(user_natillera.c.user_id == user_id)
+
+    @staticmethod
+    def registrar(db: Session, natillera_id: int, user_id: int, es_miembro: Optional[bool] = True):
+        """Actualiza el memo tras agregar o quitar un miembro (None lo olvida)"""
+        cache = db.info.setdefault(CLAVE_MEMO, {})
+        if es_miembro is None:
+            cache.pop((natillera_id, user_id), None)
+        else:
+            cache[(natillera_id, user_id)] = es_miembro
@@ -0,0 +1,176 @@
+import io
+import logging
+import queue
+import threading
+from typing import List, Optional
+
+from sqlalchemy import update
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models import ArchivoAdjunto
+
+logger = logging.getLogger(__name__)
+
+# Lado máximo de las miniaturas en píxeles
+TAMANO_MINIATURA = (320, 320)
+CALIDAD_MINIATURA = 75
+# Imágenes más grandes no se decodifican (unos 160 MB en RGBA): protege a los
+# workers de imágenes pequeñas comprimidas con dimensiones enormes
+PIXELES_MAXIMOS_IMAGEN = 40_000_000
+
+TIPOS_IMAGEN = {'image/jpeg', 'image/png', 'image/gif'}
+TIPO_PDF = 'application/pdf'
+
+
+class MiniaturaService:
+    """
+    Genera en segundo plano miniaturas de imágenes y vistas previas de la primera
+    página de los PDF. Los trabajos se reciben en una cola local y los procesan
+    hilos de fondo, fuera del ciclo de la petición de subida.
+    """
+
+    _cola: "queue.Queue[tuple[str, str]]" = queue.Queue(maxsize=1000)
+    _workers: List[threading.Thread] = []
+    _lock = threading.Lock()
+
+    @staticmethod
+    def ruta_miniatura(key: str) -> str:
+        """Key de la miniatura, guardada junto al objeto original"""
+        return f"{key}.thumb.webp"
+
+    @staticmethod
+    def soporta(tipo_archivo: str) -> bool:
+        """Indica si se puede generar miniatura para el tipo de archivo"""
+        return tipo_archivo in TIPOS_IMAGEN or tipo_archivo == TIPO_PDF
+
+    @staticmethod
+    def encolar(key: str, tipo_archivo: str) -> bool:
+        """
+        Agrega a la cola la generación de la miniatura de un objeto.
+        Retorna False si el tipo no está soportado o la cola está llena.
+        """
+        if not settings.MINIATURAS_HABILITADAS or not MiniaturaService.soporta(tipo_archivo):
+            return False
+        MiniaturaService._iniciar_workers()
+        try:
+            MiniaturaService._cola.put_nowait((key, tipo_archivo))
+            return True
+        except queue.Full:
+            logger.warning("Cola de miniaturas llena, se omite", extra={"key": key})
+            return False
+
+    @staticmethod
+    def _iniciar_workers():
+        """Inicia los hilos de la cola la primera vez que se necesitan"""
+        with MiniaturaService._lock:
+            MiniaturaService._workers = [w for w in MiniaturaService._workers if w.is_alive()]
+            while len(MiniaturaService._workers) < settings.MINIATURAS_WORKERS:
+                worker = threading.Thread(
+                    target=MiniaturaService._procesar_cola,
+                    name=f"miniaturas-{len(MiniaturaService._workers)}",
+                    daemon=True
+                )
+                worker.start()
+                MiniaturaService._workers.append(worker)
+
+    @staticmethod
+    def _procesar_cola():
+        while True:
+            key, tipo_archivo = MiniaturaService._cola.get()
+            try:
+                MiniaturaService.generar_miniatura(key, tipo_archivo)
+            except Exception:
+                logger.exception("Error generando miniatura", extra={"key": key})
+            finally:
+                MiniaturaService._cola.task_done()
+
+    @staticmethod
+    def generar_miniatura(key: str, tipo_archivo: str) -> Optional[str]:
+        """
+        Descarga el objeto, genera su miniatura WebP, la sube junto al original
+        y la asocia a todos los archivos adjuntos que usan ese objeto.
+        """
+        from app.services.archivo_adjunto_service import ArchivoAdjuntoService
+
+        s3_client = ArchivoAdjuntoService._obtener_cliente_s3()
+        objeto = s3_client.get_object(Bucket=settings.MINIO_BUCKET_NAME, Key=key)
+        contenido = objeto['Body'].read()
+
+        if tipo_archivo == TIPO_PDF:
+            imagen = MiniaturaService._renderizar_primera_pagina(contenido)
+        else:
+            from PIL import Image
+            # Por encima del doble Pillow lanza DecompressionBombError en vez de advertir
+            Image.MAX_IMAGE_PIXELS = PIXELES_MAXIMOS_IMAGEN
+            # open solo lee la cabecera: las dimensiones se validan antes de decodificar
+            imagen = Image.open(io.BytesIO(contenido))
+            ancho, alto = imagen.size
+            if ancho * alto > PIXELES_MAXIMOS_IMAGEN:
+                logger.warning(
+                    "Imagen demasiado grande para generar miniatura",
+                    extra={"key": key, "ancho": ancho, "alto": alto}
+                )
+                return None
+            # En JPEG decodifica directamente a una escala reducida (1/2 a 1/8)
+            imagen.draft('RGB', TAMANO_MINIATURA)
+
+        datos = MiniaturaService._reducir(imagen)
+        key_miniatura = MiniaturaService.ruta_miniatura(key)
+        s3_client.put_object(
+            Bucket=settings.MINIO_BUCKET_NAME,
+            Key=key_miniatura,
+            Body=datos,
+            ContentType='image/webp'
+        )
+
+        db = SessionLocal()
+        try:
+            asociados = db.execute(
+                update(ArchivoAdjunto)
+                .where(ArchivoAdjunto.ruta_archivo == key)
+                .values(ruta_miniatura=key_miniatura)
+            ).rowcount
+            db.commit()
+        finally:
+            db.close()
+
+        if not asociados:
+            # El último archivo que usaba el objeto se eliminó mientras se generaba:
+            # nadie borraría esta miniatura
+            s3_client.delete_object(Bucket=settings.MINIO_BUCKET_NAME, Key=key_miniatura)
+            logger.info("Miniatura descartada, el archivo ya no existe", extra={"key": key})
+            return None
+        return key_miniatura
+
+    @staticmethod
+    def _reducir(imagen) -> bytes:
+        """Reduce la imagen al tamaño de miniatura y la codifica en WebP"""
+        from PIL import ImageOps
+
+        imagen = ImageOps.exif_transpose(imagen)
+        if imagen.mode in ('1', 'P'):
+            # thumbnail solo remuestrea con vecino más cercano en estos modos
+            imagen = imagen.convert('RGB')
+        # Reducir antes de convertir: la conversión copia la imagen completa
+        imagen.thumbnail(TAMANO_MINIATURA)
+        imagen = imagen.convert('RGB')
+        salida = io.BytesIO()
+        imagen.save(salida, format='WEBP', quality=CALIDAD_MINIATURA)
+        return salida.getvalue()
+
+    @staticmethod
+    def _renderizar_primera_pagina(contenido: bytes):
+        """Renderiza la primera página de un PDF como imagen"""
+        import fitz  # PyMuPDF
+        from PIL import Image
+
+        documento = fitz.open(stream=contenido, filetype='pdf')
+        try:
+            pagina = documento.load_page(0)
+            # Escalar la página a un tamaño cercano al de la miniatura
+            escala = max(TAMANO_MINIATURA) / max(pagina.rect.width, pagina.rect.height)
+            pixmap = pagina.get_pixmap(matrix=fitz.Matrix(escala * 2, escala * 2), alpha=False)
+            return Image.frombytes('RGB', (pixmap.width, pixmap.height), pixmap.samples)
+        finally:
+            documento.close()
@@ -3,6 +3,7 @@ from app.models import Natillera, User, NatilleraEstado, Invitacion, InvitacionE
 from app.schemas import NatilleraCreate, NatilleraUpdate
 from typing import List, Optional
 from fastapi import HTTPException, status
+from app.services.membresia_service import MembresiaService
 
 class NatilleraService:
     @staticmethod
@@ -19,13 +20,12 @@ class NatilleraService:
         
         db.add(db_natillera)
         db.commit()
-        db.refresh(db_natillera)
         return db_natillera
     
     @staticmethod
     def get_natillera_by_id(db: Session, natillera_id: int) -> Optional[Natillera]:
         """Obtiene una natillera por ID"""
-        return db.query(Natillera).filter(Natillera.id == natillera_id).first()
+        return db.get(Natillera, natillera_id)
     
     @staticmethod
     def get_user_natilleras(db: Session, user: User) -> List[Natillera]:
@@ -55,7 +55,6 @@ class NatilleraService:
         
         natillera.estado = estado
         db.commit()
-        db.refresh(natillera)
         return natillera
     
     @staticmethod
@@ -74,7 +73,7 @@ class NatilleraService:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Usuario no encontrado")
         
         # Verificar si ya es miembro
-        if user in natillera.members:
+        if MembresiaService.es_miembro(db, natillera_id, user.id):
             return {"message": "El usuario ya es miembro de la natillera"}
         
         # Verificar si ya existe una invitación pendiente
@@ -97,11 +96,9 @@ class NatilleraService:
         
         db.add(invitacion)
         db.commit()
-        db.refresh(invitacion)
         
         return {"message": f"Invitación enviada a {user.full_name}", "invitacion_id": invitacion.id}
         db.commit()
-        db.refresh(natillera)
         return natillera
     
     @staticmethod
@@ -110,6 +107,6 @@ class NatilleraService:
         return natillera.creator_id == user.id
     
     @staticmethod
-    def is_member(natillera: Natillera, user: User) -> bool:
+    def is_member(db: Session, natillera: Natillera, user: User) -> bool:
         """Verifica si el usuario es miembro o creador de la natillera"""
-        return user.id == natillera.creator_id or any(m.id == user.id for m in natillera.members)
+        return MembresiaService.es_miembro_o_creador(db, natillera, user.id)
@@ -1,6 +1,7 @@
 from sqlalchemy.orm import Session
 from app.models import Politica
 from app.schemas import PoliticaCreate, PoliticaUpdate
+from app.services.version_service import VersionService
 from typing import List, Optional
 
 
@@ -26,7 +27,6 @@ class PoliticaService:
         )
         db.add(db_politica)
         db.commit()
-        db.refresh(db_politica)
         return db_politica
 
     @staticmethod
@@ -37,7 +37,6 @@ class PoliticaService:
             for field, value in politica_update.dict(exclude_unset=True).items():
                 setattr(db_politica, field, value)
             db.commit()
-            db.refresh(db_politica)
         return db_politica
 
     @staticmethod
@@ -58,6 +57,8 @@ class PoliticaService:
                 db.query(Politica).filter(Politica.id == order_data['id']).update({
                     'orden': order_data['orden']
                 })
+            # query.update no pasa por el flush: se marca la versión a mano
+            VersionService.incrementar(db, [natillera_id])
             db.commit()
             return True
         except Exception as e:
@@ -0,0 +1,54 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+
+class PresignedUrlCache:
+    """
+    Caché LRU de URLs presigned indexada por la key del objeto en MinIO.
+    Reutiliza cada URL hasta poco antes de su expiración y limita el número de entradas.
+    """
+
+    def __init__(self, max_entradas: int = 2048, expiracion: int = 3600, margen: int = 300):
+        self.max_entradas = max_entradas
+        self.expiracion = expiracion  # Segundos de validez de cada URL firmada
+        self.margen = margen  # Se renueva la URL este número de segundos antes de expirar
+        self._entradas: "OrderedDict[str, tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, key: str, firmar: Callable[[str, int], str]) -> str:
+        """
+        Devuelve la URL cacheada para la key o la genera con `firmar(key, expiracion)`.
+        """
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._entradas.get(key)
+            if entrada and entrada[1] > ahora:
+                self._entradas.move_to_end(key)
+                return entrada[0]
+
+        # Firmar fuera del lock para no serializar peticiones concurrentes
+        url = firmar(key, self.expiracion)
+
+        with self._lock:
+            self._entradas[key] = (url, ahora + self.expiracion - self.margen)
+            self._entradas.move_to_end(key)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+        return url
+
+    def invalidar(self, key: str) -> Optional[str]:
+        """Elimina la URL cacheada de una key (por ejemplo al borrar el archivo)"""
+        with self._lock:
+            entrada = self._entradas.pop(key, None)
+        return entrada[0] if entrada else None
+
+    def limpiar(self):
+        """Vacía la caché"""
+        with self._lock:
+            self._entradas.clear()
+
+
+# Instancia compartida por el proceso
+presigned_url_cache = PresignedUrlCache()
@@ -1,5 +1,5 @@
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session, joinedload, aliased
+from sqlalchemy import and_, case, literal, or_, select, update
 from datetime import datetime, timedelta
 from decimal import Decimal
 from typing import List, Optional
@@ -7,6 +7,15 @@ from typing import List, Optional
 from app.models import Prestamo, Transaccion, Natillera, User, EstadoPrestamo, TipoTransaccion, PagoPrestamo, EstadoPago
 from app.schemas import PrestamoCreate, PrestamoUpdate, PrestamoDetalle
 from app.services.user_service import UserService
+from app.services.membresia_service import MembresiaService
+from app.respuestas import columnas_usuario, usuario_desde_fila
+
+# Campos de PrestamoResponse leídos directamente como columnas
+CAMPOS_PRESTAMO = (
+    "monto", "tasa_interes", "plazo_meses", "nombre_prestatario", "telefono_prestatario",
+    "email_prestatario", "direccion_prestatario", "referente_id", "notas", "id", "natillera_id",
+    "fecha_inicio", "fecha_vencimiento", "estado", "monto_pagado", "creado_por", "created_at", "updated_at"
+)
 
 
 class PrestamoService:
@@ -25,7 +34,8 @@ class PrestamoService:
         if not prestamo:
             from fastapi import HTTPException
             raise HTTPException(status_code=404, detail="Préstamo no encontrado")
-        natillera = PrestamoService.get_natillera_by_id(db, prestamo.natillera_id)
+        # La natillera ya viene cargada con el préstamo (joinedload)
+        natillera = prestamo.natillera
         if not natillera:
             from fastapi import HTTPException
             raise HTTPException(status_code=404, detail="Natillera no encontrada")
@@ -48,8 +58,8 @@ class PrestamoService:
 
     @staticmethod
     def get_natillera_by_id(db: Session, natillera_id: int) -> Optional[Natillera]:
-        """Obtiene una natillera por su ID"""
-        return db.query(Natillera).filter(Natillera.id == natillera_id).first()
+        """Obtiene una natillera por su ID (sin nueva consulta si ya está en la sesión)"""
+        return db.get(Natillera, natillera_id)
 
     @staticmethod
     def get_prestamo_by_id_simple(db: Session, prestamo_id: int) -> Optional[Prestamo]:
@@ -61,8 +71,8 @@ class PrestamoService:
         return natillera.creator_id == user.id
 
     @staticmethod
-    def user_is_natillera_member(natillera: Natillera, user: User) -> bool:
-        return user.id == natillera.creator_id or any(m.id == user.id for m in natillera.members)
+    def user_is_natillera_member(db: Session, natillera: Natillera, user: User) -> bool:
+        return MembresiaService.es_miembro_o_creador(db, natillera, user.id)
 
     @staticmethod
     def user_is_prestamo_referente(prestamo: Prestamo, user: User) -> bool:
@@ -97,6 +107,33 @@ class PrestamoService:
             "monto_total": monto_total
         }
     
+    @staticmethod
+    def _aplicar_pago(db: Session, prestamo_id: int, monto: Decimal) -> Prestamo:
+        """
+        Suma el pago a monto_pagado y, si con él se cubre el monto con intereses, pasa el
+        préstamo a PAGADO, todo en un único UPDATE ... RETURNING. Dos pagos aplicados a la
+        vez se serializan en la fila: ninguno pierde la suma del otro ni la transición.
+        La versión de la natillera queda marcada por el flush de la Transaccion que
+        acompaña a cada pago aplicado y se incrementa en el commit.
+        """
+        nuevo_monto_pagado = Prestamo.monto_pagado + monto
+        # La fórmula de calcular_monto_total con una sola división
+        monto_total = Prestamo.monto + Prestamo.monto * Prestamo.tasa_interes * Prestamo.plazo_meses / 1200
+        return db.scalars(
+            update(Prestamo)
+            .where(Prestamo.id == prestamo_id)
+            .values(
+                monto_pagado=nuevo_monto_pagado,
+                estado=case(
+                    (nuevo_monto_pagado >= monto_total, literal(EstadoPrestamo.PAGADO, Prestamo.estado.type)),
+                    else_=Prestamo.estado
+                )
+            )
+            .returning(Prestamo)
+            # El objeto de la sesión queda con los valores que devolvió RETURNING
+            .execution_options(synchronize_session=False, populate_existing=True)
+        ).one()
+    
     @staticmethod
     def create_prestamo(db: Session, prestamo_data: PrestamoCreate, user_id: int) -> Prestamo:
         """Crea un préstamo y genera una transacción de tipo PRESTAMO"""
@@ -105,7 +142,7 @@ class PrestamoService:
         if not referente:
             raise ValueError("El referente no existe")
         # Verificar que la natillera existe
-        natillera = db.query(Natillera).filter(Natillera.id == prestamo_data.natillera_id).first()
+        natillera = db.get(Natillera, prestamo_data.natillera_id)
         if not natillera:
             raise ValueError("La natillera no existe")
         # Calcular fecha de vencimiento si no se proporciona fecha_inicio
@@ -169,7 +206,6 @@ class PrestamoService:
             db.add(transaccion_ingreso)
         
         db.commit()
-        db.refresh(prestamo)
         return prestamo
     
     @staticmethod
@@ -178,25 +214,45 @@ class PrestamoService:
         natillera_id: int,
         estado: Optional[str] = None,
         referente_id: Optional[int] = None
-    ) -> List[Prestamo]:
-        """Obtiene todos los préstamos de una natillera con filtros opcionales"""
-        
-        query = db.query(Prestamo).options(
-            joinedload(Prestamo.referente),
-            joinedload(Prestamo.creador)
-        ).filter(Prestamo.natillera_id == natillera_id)
+    ) -> List[dict]:
+        """
+        Obtiene todos los préstamos de una natillera con filtros opcionales, como dicts con
+        la forma de PrestamoResponse más el campo `aprobado` (para agruparlos).
+        """
+        referente = aliased(User)
+        creador = aliased(User)
+        query = (
+            select(
+                *[getattr(Prestamo, campo) for campo in CAMPOS_PRESTAMO],
+                Prestamo.aprobado,
+                *columnas_usuario(referente, "referente"),
+                *columnas_usuario(creador, "creador")
+            )
+            .join(referente, Prestamo.referente_id == referente.id)
+            .join(creador, Prestamo.creado_por == creador.id)
+            .where(Prestamo.natillera_id == natillera_id)
+        )
         
         if estado:
             try:
                 estado_enum = EstadoPrestamo(estado)
-                query = query.filter(Prestamo.estado == estado_enum)
+                query = query.where(Prestamo.estado == estado_enum)
             except ValueError:
                 pass  # Si el estado no es válido, ignorar el filtro
         
         if referente_id:
-            query = query.filter(Prestamo.referente_id == referente_id)
+            query = query.where(Prestamo.referente_id == referente_id)
         
-        return query.order_by(Prestamo.created_at.desc()).all()
+        filas = db.execute(query.order_by(Prestamo.created_at.desc())).all()
+        return [
+            {
+                **{campo: fila._mapping[campo] for campo in CAMPOS_PRESTAMO},
+                "referente": usuario_desde_fila(fila, "referente"),
+                "creador": usuario_desde_fila(fila, "creador"),
+                "aprobado": fila.aprobado
+            }
+            for fila in filas
+        ]
     
     @staticmethod
     def get_resumen_prestamos(db: Session, natillera_id: int) -> dict:
@@ -332,7 +388,6 @@ class PrestamoService:
         prestamo.updated_at = datetime.now()
         
         db.commit()
-        db.refresh(prestamo)
         
         return prestamo
     
@@ -383,7 +438,6 @@ class PrestamoService:
             db.add(transaccion_ingreso)
         
         db.commit()
-        db.refresh(prestamo)
         return prestamo
     
     @staticmethod
@@ -406,7 +460,6 @@ class PrestamoService:
         prestamo.updated_at = datetime.now()
         
         db.commit()
-        db.refresh(prestamo)
         return prestamo
     
     @staticmethod
@@ -442,18 +495,8 @@ class PrestamoService:
         db.add(pago)
         
         if is_creator:
-            # Creador: Registrar pago directamente aprobado
-            prestamo.monto_pagado += monto_pago
-            
-            # Calcular el monto total con intereses para verificar si está completamente pagado
-            calculos = PrestamoService.calcular_monto_total(
-                prestamo.monto, prestamo.tasa_interes, prestamo.plazo_meses
-            )
-            monto_total_con_intereses = calculos["monto_total"]
-            
-            # Verificar si el préstamo está completamente pagado (monto + intereses)
-            if prestamo.monto_pagado >= monto_total_con_intereses:
-                prestamo.estado = EstadoPrestamo.PAGADO
+            # Creador: Registrar pago directamente aprobado (marca PAGADO si se completa)
+            prestamo = PrestamoService._aplicar_pago(db, prestamo_id, monto_pago)
             
             pago.aprobado_por = user_id
             pago.fecha_aprobacion = datetime.utcnow()
@@ -473,7 +516,6 @@ class PrestamoService:
         # Si no es creador, el pago queda pendiente
         
         db.commit()
-        db.refresh(prestamo)
         
         return prestamo
     
@@ -509,23 +551,19 @@ class PrestamoService:
         if not PrestamoService.user_is_natillera_creator(natillera, user):
             raise ValueError("Solo el creador de la natillera puede aprobar pagos pendientes")
         
-        # Aprobar el pago
-        pago.estado = EstadoPago.APROBADO
-        pago.aprobado_por = user_id
-        pago.fecha_aprobacion = datetime.utcnow()
-        
-        # Actualizar el monto pagado del préstamo
-        prestamo.monto_pagado += pago.monto
-        
-        # Calcular el monto total con intereses para verificar si está completamente pagado
-        calculos = PrestamoService.calcular_monto_total(
-            prestamo.monto, prestamo.tasa_interes, prestamo.plazo_meses
-        )
-        monto_total_con_intereses = calculos["monto_total"]
+        # Aprobar el pago solo si sigue pendiente: de dos aprobaciones simultáneas del
+        # mismo pago, la segunda no encuentra la fila y no suma el monto otra vez
+        aprobado = db.execute(
+            update(PagoPrestamo)
+            .where(PagoPrestamo.id == pago_id, PagoPrestamo.estado == EstadoPago.PENDIENTE)
+            .values(estado=EstadoPago.APROBADO, aprobado_por=user_id, fecha_aprobacion=datetime.utcnow())
+            .returning(PagoPrestamo.id)
+        ).scalar()
+        if aprobado is None:
+            raise ValueError("Este pago no está pendiente de aprobación")
         
-        # Verificar si el préstamo está completamente pagado (monto + intereses)
-        if prestamo.monto_pagado >= monto_total_con_intereses:
-            prestamo.estado = EstadoPrestamo.PAGADO
+        # Actualizar el monto pagado del préstamo (marca PAGADO si se completa)
+        prestamo = PrestamoService._aplicar_pago(db, prestamo.id, pago.monto)
         
         # Crear transacción de pago aprobado
         nueva_transaccion = Transaccion(
@@ -541,7 +579,6 @@ class PrestamoService:
         db.add(nueva_transaccion)
         
         db.commit()
-        db.refresh(prestamo)
         
         return prestamo
     
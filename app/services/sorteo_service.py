@@ -1,16 +1,22 @@
+import logging
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session, joinedload
 from app.models import Sorteo, User, Natillera, EstadoSorteo, TipoSorteo, BilleteLoteria, EstadoBillete
 from app.schemas import SorteoCreate
 from typing import List, Optional
 from fastapi import HTTPException, status
 from datetime import datetime
+from app.services.membresia_service import MembresiaService
+from app.services.version_service import VersionService
+
+logger = logging.getLogger(__name__)
 
 class SorteoService:
     @staticmethod
     def create_sorteo(db: Session, sorteo: SorteoCreate, creator: User) -> Sorteo:
         """Crea un nuevo sorteo"""
         # Verificar que el usuario sea creador de la natillera
-        natillera = db.query(Natillera).filter(Natillera.id == sorteo.natillera_id).first()
+        natillera = db.get(Natillera, sorteo.natillera_id)
         if not natillera:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Natillera no encontrada")
         
@@ -41,89 +47,106 @@ class SorteoService:
                 db.add(billete)
         
         db.commit()
-        db.refresh(db_sorteo)
-        return db.query(Sorteo).filter(Sorteo.id == db_sorteo.id).first()
+        return db_sorteo
     
     @staticmethod
     def get_sorteo_by_id(db: Session, sorteo_id: int) -> Optional[Sorteo]:
         """Obtiene un sorteo por ID"""
-        return db.query(Sorteo).filter(Sorteo.id == sorteo_id).first()
+        return db.get(Sorteo, sorteo_id)
     
     @staticmethod
     def get_active_sorteos_for_user(db: Session, user: User) -> List[Sorteo]:
         """Obtiene todos los sorteos activos de las natilleras del usuario"""
-        natillera_ids = [n.id for n in user.natilleras]
-        print(f"Buscando sorteos para natilleras: {natillera_ids}")
         sorteos = db.query(Sorteo).filter(
-            Sorteo.natillera_id.in_(natillera_ids),
+            Sorteo.natillera_id.in_(MembresiaService.subconsulta_natilleras(user.id)),
             Sorteo.estado == EstadoSorteo.ACTIVO
         ).all()
         return sorteos
     
     @staticmethod
-    def get_billetes_loteria(db: Session, sorteo_id: int) -> List[BilleteLoteria]:
-        """Obtiene todos los billetes de una lotería"""
-        return db.query(BilleteLoteria).filter(BilleteLoteria.sorteo_id == sorteo_id).order_by(BilleteLoteria.numero).all()
+    def get_billetes_loteria(db: Session, sorteo_id: int) -> List[dict]:
+        """Obtiene todos los billetes de una lotería como dicts con la forma de BilleteLoteriaResponse"""
+        filas = db.execute(
+            select(
+                BilleteLoteria.numero, BilleteLoteria.estado, BilleteLoteria.id, BilleteLoteria.sorteo_id,
+                BilleteLoteria.tomado_por, BilleteLoteria.fecha_tomado, BilleteLoteria.pagado
+            )
+            .where(BilleteLoteria.sorteo_id == sorteo_id)
+            .order_by(BilleteLoteria.numero)
+        ).all()
+        return [
+            {
+                # El número se guarda con ceros a la izquierda ("007") pero se expone como entero
+                "numero": int(numero),
+                "estado": estado,
+                "id": id_billete,
+                "sorteo_id": id_sorteo,
+                "tomado_por": tomado_por,
+                "fecha_tomado": fecha_tomado,
+                "pagado": pagado
+            }
+            for numero, estado, id_billete, id_sorteo, tomado_por, fecha_tomado, pagado in filas
+        ]
     
     @staticmethod
     def tomar_billete_loteria(db: Session, sorteo_id: int, numero: str, user: User) -> BilleteLoteria:
         """Permite a un usuario tomar un billete disponible"""
-        print(f"Intentando tomar billete: sorteo_id={sorteo_id}, numero={numero}, user_id={user.id}")
+        logger.debug("Intentando tomar billete", extra={"sorteo_id": sorteo_id, "numero": numero, "user_id": user.id})
         
         # Formatear el número con ceros a la izquierda
         numero_formateado = f"{int(numero):03d}"
         
         # Verificar que el usuario pertenece a la natillera del sorteo
-        sorteo = db.query(Sorteo).filter(Sorteo.id == sorteo_id).first()
+        sorteo = db.get(Sorteo, sorteo_id)
         if not sorteo:
-            print(f"Sorteo no encontrado: {sorteo_id}")
+            logger.info("Sorteo no encontrado", extra={"sorteo_id": sorteo_id})
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Sorteo no encontrado")
         
-        print(f"Sorteo encontrado: {sorteo.id}, natillera: {sorteo.natillera_id}")
-        print(f"Natilleras del usuario: {[n.id for n in user.natilleras]}")
-        
-        if sorteo.natillera_id not in [n.id for n in user.natilleras]:
-            print(f"Usuario no tiene acceso al sorteo")
+        if not MembresiaService.es_miembro(db, sorteo.natillera_id, user.id):
+            logger.info("Usuario sin acceso al sorteo", extra={"sorteo_id": sorteo_id, "user_id": user.id})
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No tienes acceso a este sorteo")
         
-        # Buscar el billete
-        billete = db.query(BilleteLoteria).filter(
-            BilleteLoteria.sorteo_id == sorteo_id,
-            BilleteLoteria.numero == numero_formateado
-        ).first()
-        
-        if not billete:
-            print(f"Billete no encontrado: sorteo_id={sorteo_id}, numero={numero_formateado}")
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Billete no encontrado")
-        
-        print(f"Billete encontrado: id={billete.id}, estado={billete.estado}")
-        
-        if billete.estado != EstadoBillete.DISPONIBLE:
-            print(f"Billete no disponible: estado={billete.estado}")
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Billete no disponible")
-        
-        # Tomar el billete
-        print("Tomando billete...")
-        billete.estado = EstadoBillete.TOMADO
-        billete.tomado_por = user.id
-        billete.fecha_tomado = datetime.now()
-        
+        # Tomar el billete en una sola sentencia: solo si sigue disponible (dos usuarios
+        # no pueden tomar el mismo) y RETURNING trae la fila actualizada para la respuesta
         try:
-            db.commit()
-            print("Commit exitoso")
-            # En lugar de refresh, hacer una nueva query para evitar problemas de relaciones
-            billete_actualizado = db.query(BilleteLoteria).filter(BilleteLoteria.id == billete.id).first()
-            print("Query exitosa")
-            return billete_actualizado
+            billete = db.scalars(
+                update(BilleteLoteria)
+                .where(
+                    BilleteLoteria.sorteo_id == sorteo_id,
+                    BilleteLoteria.numero == numero_formateado,
+                    BilleteLoteria.estado == EstadoBillete.DISPONIBLE
+                )
+                .values(estado=EstadoBillete.TOMADO, tomado_por=user.id, fecha_tomado=datetime.now())
+                .returning(BilleteLoteria)
+            ).first()
         except Exception as e:
-            print(f"Error en commit/refresh: {e}")
+            logger.exception("Error al tomar billete", extra={"sorteo_id": sorteo_id, "numero": numero_formateado})
             db.rollback()
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error al tomar billete: {str(e)}")
+        
+        if billete is None:
+            # Solo en el caso de error se consulta por qué: no existe o ya fue tomado
+            existe = db.scalar(
+                select(BilleteLoteria.id).where(
+                    BilleteLoteria.sorteo_id == sorteo_id,
+                    BilleteLoteria.numero == numero_formateado
+                )
+            )
+            if existe is None:
+                logger.info("Billete no encontrado", extra={"sorteo_id": sorteo_id, "numero": numero_formateado})
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Billete no encontrado")
+            logger.info("Billete no disponible", extra={"billete_id": existe})
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Billete no disponible")
+        
+        # El UPDATE directo no pasa por el flush: la versión de la natillera se marca aquí
+        VersionService.incrementar(db, [sorteo.natillera_id])
+        db.commit()
+        return billete
     
     @staticmethod
     def finalizar_sorteo(db: Session, sorteo_id: int, user: User, numero_ganador: Optional[str] = None) -> Sorteo:
         """Finaliza un sorteo seleccionando un número ganador (aleatoriamente o especificado)"""
-        sorteo = db.query(Sorteo).filter(Sorteo.id == sorteo_id).first()
+        sorteo = db.get(Sorteo, sorteo_id)
         if not sorteo:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Sorteo no encontrado")
         
@@ -164,7 +187,6 @@ class SorteoService:
                 sorteo.numero_ganador = numero_formateado  # Ya está formateado
                 sorteo.fecha_sorteo = datetime.now()
                 db.commit()
-                db.refresh(sorteo)
                 return sorteo
             
             ganador = billete_ganador
@@ -179,13 +201,12 @@ class SorteoService:
         sorteo.fecha_sorteo = datetime.now()
         
         db.commit()
-        db.refresh(sorteo)
         return sorteo
     
     @staticmethod
     def marcar_billete_pagado(db: Session, sorteo_id: int, numero: str, user: User) -> BilleteLoteria:
         """Marca un billete como pagado (solo para el creador del sorteo)"""
-        sorteo = db.query(Sorteo).filter(Sorteo.id == sorteo_id).first()
+        sorteo = db.get(Sorteo, sorteo_id)
         if not sorteo:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Sorteo no encontrado")
         
@@ -209,47 +230,37 @@ class SorteoService:
         
         billete.pagado = True
         db.commit()
-        db.refresh(billete)
         return billete
     
     @staticmethod
     def get_billetes_admin(db: Session, sorteo_id: int, user: User) -> List[BilleteLoteria]:
         """Obtiene todos los billetes con información completa para el admin/creador"""
-        print(f"Obteniendo billetes admin para sorteo {sorteo_id}, usuario {user.id}")
-        
-        sorteo = db.query(Sorteo).filter(Sorteo.id == sorteo_id).first()
+        sorteo = db.get(Sorteo, sorteo_id)
         if not sorteo:
-            print(f"Sorteo {sorteo_id} no encontrado")
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Sorteo no encontrado")
         
         # Verificar que el usuario sea el creador
         if sorteo.creador_id != user.id:
-            print(f"Usuario {user.id} no es creador del sorteo {sorteo_id} (creador: {sorteo.creador_id})")
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No tienes acceso a esta información")
         
-        print("Usuario autorizado, obteniendo billetes...")
         # Obtener billetes sin joinedload por ahora para evitar problemas de serialización
         try:
             billetes = db.query(BilleteLoteria).filter(BilleteLoteria.sorteo_id == sorteo_id).order_by(BilleteLoteria.numero).all()
-            print(f"Se encontraron {len(billetes)} billetes")
             return billetes
         except Exception as e:
-            print(f"Error obteniendo billetes: {e}")
+            logger.exception("Error obteniendo billetes", extra={"sorteo_id": sorteo_id})
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error obteniendo billetes: {str(e)}")
     
     @staticmethod
     def get_finalized_sorteos_for_user(db: Session, user: User) -> List[dict]:
         """Obtiene todos los sorteos finalizados de las natilleras del usuario con información del ganador"""
-        # Obtener IDs de natilleras del usuario
-        natillera_ids = [n.id for n in user.natilleras]
-        
         # Obtener sorteos finalizados con relaciones
         sorteos = db.query(Sorteo).options(
             joinedload(Sorteo.creador),
             joinedload(Sorteo.natillera),
             joinedload(Sorteo.billetes)
         ).filter(
-            Sorteo.natillera_id.in_(natillera_ids),
+            Sorteo.natillera_id.in_(MembresiaService.subconsulta_natilleras(user.id)),
             Sorteo.estado == EstadoSorteo.FINALIZADO
         ).order_by(Sorteo.fecha_sorteo.desc()).all()
         
@@ -276,9 +287,6 @@ class SorteoService:
                         'full_name': billete_ganador.usuario.full_name or '',
                         'created_at': billete_ganador.usuario.created_at.isoformat() if billete_ganador.usuario.created_at else None
                     }
-                    print(f"  ¡Ganador encontrado! {ganador_data['full_name']}")
-                else:
-                    print(f"  Billete encontrado: {billete_ganador}, Usuario: {billete_ganador.usuario if billete_ganador else None}")
             
             sorteo_dict = {
                 'id': sorteo.id,
@@ -310,8 +318,7 @@ class SorteoService:
             }
             result.append(sorteo_dict)
         
-        print(f"Se encontraron {len(result)} sorteos finalizados para el usuario {user.id}")
-        print(f"Se encontraron {len(result)} sorteos finalizados para el usuario {user.id}")
+        logger.debug("Sorteos finalizados", extra={"user_id": user.id, "total": len(result)})
         return result
     
     @staticmethod
@@ -326,5 +333,4 @@ class SorteoService:
         
         sorteo.estado = estado
         db.commit()
-        db.refresh(sorteo)
         return sorteo
\ No newline at end of file
@@ -0,0 +1,127 @@
+from typing import Iterable, Optional, Set
+
+from sqlalchemy import event, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.models import (
+    Natillera, Aporte, Transaccion, Prestamo, PagoPrestamo, Politica, Sorteo, BilleteLoteria
+)
+
+# Modelos cuyo cambio modifica los datos visibles de su natillera
+MODELOS_CON_NATILLERA = (Aporte, Transaccion, Prestamo, Politica, Sorteo)
+
+natilleras_tabla = Natillera.__table__
+
+# Clave en session.info con los IDs de natilleras cuya versión se incrementó en el commit
+CLAVE_MODIFICADAS = "natilleras_modificadas"
+# Clave en session.info con lo escrito en la transacción en curso (natilleras, préstamos, sorteos)
+CLAVE_PENDIENTES = "versiones_pendientes"
+
+
+def _incrementar_donde(conexion, condicion) -> Set[int]:
+    resultado = conexion.execute(
+        update(natilleras_tabla)
+        .where(condicion)
+        .values(version=natilleras_tabla.c.version + 1)
+        .returning(natilleras_tabla.c.id)
+    )
+    return set(resultado.scalars().all())
+
+
+def _registrar_modificadas(session: Session, natillera_ids: Set[int]):
+    session.info.setdefault(CLAVE_MODIFICADAS, set()).update(natillera_ids)
+
+
+def _pendientes(session: Session) -> dict:
+    return session.info.setdefault(CLAVE_PENDIENTES, {"natilleras": set(), "prestamos": set(), "sorteos": set()})
+
+
+class VersionService:
+    """
+    Versión por natillera para ETags y claves de caché: cualquier escritura sobre la
+    natillera o sus aportes, transacciones, préstamos (y pagos), políticas o sorteos
+    (y billetes) incrementa `natilleras.version`.
+
+    Durante la transacción solo se registra qué se escribió; el UPDATE de la versión
+    se hace justo antes del commit, en la misma transacción y conexión. Así el bloqueo
+    de la fila de la natillera dura lo que tarda el commit y no toda la petición, y
+    la versión no puede quedar atrás de los datos. Los IDs incrementados quedan en
+    session.info[CLAVE_MODIFICADAS] para que app.cache invalide tras el commit.
+    """
+
+    @staticmethod
+    def incrementar(db: Session, natillera_ids: Iterable[int]):
+        """Marca la versión para incrementarla en el commit (UPDATE/INSERT masivos que no pasan por el flush)"""
+        _pendientes(db)["natilleras"].update(i for i in natillera_ids if i is not None)
+
+    @staticmethod
+    def obtener(db: Session, natillera_id: int) -> Optional[int]:
+        """Versión actual de la natillera (None si no existe)"""
+        return db.execute(select(Natillera.version).where(Natillera.id == natillera_id)).scalar()
+
+
+def _objetos_modificados(session: Session):
+    yield from session.new
+    # dirty incluye objetos sin cambios netos; se descartan
+    yield from (obj for obj in session.dirty if session.is_modified(obj))
+    yield from session.deleted
+
+
+@event.listens_for(Session, "after_flush")
+def _registrar_escrituras(session: Session, flush_context):
+    pendientes = None
+    for obj in _objetos_modificados(session):
+        if isinstance(obj, Natillera):
+            grupo, valor = "natilleras", obj.id
+        elif isinstance(obj, MODELOS_CON_NATILLERA):
+            grupo, valor = "natilleras", obj.natillera_id
+        elif isinstance(obj, PagoPrestamo):
+            grupo, valor = "prestamos", obj.prestamo_id
+        elif isinstance(obj, BilleteLoteria):
+            grupo, valor = "sorteos", obj.sorteo_id
+        else:
+            continue
+        if valor is not None:
+            pendientes = pendientes or _pendientes(session)
+            pendientes[grupo].add(valor)
+
+
+@event.listens_for(Session, "before_commit")
+def _incrementar_versiones(session: Session):
+    # El commit de un SAVEPOINT no cierra la transacción: se incrementa en el de la externa
+    if session.in_nested_transaction():
+        return
+    # before_commit corre antes del último flush del commit: lo pendiente se escribe
+    # ahora para que after_flush registre sus natilleras
+    session.flush()
+    pendientes = session.info.pop(CLAVE_PENDIENTES, None)
+    if not pendientes:
+        return
+
+    condiciones = []
+    if pendientes["natilleras"]:
+        condiciones.append(natilleras_tabla.c.id.in_(pendientes["natilleras"]))
+    if pendientes["prestamos"]:
+        condiciones.append(natilleras_tabla.c.id.in_(
+            select(Prestamo.natillera_id).where(Prestamo.id.in_(pendientes["prestamos"]))
+        ))
+    if pendientes["sorteos"]:
+        condiciones.append(natilleras_tabla.c.id.in_(
+            select(Sorteo.natillera_id).where(Sorteo.id.in_(pendientes["sorteos"]))
+        ))
+    if not condiciones:
+        return
+
+    # En la conexión de la sesión, dentro de su transacción: si el incremento falla,
+    # falla el commit y los datos no quedan guardados con la versión anterior
+    _registrar_modificadas(session, _incrementar_donde(session.connection(), or_(*condiciones)))
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _descartar_pendientes(session: Session, transaccion):
+    # Solo al terminar la transacción externa (tras un rollback; tras un commit ya se
+    # consumieron): el rollback de un SAVEPOINT no descarta lo escrito fuera de él
+    if transaccion.parent is not None:
+        return
+    session.info.pop(CLAVE_PENDIENTES, None)
+    session.info.pop(CLAVE_MODIFICADAS, None)
@@ -0,0 +1,382 @@
+"""
+Prueba de carga por escenarios que modela el tráfico de fin de mes: los socios entran,
+cargan el dashboard, registran su aporte, suben el comprobante, revisan el balance y
+toman un billete de lotería, mientras los creadores aprueban aportes en lote y
+consultan el balance repetidamente.
+
+Las llegadas de usuarios siguen un proceso de Poisson con la tasa indicada (lazo
+abierto: un servidor lento no frena la llegada de nuevos usuarios), con una rampa
+opcional al inicio. Por cada paso reporta throughput, tasa de error y percentiles de
+latencia; las respuestas esperadas por concurrencia (billete ya tomado, aporte ya
+aprobado) se cuentan aparte como rechazos y no como errores.
+
+Requiere la base poblada con benchmarks/datos_sinteticos.py y el servidor con los
+dobles de Firebase y MinIO (benchmarks/servidor_carga.py):
+
+    python benchmarks/datos_sinteticos.py --usuarios 20000
+    uvicorn benchmarks.servidor_carga:app --port 4000 --workers 4
+    python benchmarks/carga_fin_de_mes.py --tasa 20 --duracion 120 --rampa 30
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import struct
+import sys
+import time
+import uuid
+import zlib
+from collections import Counter, defaultdict
+from datetime import date
+from typing import Dict, Iterable, List, Tuple
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select  # noqa: E402
+
+from app.database import SessionLocal  # noqa: E402
+from app.models import EstadoSorteo, Natillera, NatilleraEstado, Sorteo, TipoSorteo, user_natillera  # noqa: E402
+from benchmarks.concurrencia import ClienteHTTP, _percentil  # noqa: E402
+
+# Pasos en el orden del reporte
+PASOS = [
+    "login", "dashboard", "crear_aporte", "subir_recibo", "listar_aportes", "aprobar",
+    "consultar_balance", "ver_billetes", "tomar_billete",
+]
+
+# Token que acepta benchmarks/servidor_carga.py: el firebase_uid de los usuarios sintéticos
+PREFIJO_TOKEN = "sintetico-"
+
+# Conexiones por usuario virtual, como las que abre un navegador en paralelo
+CONEXIONES_POR_USUARIO = 4
+
+
+class Metricas:
+    """Resultados por paso: latencias, estados HTTP, errores y rechazos esperados"""
+
+    def __init__(self):
+        self.latencias: Dict[str, List[float]] = defaultdict(list)
+        self.estados: Dict[str, Counter] = defaultdict(Counter)
+        self.errores: Counter = Counter()
+        self.rechazos: Counter = Counter()
+
+    def registrar(self, paso: str, segundos: float, estados: Iterable[int], esperados: Tuple[int, ...] = ()):
+        estados = list(estados)
+        self.latencias[paso].append(segundos)
+        self.estados[paso].update(str(e) for e in estados)
+        if any(e == 0 or (e >= 400 and e not in esperados) for e in estados):
+            self.errores[paso] += 1
+        elif any(e in esperados for e in estados):
+            self.rechazos[paso] += 1
+
+    def reporte(self, duracion: float) -> Dict[str, dict]:
+        resultado = {}
+        for paso in PASOS:
+            latencias = self.latencias.get(paso)
+            if not latencias:
+                continue
+            total = len(latencias)
+            resultado[paso] = {
+                "ejecuciones": total,
+                "throughput_por_s": round(total / duracion, 2),
+                "tasa_error": round(self.errores[paso] / total, 4),
+                "rechazos_esperados": self.rechazos[paso],
+                "estados": dict(self.estados[paso]),
+                "latencia_ms": {
+                    "p50": round(_percentil(latencias, 0.50) * 1000, 2),
+                    "p95": round(_percentil(latencias, 0.95) * 1000, 2),
+                    "p99": round(_percentil(latencias, 0.99) * 1000, 2),
+                    "max": round(max(latencias) * 1000, 2),
+                },
+            }
+        return resultado
+
+
+class UsuarioVirtual:
+    """Un usuario autenticado con sus conexiones keep-alive"""
+
+    def __init__(self, host: str, puerto: int, usuario_id: int, metricas: Metricas, rng: random.Random, pausa: float):
+        headers = {
+            "Accept": "application/json",
+            "Accept-Encoding": "gzip",
+            "Connection": "keep-alive",
+            "Authorization": f"Bearer {PREFIJO_TOKEN}{usuario_id}",
+        }
+        self.clientes = [ClienteHTTP(host, puerto, headers) for _ in range(CONEXIONES_POR_USUARIO)]
+        self.metricas = metricas
+        self.rng = rng
+        self.pausa = pausa
+
+    async def cerrar(self):
+        for cliente in self.clientes:
+            await cliente.cerrar()
+
+    async def pensar(self):
+        """Tiempo entre acciones del usuario (exponencial con media `pausa`)"""
+        if self.pausa:
+            await asyncio.sleep(self.rng.expovariate(1 / self.pausa))
+
+    async def _enviar(self, cliente: ClienteHTTP, metodo: str, ruta: str, cuerpo: bytes, headers) -> Tuple[int, bytes]:
+        try:
+            return await cliente.peticion(metodo, ruta, cuerpo, headers)
+        except (ConnectionError, asyncio.IncompleteReadError, OSError):
+            await cliente.cerrar()
+            return 0, b""
+
+    async def paso(self, nombre: str, peticiones: List[tuple], esperados: Tuple[int, ...] = ()) -> List[Tuple[int, bytes]]:
+        """
+        Ejecuta las peticiones del paso en paralelo (una por conexión) y registra la
+        latencia del paso completo, la que percibe el usuario.
+        Cada petición es (metodo, ruta) o (metodo, ruta, cuerpo, headers).
+        """
+        inicio = time.perf_counter()
+        respuestas = await asyncio.gather(*[
+            self._enviar(self.clientes[i % len(self.clientes)], p[0], p[1],
+                         p[2] if len(p) > 2 else b"", p[3] if len(p) > 3 else None)
+            for i, p in enumerate(peticiones)
+        ])
+        self.metricas.registrar(nombre, time.perf_counter() - inicio, (e for e, _ in respuestas), esperados)
+        return respuestas
+
+
+def _json(datos) -> Tuple[bytes, Dict[str, str]]:
+    return json.dumps(datos).encode(), {"Content-Type": "application/json"}
+
+
+def _cuerpo_json(respuesta: Tuple[int, bytes]):
+    estado, cuerpo = respuesta
+    if estado >= 400 or not cuerpo:
+        return None
+    if cuerpo[:2] == b"\x1f\x8b":
+        cuerpo = zlib.decompress(cuerpo, 31)
+    return json.loads(cuerpo)
+
+
+def comprobante_png(rng: random.Random, kb: int) -> bytes:
+    """PNG de ruido aleatorio de unos `kb` KB; cada comprobante es distinto (no se deduplica)"""
+    lado = max(8, int((kb * 1024 / 3) ** 0.5))
+    filas = b"".join(b"\x00" + rng.randbytes(lado * 3) for _ in range(lado))
+
+    def bloque(tipo: bytes, datos: bytes) -> bytes:
+        return struct.pack(">I", len(datos)) + tipo + datos + struct.pack(">I", zlib.crc32(tipo + datos))
+
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + bloque(b"IHDR", struct.pack(">IIBBBBB", lado, lado, 8, 2, 0, 0, 0))
+        + bloque(b"IDAT", zlib.compress(filas, 1))
+        + bloque(b"IEND", b"")
+    )
+
+
+def multipart(campos: Dict[str, str], nombre_archivo: str, tipo: str, datos: bytes) -> Tuple[bytes, Dict[str, str]]:
+    limite = uuid.uuid4().hex
+    partes = []
+    for nombre, valor in campos.items():
+        partes.append(f'--{limite}\r\nContent-Disposition: form-data; name="{nombre}"\r\n\r\n{valor}\r\n'.encode())
+    partes.append(
+        f'--{limite}\r\nContent-Disposition: form-data; name="archivo"; filename="{nombre_archivo}"\r\n'
+        f"Content-Type: {tipo}\r\n\r\n".encode() + datos + b"\r\n"
+    )
+    partes.append(f"--{limite}--\r\n".encode())
+    return b"".join(partes), {"Content-Type": f"multipart/form-data; boundary={limite}"}
+
+
+async def viaje_socio(usuario: UsuarioVirtual, natillera: dict, args):
+    """Login, dashboard, aporte con comprobante, balance y billete de lotería"""
+    rng = usuario.rng
+    natillera_id = natillera["id"]
+    balance = f"/transacciones/natilleras/{natillera_id}/balance"
+
+    await usuario.paso("login", [("GET", "/users/me")])
+    await usuario.paso("dashboard", [
+        ("GET", "/natilleras/activas"),
+        ("GET", "/aportes/my-aportes/aprobados/count"),
+        ("GET", "/prestamos/my-prestamos/aprobados/count"),
+        ("GET", "/invitaciones/count"),
+        ("GET", "/sorteos/activos"),
+    ])
+    await usuario.pensar()
+
+    hoy = date.today()
+    cuerpo, headers = _json({
+        "amount": natillera["monto"], "month": hoy.month, "year": hoy.year, "natillera_id": natillera_id,
+    })
+    respuesta, = await usuario.paso("crear_aporte", [("POST", "/aportes/", cuerpo, headers)])
+    aporte = _cuerpo_json(respuesta)
+    await usuario.pensar()
+
+    if aporte:
+        cuerpo, headers = multipart(
+            {"id_aporte": str(aporte["id"])}, "comprobante.png", "image/png", comprobante_png(rng, args.kb_comprobante)
+        )
+        await usuario.paso("subir_recibo", [("POST", "/archivos_adjuntos/subir", cuerpo, headers)])
+        await usuario.pensar()
+
+    await usuario.paso("consultar_balance", [("GET", balance)])
+
+    if natillera["sorteos"] and rng.random() < args.prob_loteria:
+        await usuario.pensar()
+        sorteo_id = rng.choice(natillera["sorteos"])
+        respuesta, = await usuario.paso("ver_billetes", [("GET", f"/sorteos/{sorteo_id}/billetes")])
+        disponibles = [b["numero"] for b in _cuerpo_json(respuesta) or [] if b.get("estado") == "disponible"]
+        if disponibles:
+            # Otro usuario puede tomarlo entre la lista y el clic: 400 es un rechazo esperado
+            await usuario.paso(
+                "tomar_billete", [("POST", f"/sorteos/{sorteo_id}/billetes/{rng.choice(disponibles)}/tomar")],
+                esperados=(400,)
+            )
+
+
+async def viaje_creador(usuario: UsuarioVirtual, natillera: dict, args):
+    """Login, dashboard de administración, aprobación en lote y sondeo del balance"""
+    natillera_id = natillera["id"]
+    balance = f"/transacciones/natilleras/{natillera_id}/balance"
+
+    await usuario.paso("login", [("GET", "/users/me")])
+    await usuario.paso("dashboard", [
+        ("GET", "/natilleras/created"),
+        ("GET", f"/aportes/natillera/{natillera_id}/pendientes/count"),
+        ("GET", f"/prestamos/pagos/natillera/{natillera_id}/pendientes/count"),
+        ("GET", f"/invitaciones/natillera/{natillera_id}/respondidas/count"),
+        ("GET", "/sorteos/activos"),
+    ])
+    await usuario.pensar()
+
+    respuesta, = await usuario.paso("listar_aportes", [("GET", f"/aportes/natillera/{natillera_id}")])
+    pendientes = [a["id"] for a in _cuerpo_json(respuesta) or [] if a.get("status") == "pendiente"]
+    cuerpo, headers = _json({"status": "aprobado"})
+    for aporte_id in pendientes[:args.aprobaciones]:
+        # Dos creadores pueden aprobar el mismo aporte: el segundo recibe un rechazo esperado
+        await usuario.paso("aprobar", [("PATCH", f"/aportes/{aporte_id}", cuerpo, headers)], esperados=(400,))
+
+    for _ in range(args.sondeos_balance):
+        await usuario.pensar()
+        await usuario.paso("consultar_balance", [("GET", balance)])
+
+
+def cargar_natilleras(rng: random.Random, cantidad: int) -> List[dict]:
+    """Natilleras activas con su creador, sus socios y sus loterías activas"""
+    with SessionLocal() as db:
+        filas = db.execute(
+            select(Natillera.id, Natillera.creator_id, Natillera.monthly_amount)
+            .where(Natillera.estado == NatilleraEstado.ACTIVO)
+            .order_by(Natillera.id)
+        ).all()
+        if not filas:
+            raise SystemExit("La base de datos está vacía: ejecute primero benchmarks/datos_sinteticos.py")
+        filas = rng.sample(filas, min(cantidad, len(filas)))
+        natilleras = {
+            id_: {"id": id_, "creador": creador, "monto": str(monto), "socios": [], "sorteos": []}
+            for id_, creador, monto in filas
+        }
+        for natillera_id, usuario_id in db.execute(
+            select(user_natillera.c.natillera_id, user_natillera.c.user_id)
+            .where(user_natillera.c.natillera_id.in_(natilleras))
+            .order_by(user_natillera.c.natillera_id, user_natillera.c.user_id)
+        ):
+            natilleras[natillera_id]["socios"].append(usuario_id)
+        for sorteo_id, natillera_id in db.execute(
+            select(Sorteo.id, Sorteo.natillera_id)
+            .where(Sorteo.natillera_id.in_(natilleras), Sorteo.tipo == TipoSorteo.LOTERIA,
+                   Sorteo.estado == EstadoSorteo.ACTIVO)
+            .order_by(Sorteo.id)
+        ):
+            natilleras[natillera_id]["sorteos"].append(sorteo_id)
+    return [n for n in natilleras.values() if n["socios"]]
+
+
+async def ejecutar(args) -> dict:
+    rng = random.Random(args.semilla)
+    natilleras = cargar_natilleras(rng, args.natilleras)
+    partes = urlsplit(args.url)
+    host, puerto = partes.hostname, partes.port or 80
+
+    metricas = Metricas()
+    viajes: Counter = Counter()
+    activos = set()
+
+    async def viaje(tipo: str, natillera: dict, usuario_id: int, semilla: int):
+        usuario = UsuarioVirtual(host, puerto, usuario_id, metricas, random.Random(semilla), args.pausa)
+        try:
+            await (viaje_creador if tipo == "creador" else viaje_socio)(usuario, natillera, args)
+            viajes[f"{tipo}_completados"] += 1
+        except Exception:
+            viajes[f"{tipo}_fallidos"] += 1
+        finally:
+            await usuario.cerrar()
+
+    inicio = time.monotonic()
+    fin = inicio + args.duracion
+    siguiente = inicio
+    llegadas = descartadas = 0
+    while True:
+        # Tasa instantánea: crece linealmente durante la rampa hasta la tasa objetivo
+        transcurrido = siguiente - inicio
+        tasa = args.tasa * min(1.0, (transcurrido + 1e-3) / args.rampa) if args.rampa else args.tasa
+        siguiente += rng.expovariate(tasa)
+        if siguiente >= fin:
+            break
+        await asyncio.sleep(max(0.0, siguiente - time.monotonic()))
+        llegadas += 1
+        if len(activos) >= args.max_usuarios:
+            # Lazo abierto: la llegada no se pospone, se cuenta como descartada
+            descartadas += 1
+            continue
+        natillera = rng.choice(natilleras)
+        if rng.random() < args.proporcion_creadores:
+            tipo, usuario_id = "creador", natillera["creador"]
+        else:
+            tipo, usuario_id = "socio", rng.choice(natillera["socios"])
+        tarea = asyncio.create_task(viaje(tipo, natillera, usuario_id, rng.getrandbits(32)))
+        activos.add(tarea)
+        tarea.add_done_callback(activos.discard)
+
+    if activos:
+        await asyncio.wait(activos, timeout=args.espera_final)
+    duracion = time.monotonic() - inicio
+
+    return {
+        "url": args.url,
+        "tasa_objetivo_por_s": args.tasa,
+        "rampa_s": args.rampa,
+        "duracion_s": round(duracion, 2),
+        "natilleras": len(natilleras),
+        "llegadas": llegadas,
+        "llegadas_descartadas": descartadas,
+        "viajes": dict(viajes),
+        "viajes_sin_terminar": len(activos),
+        "pasos": metricas.reporte(duracion),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga de fin de mes por escenarios")
+    parser.add_argument("--url", default="http://localhost:4000")
+    parser.add_argument("--tasa", type=float, default=10.0, help="Llegadas de usuarios por segundo (Poisson)")
+    parser.add_argument("--duracion", type=float, default=60.0, help="Segundos durante los que llegan usuarios")
+    parser.add_argument("--rampa", type=float, default=0.0, help="Segundos para subir linealmente hasta la tasa")
+    parser.add_argument("--proporcion-creadores", type=float, default=0.1)
+    parser.add_argument("--natilleras", type=int, default=200, help="Natilleras entre las que se reparte la carga")
+    parser.add_argument("--pausa", type=float, default=1.0, help="Tiempo medio entre acciones de un usuario (s)")
+    parser.add_argument("--aprobaciones", type=int, default=10, help="Aportes que aprueba cada creador")
+    parser.add_argument("--sondeos-balance", type=int, default=3, help="Consultas de balance de cada creador")
+    parser.add_argument("--prob-loteria", type=float, default=0.3, help="Probabilidad de que un socio tome billete")
+    parser.add_argument("--kb-comprobante", type=int, default=150)
+    parser.add_argument("--max-usuarios", type=int, default=2000, help="Usuarios virtuales simultáneos como máximo")
+    parser.add_argument("--espera-final", type=float, default=60.0, help="Segundos para que terminen los viajes en curso")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--salida", default=None, help="Archivo JSON donde guardar el resultado")
+    args = parser.parse_args()
+
+    resultado = asyncio.run(ejecutar(args))
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    print(texto)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            f.write(texto)
+
+
+if __name__ == "__main__":
+    main()
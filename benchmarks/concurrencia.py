@@ -0,0 +1,183 @@
+"""
+Mide peticiones por segundo de endpoints de la API con N clientes concurrentes.
+
+Sirve para comparar la versión síncrona (threadpool + psycopg2) contra la
+asíncrona (asyncpg) de los endpoints de lectura: se ejecuta una vez contra cada
+build del servidor con los mismos parámetros y se comparan los resultados.
+
+Uso:
+    python benchmarks/concurrencia.py --url http://localhost:4000 \\
+        --token <ID_TOKEN_FIREBASE> --concurrencia 200 --duracion 20 \\
+        /transacciones/natilleras/1/balance /invitaciones/count
+
+Solo usa la librería estándar (asyncio) y conexiones HTTP/1.1 keep-alive.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+
+class ClienteHTTP:
+    """Conexión HTTP/1.1 persistente mínima sobre asyncio streams"""
+
+    def __init__(self, host: str, puerto: int, headers: Dict[str, str]):
+        self.host = host
+        self.puerto = puerto
+        self.headers = headers
+        self._lector: Optional[asyncio.StreamReader] = None
+        self._escritor: Optional[asyncio.StreamWriter] = None
+
+    async def _conectar(self):
+        self._lector, self._escritor = await asyncio.open_connection(self.host, self.puerto)
+
+    async def cerrar(self):
+        if self._escritor is not None:
+            self._escritor.close()
+            try:
+                await self._escritor.wait_closed()
+            except ConnectionError:
+                pass
+            self._escritor = None
+
+    async def get(self, ruta: str) -> Tuple[int, bytes]:
+        return await self.peticion("GET", ruta)
+
+    async def peticion(
+        self, metodo: str, ruta: str, cuerpo: bytes = b"", headers: Optional[Dict[str, str]] = None
+    ) -> Tuple[int, bytes]:
+        if self._escritor is None:
+            await self._conectar()
+        lineas = [f"{metodo} {ruta} HTTP/1.1", f"Host: {self.host}:{self.puerto}"]
+        lineas += [f"{k}: {v}" for k, v in {**self.headers, **(headers or {})}.items()]
+        if cuerpo or metodo not in ("GET", "HEAD"):
+            lineas.append(f"Content-Length: {len(cuerpo)}")
+        self._escritor.write(("\r\n".join(lineas) + "\r\n\r\n").encode() + cuerpo)
+        await self._escritor.drain()
+
+        estado_linea = await self._lector.readline()
+        if not estado_linea:
+            await self.cerrar()
+            raise ConnectionError("Conexión cerrada por el servidor")
+        estado = int(estado_linea.split()[1])
+
+        largo = 0
+        chunked = False
+        cerrar = False
+        while True:
+            linea = await self._lector.readline()
+            if linea in (b"\r\n", b""):
+                break
+            nombre, _, valor = linea.decode("latin-1").partition(":")
+            nombre = nombre.strip().lower()
+            valor = valor.strip()
+            if nombre == "content-length":
+                largo = int(valor)
+            elif nombre == "transfer-encoding" and "chunked" in valor.lower():
+                chunked = True
+            elif nombre == "connection" and valor.lower() == "close":
+                cerrar = True
+
+        if chunked:
+            partes = []
+            while True:
+                tamano = int((await self._lector.readline()).split(b";")[0], 16)
+                if tamano == 0:
+                    await self._lector.readline()
+                    break
+                partes.append(await self._lector.readexactly(tamano))
+                await self._lector.readline()
+            cuerpo = b"".join(partes)
+        else:
+            cuerpo = await self._lector.readexactly(largo) if largo else b""
+
+        if cerrar:
+            await self.cerrar()
+        return estado, cuerpo
+
+
+async def _cliente(url, headers, rutas, fin, latencias, errores, indice):
+    partes = urlsplit(url)
+    cliente = ClienteHTTP(partes.hostname, partes.port or 80, headers)
+    i = indice
+    try:
+        while time.monotonic() < fin:
+            ruta = rutas[i % len(rutas)]
+            i += 1
+            inicio = time.perf_counter()
+            try:
+                estado, _ = await cliente.get(ruta)
+            except (ConnectionError, asyncio.IncompleteReadError, OSError):
+                errores["conexion"] = errores.get("conexion", 0) + 1
+                await cliente.cerrar()
+                continue
+            if estado >= 400:
+                errores[str(estado)] = errores.get(str(estado), 0) + 1
+            else:
+                latencias.append(time.perf_counter() - inicio)
+    finally:
+        await cliente.cerrar()
+
+
+def _percentil(valores: List[float], p: float) -> float:
+    if not valores:
+        return 0.0
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+async def ejecutar(url: str, token: Optional[str], rutas: List[str], concurrencia: int, duracion: float) -> dict:
+    headers = {"Accept": "application/json", "Connection": "keep-alive"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+
+    latencias: List[float] = []
+    errores: Dict[str, int] = {}
+    fin = time.monotonic() + duracion
+    inicio = time.monotonic()
+    await asyncio.gather(*[
+        _cliente(url, headers, rutas, fin, latencias, errores, i)
+        for i in range(concurrencia)
+    ])
+    transcurrido = time.monotonic() - inicio
+
+    return {
+        "url": url,
+        "rutas": rutas,
+        "concurrencia": concurrencia,
+        "duracion_s": round(transcurrido, 2),
+        "peticiones_ok": len(latencias),
+        "errores": errores,
+        "rps": round(len(latencias) / transcurrido, 1),
+        "latencia_ms": {
+            "p50": round(_percentil(latencias, 0.50) * 1000, 2),
+            "p95": round(_percentil(latencias, 0.95) * 1000, 2),
+            "p99": round(_percentil(latencias, 0.99) * 1000, 2),
+            "media": round(statistics.fmean(latencias) * 1000, 2) if latencias else 0.0,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de peticiones por segundo con clientes concurrentes")
+    parser.add_argument("rutas", nargs="+", help="Rutas a consultar en rotación (ej. /invitaciones/count)")
+    parser.add_argument("--url", default="http://localhost:4000")
+    parser.add_argument("--token", default=None, help="ID token de Firebase para el header Authorization")
+    parser.add_argument("--concurrencia", type=int, default=200)
+    parser.add_argument("--duracion", type=float, default=20.0, help="Segundos de medición")
+    parser.add_argument("--salida", default=None, help="Archivo JSON donde guardar el resultado")
+    args = parser.parse_args()
+
+    resultado = asyncio.run(ejecutar(args.url, args.token, args.rutas, args.concurrencia, args.duracion))
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    print(texto)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            f.write(texto)
+
+
+if __name__ == "__main__":
+    main()
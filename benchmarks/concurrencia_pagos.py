@@ -0,0 +1,207 @@
+"""
+Prueba de concurrencia de los pagos de préstamos contra un Postgres local.
+
+Crea préstamos de prueba en una natillera existente (tasa 0 y un mes de plazo: el
+monto total es la suma exacta de los pagos) y desde varios hilos, cada uno con su
+sesión, aplica pagos a la vez:
+
+- aprobaciones: N pagos pendientes, cada uno aprobado dos veces en paralelo. Solo
+  una aprobación por pago debe tener éxito.
+- registros: N pagos registrados por el creador en paralelo (aprobados al instante).
+
+Al final monto_pagado debe ser la suma de los pagos, el préstamo debe quedar PAGADO
+y debe haber una transacción por pago. Termina con código 1 si algo no cuadra. Los
+datos de prueba se borran al terminar.
+
+Uso:
+    python benchmarks/datos_sinteticos.py --usuarios 2000
+    python benchmarks/concurrencia_pagos.py --pagos 40 --hilos 16
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Callable, List
+
+os.environ.setdefault("CACHE_BACKEND", "ninguno")
+os.environ.setdefault("LOG_NIVEL", "WARNING")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import delete, func, select  # noqa: E402
+
+from app.database import POOL_MAX_OVERFLOW, POOL_SIZE, SessionLocal  # noqa: E402
+from app.models import (  # noqa: E402
+    EstadoPago, EstadoPrestamo, Natillera, PagoPrestamo, Prestamo, Transaccion
+)
+from app.services.prestamo_service import PrestamoService  # noqa: E402
+
+MONTO_PAGO = Decimal("25000.00")
+
+
+def crear_prestamo(natillera: Natillera, pagos: int) -> int:
+    with SessionLocal() as db:
+        prestamo = Prestamo(
+            natillera_id=natillera.id,
+            monto=MONTO_PAGO * pagos,
+            tasa_interes=Decimal("0"),
+            plazo_meses=1,
+            fecha_inicio=datetime.utcnow(),
+            fecha_vencimiento=datetime.utcnow() + timedelta(days=30),
+            nombre_prestatario="Prueba de concurrencia",
+            referente_id=natillera.creator_id,
+            creado_por=natillera.creator_id,
+            aprobado=True,
+            monto_pagado=Decimal("0.00"),
+        )
+        db.add(prestamo)
+        db.commit()
+        return prestamo.id
+
+
+def en_paralelo(tareas: List[Callable[[], None]], hilos: int) -> List[Exception]:
+    """Reparte las tareas entre `hilos` hilos que arrancan a la vez; retorna los errores"""
+    errores: List[Exception] = []
+    barrera = threading.Barrier(hilos)
+    lock = threading.Lock()
+    pendientes = list(reversed(tareas))
+
+    def trabajar():
+        barrera.wait()
+        while True:
+            with lock:
+                if not pendientes:
+                    return
+                tarea = pendientes.pop()
+            try:
+                tarea()
+            except Exception as e:
+                with lock:
+                    errores.append(e)
+
+    trabajadores = [threading.Thread(target=trabajar) for _ in range(hilos)]
+    for trabajador in trabajadores:
+        trabajador.start()
+    for trabajador in trabajadores:
+        trabajador.join()
+    return errores
+
+
+def verificar(prestamo_id: int, pagos: int, nombre: str) -> List[str]:
+    with SessionLocal() as db:
+        prestamo = db.get(Prestamo, prestamo_id)
+        transacciones = db.scalar(
+            select(func.count(Transaccion.id)).where(Transaccion.prestamo_id == prestamo_id)
+        )
+        aprobados = db.scalar(
+            select(func.count(PagoPrestamo.id))
+            .where(PagoPrestamo.prestamo_id == prestamo_id, PagoPrestamo.estado == EstadoPago.APROBADO)
+        )
+    esperado = MONTO_PAGO * pagos
+    fallas = []
+    if prestamo.monto_pagado != esperado:
+        fallas.append(f"{nombre}: monto_pagado {prestamo.monto_pagado} (esperado {esperado})")
+    if prestamo.estado != EstadoPrestamo.PAGADO:
+        fallas.append(f"{nombre}: estado {prestamo.estado.value} (esperado pagado)")
+    if transacciones != pagos:
+        fallas.append(f"{nombre}: {transacciones} transacciones (esperadas {pagos})")
+    if aprobados != pagos:
+        fallas.append(f"{nombre}: {aprobados} pagos aprobados (esperados {pagos})")
+    return fallas
+
+
+def aprobaciones(natillera: Natillera, pagos: int, hilos: int) -> dict:
+    prestamo_id = crear_prestamo(natillera, pagos)
+    with SessionLocal() as db:
+        nuevos = [
+            PagoPrestamo(prestamo_id=prestamo_id, monto=MONTO_PAGO, registrado_por=natillera.creator_id)
+            for _ in range(pagos)
+        ]
+        db.add_all(nuevos)
+        db.commit()
+        pago_ids = [pago.id for pago in nuevos]
+
+    def aprobar(pago_id: int):
+        with SessionLocal() as db:
+            PrestamoService.aprobar_pago_pendiente(db, pago_id, natillera.creator_id)
+
+    # Cada pago se aprueba dos veces; las tareas se intercalan para que coincidan
+    tareas = [lambda p=pago_id: aprobar(p) for pago_id in pago_ids for _ in range(2)]
+    inicio = time.perf_counter()
+    errores = en_paralelo(tareas, hilos)
+    duracion = time.perf_counter() - inicio
+
+    fallas = verificar(prestamo_id, pagos, "aprobaciones")
+    rechazadas = [e for e in errores if isinstance(e, ValueError) and "no está pendiente" in str(e)]
+    if len(rechazadas) != pagos or len(errores) != pagos:
+        fallas.append(
+            f"aprobaciones: {len(rechazadas)} aprobaciones repetidas rechazadas de {pagos} "
+            f"y {len(errores) - len(rechazadas)} errores inesperados ({errores[:3]})"
+        )
+    return {"prestamo_id": prestamo_id, "segundos": round(duracion, 3), "fallas": fallas}
+
+
+def registros(natillera: Natillera, pagos: int, hilos: int) -> dict:
+    prestamo_id = crear_prestamo(natillera, pagos)
+
+    def registrar():
+        with SessionLocal() as db:
+            PrestamoService.registrar_pago(db, prestamo_id, MONTO_PAGO, natillera.creator_id)
+
+    inicio = time.perf_counter()
+    errores = en_paralelo([registrar] * pagos, hilos)
+    duracion = time.perf_counter() - inicio
+
+    fallas = verificar(prestamo_id, pagos, "registros")
+    if errores:
+        fallas.append(f"registros: {len(errores)} errores inesperados ({errores[:3]})")
+    return {"prestamo_id": prestamo_id, "segundos": round(duracion, 3), "fallas": fallas}
+
+
+def limpiar(prestamo_ids: List[int]):
+    with SessionLocal() as db:
+        db.execute(delete(Transaccion).where(Transaccion.prestamo_id.in_(prestamo_ids)))
+        db.execute(delete(PagoPrestamo).where(PagoPrestamo.prestamo_id.in_(prestamo_ids)))
+        db.execute(delete(Prestamo).where(Prestamo.id.in_(prestamo_ids)))
+        db.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de concurrencia de pagos de préstamos")
+    parser.add_argument("--pagos", type=int, default=40, help="Pagos por préstamo")
+    parser.add_argument("--hilos", type=int, default=16)
+    parser.add_argument("--natillera-id", type=int, default=None)
+    parser.add_argument("--conservar", action="store_true", help="No borrar los préstamos de prueba")
+    args = parser.parse_args()
+
+    # Cada hilo ocupa una conexión del pool durante su tarea
+    hilos = min(args.hilos, POOL_SIZE + POOL_MAX_OVERFLOW)
+
+    with SessionLocal() as db:
+        consulta = select(Natillera).order_by(Natillera.id).limit(1)
+        if args.natillera_id is not None:
+            consulta = select(Natillera).where(Natillera.id == args.natillera_id)
+        natillera = db.scalars(consulta).first()
+    if natillera is None:
+        raise SystemExit("La base de datos está vacía: ejecute primero benchmarks/datos_sinteticos.py")
+
+    resultado = {"pagos": args.pagos, "hilos": hilos}
+    try:
+        resultado["aprobaciones"] = aprobaciones(natillera, args.pagos, hilos)
+        resultado["registros"] = registros(natillera, args.pagos, hilos)
+    finally:
+        if not args.conservar:
+            limpiar([
+                resultado[prueba]["prestamo_id"] for prueba in ("aprobaciones", "registros") if prueba in resultado
+            ])
+
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+    if resultado["aprobaciones"]["fallas"] or resultado["registros"]["fallas"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
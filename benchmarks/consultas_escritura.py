@@ -0,0 +1,220 @@
+"""
+Sentencias SQL por petición en los endpoints de escritura.
+
+Recorre en el mismo proceso (llamadas ASGI directas, como benchmarks/endpoints.py) el
+flujo de escritura de una natillera nueva: crearla, registrar y aprobar un aporte,
+registrar una transacción y una política, crear un sorteo de lotería y tomar un
+billete (dos veces: la segunda debe responder 400). Cuenta las sentencias de cada
+petición con el header Server-Timing de ConsultasMiddleware.
+
+Las respuestas se arman con el estado de la sesión tras el commit
+(expire_on_commit=False) o con los datos de UPDATE ... RETURNING: un refresh o una
+nueva consulta después del commit aparece aquí como sentencias de más. Con
+--guardar-linea-base escribe los conteos; sin él los compara y termina con código 1
+si algún endpoint ejecuta más sentencias que en la línea base o cambia su estado HTTP.
+
+Escribe en la base de datos (crea una natillera por repetición): úsese solo contra la
+base de benchmarks poblada con benchmarks/datos_sinteticos.py.
+
+Uso:
+    python benchmarks/consultas_escritura.py --guardar-linea-base
+    python benchmarks/consultas_escritura.py --repeticiones 3
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+os.environ.setdefault("CACHE_BACKEND", "ninguno")
+os.environ.setdefault("LOG_NIVEL", "WARNING")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import Depends  # noqa: E402
+from sqlalchemy import select  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from app.auth.dependencies import get_current_user, get_current_user_async  # noqa: E402
+from app.database import SessionLocal, get_async_db, get_db  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import User  # noqa: E402
+
+LINEA_BASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "linea_base_escrituras.json")
+
+usuario_actual: ContextVar[Optional[int]] = ContextVar("usuario_actual", default=None)
+
+_CONSULTAS = re.compile(r'desc="(\d+) consultas"')
+
+
+def _usuario_sync(db: Session = Depends(get_db)) -> User:
+    return db.get(User, usuario_actual.get())
+
+
+async def _usuario_async(db: AsyncSession = Depends(get_async_db)) -> User:
+    return await db.get(User, usuario_actual.get())
+
+
+async def llamar(metodo: str, ruta: str, cuerpo: Optional[dict] = None) -> Tuple[int, Dict[str, str], dict]:
+    """Petición directa a la app ASGI; retorna estado, headers y el cuerpo JSON"""
+    datos = json.dumps(cuerpo).encode() if cuerpo is not None else b""
+    headers = [(b"host", b"benchmark")]
+    if cuerpo is not None:
+        headers += [(b"content-type", b"application/json"), (b"content-length", str(len(datos)).encode())]
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": metodo,
+        "scheme": "http", "path": ruta, "raw_path": ruta.encode(), "query_string": b"",
+        "root_path": "", "headers": headers, "client": ("127.0.0.1", 0), "server": ("benchmark", 80),
+    }
+    estado = 0
+    cabeceras: Dict[str, str] = {}
+    partes: List[bytes] = []
+
+    async def receive():
+        return {"type": "http.request", "body": datos, "more_body": False}
+
+    async def send(message):
+        nonlocal estado
+        if message["type"] == "http.response.start":
+            estado = message["status"]
+            cabeceras.update({k.decode(): v.decode() for k, v in message.get("headers", [])})
+        elif message["type"] == "http.response.body":
+            partes.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    contenido = b"".join(partes)
+    try:
+        respuesta = json.loads(contenido) if contenido else {}
+    except ValueError:
+        respuesta = {}
+    return estado, cabeceras, respuesta
+
+
+async def flujo(repeticion: int) -> Dict[str, dict]:
+    """Ejecuta el flujo de escritura y retorna estado y sentencias de cada paso"""
+    resultados: Dict[str, dict] = {}
+
+    async def paso(nombre: str, metodo: str, ruta: str, cuerpo: Optional[dict] = None) -> dict:
+        estado, cabeceras, respuesta = await llamar(metodo, ruta, cuerpo)
+        coincidencia = _CONSULTAS.search(cabeceras.get("server-timing", ""))
+        resultados[nombre] = {
+            "estado": estado,
+            "consultas": int(coincidencia.group(1)) if coincidencia else None,
+        }
+        return respuesta
+
+    ahora = datetime.utcnow()
+    natillera = await paso(
+        "POST /natilleras/", "POST", "/natilleras/",
+        {"name": f"Benchmark escrituras {repeticion}", "monthly_amount": "50000"},
+    )
+    natillera_id = natillera.get("id")
+    if natillera_id is None:
+        raise SystemExit(f"No se pudo crear la natillera: {resultados}")
+
+    aporte = await paso(
+        "POST /aportes/", "POST", "/aportes/",
+        {"amount": "50000", "month": ahora.month, "year": ahora.year, "natillera_id": natillera_id},
+    )
+    await paso(
+        "PATCH /aportes/{aporte_id}", "PATCH", f"/aportes/{aporte.get('id')}",
+        {"status": "aprobado"},
+    )
+    await paso(
+        "POST /transacciones/", "POST", "/transacciones/",
+        {"tipo": "gasto", "categoria": "papeleria", "monto": "12000", "natillera_id": natillera_id},
+    )
+    await paso(
+        "POST /politicas/", "POST", "/politicas/",
+        {"titulo": "Multa", "descripcion": "Multa por aporte tardío", "natillera_id": natillera_id},
+    )
+    sorteo = await paso(
+        "POST /sorteos/", "POST", "/sorteos/",
+        {"tipo": "loteria", "titulo": "Sorteo benchmark", "natillera_id": natillera_id},
+    )
+    ruta_billete = f"/sorteos/{sorteo.get('id')}/billetes/7/tomar"
+    await paso("POST /sorteos/{sorteo_id}/billetes/{numero}/tomar", "POST", ruta_billete)
+    await paso("POST /sorteos/{sorteo_id}/billetes/{numero}/tomar [tomado]", "POST", ruta_billete)
+    return resultados
+
+
+async def ejecutar(repeticiones: int) -> Dict[str, dict]:
+    with SessionLocal() as db:
+        usuario_id = db.scalar(select(User.id).order_by(User.id).limit(1))
+    if usuario_id is None:
+        raise SystemExit("La base de datos está vacía: ejecute primero benchmarks/datos_sinteticos.py")
+
+    app.dependency_overrides[get_current_user] = _usuario_sync
+    app.dependency_overrides[get_current_user_async] = _usuario_async
+    await app.router.startup()
+    token = usuario_actual.set(usuario_id)
+    resultados: Dict[str, dict] = {}
+    try:
+        for repeticion in range(repeticiones):
+            for nombre, medicion in (await flujo(repeticion)).items():
+                # La primera repetición calienta (p. ej. la detección de versión del dialecto);
+                # de las demás se guarda el peor conteo
+                if repeticion == 0 and repeticiones > 1:
+                    continue
+                anterior = resultados.get(nombre)
+                if anterior is None or (medicion["consultas"] or 0) > (anterior["consultas"] or 0):
+                    resultados[nombre] = medicion
+    finally:
+        usuario_actual.reset(token)
+        await app.router.shutdown()
+        app.dependency_overrides.clear()
+
+    for nombre, medicion in resultados.items():
+        print(f"   {nombre}: {medicion['estado']} consultas={medicion['consultas']}")
+    return resultados
+
+
+def comparar(resultados: Dict[str, dict], linea_base: Dict[str, dict]) -> List[str]:
+    fallos = []
+    for nombre, actual in resultados.items():
+        base = linea_base.get(nombre)
+        if base is None:
+            continue
+        if actual["estado"] != base["estado"]:
+            fallos.append(f"{nombre}: estado {actual['estado']} (línea base {base['estado']})")
+        if actual["consultas"] is not None and base["consultas"] is not None:
+            if actual["consultas"] > base["consultas"]:
+                fallos.append(f"{nombre}: {actual['consultas']} consultas (línea base {base['consultas']})")
+    return fallos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sentencias SQL por petición en los endpoints de escritura")
+    parser.add_argument("--repeticiones", type=int, default=2)
+    parser.add_argument("--linea-base", default=LINEA_BASE)
+    parser.add_argument("--guardar-linea-base", action="store_true")
+    args = parser.parse_args()
+
+    resultados = asyncio.run(ejecutar(args.repeticiones))
+
+    if args.guardar_linea_base:
+        with open(args.linea_base, "w", encoding="utf-8") as archivo:
+            json.dump(resultados, archivo, indent=2, ensure_ascii=False, sort_keys=True)
+        print(f"Línea base guardada en {args.linea_base} ({len(resultados)} endpoints)")
+        return
+
+    if not os.path.exists(args.linea_base):
+        print(f"No hay línea base en {args.linea_base}; ejecute con --guardar-linea-base")
+        return
+    with open(args.linea_base, encoding="utf-8") as archivo:
+        linea_base = json.load(archivo)
+    fallos = comparar(resultados, linea_base)
+    if fallos:
+        print(f"\n{len(fallos)} endpoints con más sentencias que la línea base:")
+        for fallo in fallos:
+            print(f"  - {fallo}")
+        raise SystemExit(1)
+    print("\nTodos los endpoints de escritura dentro de la línea base")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,432 @@
+"""
+Puebla la base de datos con un conjunto sintético a escala de producción para pruebas
+de rendimiento: usuarios, natilleras con cantidades realistas de miembros, años de
+aportes mensuales (aprobados, pendientes y rechazados) con sus transacciones,
+préstamos con historial de pagos, políticas, loterías con billetes tomados y metadatos
+de archivos adjuntos.
+
+Las filas se generan en streaming y se cargan con COPY (o INSERT de varias filas con
+--metodo insert) en bloques, respetando el orden de las llaves foráneas. Con la misma
+--semilla se obtiene exactamente el mismo conjunto de datos.
+
+Uso:
+    python benchmarks/datos_sinteticos.py --usuarios 20000 --semilla 42
+    python benchmarks/datos_sinteticos.py --usuarios 400000 --anios 4   # ~10M filas
+    python benchmarks/datos_sinteticos.py --database-url postgresql://... --metodo insert
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Dict, List, Optional, Sequence
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import psycopg2  # noqa: E402
+from psycopg2.extras import execute_values  # noqa: E402
+from sqlalchemy import Enum as SAEnum  # noqa: E402
+from sqlalchemy.engine import make_url  # noqa: E402
+
+from app.config import settings  # noqa: E402
+from app.models import (  # noqa: E402
+    User, Natillera, user_natillera, Aporte, AporteStatus, Transaccion, TipoTransaccion,
+    Prestamo, EstadoPrestamo, PagoPrestamo, EstadoPago, Politica, ArchivoAdjunto,
+    Sorteo, TipoSorteo, EstadoSorteo, BilleteLoteria, EstadoBillete, NatilleraEstado
+)
+
+# Orden de carga: cada tabla solo referencia tablas anteriores
+TABLAS = [
+    User.__table__, Natillera.__table__, user_natillera, Politica.__table__, Aporte.__table__,
+    Prestamo.__table__, PagoPrestamo.__table__, Transaccion.__table__, Sorteo.__table__,
+    BilleteLoteria.__table__, ArchivoAdjunto.__table__,
+]
+
+NOMBRES = [
+    "Ana", "Carlos", "Luisa", "Andrés", "María", "Jorge", "Paula", "Diego", "Camila", "Juan",
+    "Valentina", "Santiago", "Daniela", "Felipe", "Sofía", "Mateo", "Laura", "Sebastián", "Natalia", "Julián",
+]
+APELLIDOS = [
+    "García", "Rodríguez", "Martínez", "López", "Gómez", "Hernández", "Díaz", "Moreno", "Álvarez", "Muñoz",
+    "Rojas", "Vargas", "Castro", "Ortiz", "Restrepo", "Jaramillo", "Osorio", "Cardona", "Ramírez", "Torres",
+]
+CUOTAS = [Decimal(v) for v in ("20000", "50000", "100000", "150000", "200000", "500000")]
+GASTOS = ["Papelería", "Comisión bancaria", "Reunión de fin de año", "Transporte"]
+POLITICAS = [
+    ("Fecha de pago", "Los aportes se pagan los primeros 10 días de cada mes."),
+    ("Multas", "Aporte tardío genera una multa del 5% de la cuota."),
+    ("Préstamos", "Solo se prestan fondos a personas referidas por un socio."),
+    ("Retiro", "Quien se retire recibe sus aportes al cierre del ciclo."),
+    ("Reuniones", "Se realiza una reunión cada trimestre."),
+    ("Intereses", "Los intereses de los préstamos se reparten al final del año."),
+]
+
+
+def _valores_enum(tabla) -> Dict[str, dict]:
+    """
+    Valor almacenado de cada miembro de los Enum, por columna. Algunas columnas guardan el
+    nombre (aportes.status) y otras el valor (values_callable); se toma del tipo del modelo.
+    """
+    valores = {}
+    for columna in tabla.columns:
+        if isinstance(columna.type, SAEnum) and columna.type.enum_class is not None:
+            valores[columna.name] = dict(zip(columna.type.enum_class, columna.type.enums))
+    return valores
+
+
+def _texto_copy(valor) -> str:
+    if valor is None:
+        return "\\N"
+    if isinstance(valor, bool):
+        return "t" if valor else "f"
+    if isinstance(valor, datetime):
+        return valor.isoformat(sep=" ")
+    texto = str(valor)
+    return texto.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+class CargaTabla:
+    """Acumula filas de una tabla y las envía en bloques con COPY o INSERT de varias filas"""
+
+    def __init__(self, tabla, metodo: str):
+        self.tabla = tabla
+        self.metodo = metodo
+        self.columnas = [c.name for c in tabla.columns]
+        self.enums = _valores_enum(tabla)
+        self.filas: List[tuple] = []
+        self.total = 0
+        self.siguiente_id = 1
+
+    def nuevo_id(self) -> int:
+        valor = self.siguiente_id
+        self.siguiente_id += 1
+        return valor
+
+    def agregar(self, **valores):
+        for columna, mapa in self.enums.items():
+            if valores.get(columna) is not None:
+                valores[columna] = mapa[valores[columna]]
+        self.filas.append(tuple(valores.get(c) for c in self.columnas))
+
+    def enviar(self, cursor):
+        if not self.filas:
+            return
+        columnas = ", ".join(self.columnas)
+        if self.metodo == "copy":
+            buffer = io.StringIO()
+            for fila in self.filas:
+                buffer.write("\t".join(_texto_copy(v) for v in fila))
+                buffer.write("\n")
+            buffer.seek(0)
+            cursor.copy_expert(f"COPY {self.tabla.name} ({columnas}) FROM STDIN", buffer)
+        else:
+            execute_values(cursor, f"INSERT INTO {self.tabla.name} ({columnas}) VALUES %s", self.filas, page_size=1000)
+        self.total += len(self.filas)
+        self.filas = []
+
+
+class Generador:
+    def __init__(self, args, cursor):
+        self.args = args
+        self.cursor = cursor
+        self.rng = random.Random(args.semilla)
+        self.cargas = {tabla.name: CargaTabla(tabla, args.metodo) for tabla in TABLAS}
+        # Fecha de referencia fija: la misma semilla produce las mismas filas en cualquier día
+        self.ahora = datetime(2026, 1, 1)
+        self.inicio = self.ahora - timedelta(days=365 * args.anios)
+
+    def carga(self, modelo_o_tabla) -> CargaTabla:
+        tabla = getattr(modelo_o_tabla, "__table__", modelo_o_tabla)
+        return self.cargas[tabla.name]
+
+    def continuar_ids(self):
+        """Los IDs se asignan en el cliente a partir del máximo actual de cada tabla"""
+        for carga in self.cargas.values():
+            if "id" in carga.columnas:
+                self.cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {carga.tabla.name}")
+                carga.siguiente_id = self.cursor.fetchone()[0] + 1
+
+    def enviar_pendientes(self, forzar: bool = False):
+        pendientes = sum(len(c.filas) for c in self.cargas.values())
+        if forzar or pendientes >= self.args.bloque:
+            for tabla in TABLAS:
+                self.cargas[tabla.name].enviar(self.cursor)
+
+    def fecha_entre(self, desde: datetime, hasta: datetime) -> datetime:
+        segundos = max(int((hasta - desde).total_seconds()), 1)
+        return desde + timedelta(seconds=self.rng.randrange(segundos))
+
+    def generar_usuarios(self) -> List[int]:
+        usuarios = self.carga(User)
+        ids = []
+        for _ in range(self.args.usuarios):
+            uid = usuarios.nuevo_id()
+            nombre = f"{self.rng.choice(NOMBRES)} {self.rng.choice(APELLIDOS)} {self.rng.choice(APELLIDOS)}"
+            usuarios.agregar(
+                id=uid, firebase_uid=f"sintetico-{uid}", email=f"usuario{uid}@sintetico.natillera.test",
+                username=f"usuario{uid}", full_name=nombre,
+                created_at=self.fecha_entre(self.inicio - timedelta(days=90), self.inicio)
+            )
+            ids.append(uid)
+            self.enviar_pendientes()
+        return ids
+
+    def cantidad_miembros(self) -> int:
+        # La mayoría de natilleras son de familia o trabajo (8-20); algunas muy grandes
+        return max(3, min(int(self.rng.lognormvariate(2.6, 0.5)), self.args.max_miembros))
+
+    def generar_natillera(self, usuarios: Sequence[int]):
+        natillera_id = self.carga(Natillera).nuevo_id()
+        miembros = self.rng.sample(usuarios, min(self.cantidad_miembros(), len(usuarios)))
+        creador = miembros[0]
+        cuota = self.rng.choice(CUOTAS)
+        creada = self.fecha_entre(self.inicio, self.inicio + timedelta(days=180))
+        self.carga(Natillera).agregar(
+            id=natillera_id, name=f"Natillera {self.rng.choice(APELLIDOS)} {natillera_id}", monthly_amount=cuota,
+            estado=NatilleraEstado.ACTIVO if self.rng.random() < 0.9 else NatilleraEstado.INACTIVO,
+            creator_id=creador, created_at=creada, version=1
+        )
+        for miembro in miembros:
+            self.carga(user_natillera).agregar(user_id=miembro, natillera_id=natillera_id, joined_at=creada)
+
+        for orden, (titulo, descripcion) in enumerate(self.rng.sample(POLITICAS, self.rng.randint(2, len(POLITICAS)))):
+            self.carga(Politica).agregar(
+                id=self.carga(Politica).nuevo_id(), natillera_id=natillera_id, titulo=titulo,
+                descripcion=descripcion, orden=orden, created_at=creada, updated_at=creada
+            )
+
+        self.generar_aportes(natillera_id, creador, miembros, cuota, creada)
+        self.generar_prestamos(natillera_id, creador, miembros, creada)
+        self.generar_movimientos(natillera_id, creador, creada)
+        self.generar_sorteos(natillera_id, creador, miembros, creada)
+        self.enviar_pendientes()
+
+    def adjunto(self, usuario: int, fecha: datetime, id_aporte: Optional[int] = None, id_pago: Optional[int] = None):
+        archivo_id = self.carga(ArchivoAdjunto).nuevo_id()
+        tipo, extension = self.rng.choice([("image/jpeg", "jpg"), ("image/png", "png"), ("application/pdf", "pdf")])
+        self.carga(ArchivoAdjunto).agregar(
+            id=archivo_id, nombre_archivo=f"comprobante_{archivo_id}.{extension}",
+            ruta_archivo=f"sintetico/{archivo_id}.{extension}", tipo_archivo=tipo,
+            tamano=self.rng.randint(40_000, 4_000_000), fecha_subida=fecha, id_aporte=id_aporte,
+            id_pago_prestamo=id_pago, id_usuario=usuario, hash_sha256=f"{self.rng.getrandbits(256):064x}",
+            ruta_miniatura=None
+        )
+
+    def generar_aportes(self, natillera_id: int, creador: int, miembros: List[int], cuota: Decimal, creada: datetime):
+        aportes = self.carga(Aporte)
+        mes = datetime(creada.year, creada.month, 1)
+        while mes < self.ahora:
+            reciente = (self.ahora - mes).days < 45
+            for miembro in miembros:
+                if self.rng.random() > self.args.puntualidad:
+                    continue
+                fecha = self.fecha_entre(mes, mes + timedelta(days=27))
+                if reciente and self.rng.random() < 0.6:
+                    estado, motivo = AporteStatus.PENDIENTE, None
+                elif self.rng.random() < 0.04:
+                    estado, motivo = AporteStatus.RECHAZADO, "Comprobante ilegible"
+                else:
+                    estado, motivo = AporteStatus.APROBADO, None
+                aporte_id = aportes.nuevo_id()
+                aportes.agregar(
+                    id=aporte_id, user_id=miembro, natillera_id=natillera_id, amount=cuota,
+                    month=mes.month, year=mes.year, status=estado, rejection_reason=motivo,
+                    created_at=fecha, updated_at=fecha
+                )
+                if estado == AporteStatus.APROBADO:
+                    self.carga(Transaccion).agregar(
+                        id=self.carga(Transaccion).nuevo_id(), natillera_id=natillera_id, tipo=TipoTransaccion.EFECTIVO,
+                        categoria=f"Aporte usuario{miembro}", monto=cuota, descripcion=f"Aporte {mes.month}/{mes.year}",
+                        fecha=fecha, creado_por=creador, aporte_id=aporte_id, prestamo_id=None, created_at=fecha
+                    )
+                if self.rng.random() < self.args.adjuntos:
+                    self.adjunto(miembro, fecha, id_aporte=aporte_id)
+            mes = (mes + timedelta(days=32)).replace(day=1)
+
+    def generar_prestamos(self, natillera_id: int, creador: int, miembros: List[int], creada: datetime):
+        prestamos = self.carga(Prestamo)
+        pagos = self.carga(PagoPrestamo)
+        transacciones = self.carga(Transaccion)
+        for _ in range(self.rng.randint(0, max(1, len(miembros) // 2))):
+            prestamo_id = prestamos.nuevo_id()
+            monto = Decimal(self.rng.randrange(200_000, 5_000_000, 50_000))
+            tasa = Decimal(self.rng.choice(["2.00", "3.00", "5.00", "10.00"]))
+            plazo = self.rng.choice([3, 6, 12, 18])
+            inicio = self.fecha_entre(creada, self.ahora)
+            interes = (monto * tasa / Decimal(100) * Decimal(plazo) / Decimal(12)).quantize(Decimal("0.01"))
+            total = monto + interes
+            decision = self.rng.random()
+            aprobado = None if decision < 0.1 else decision >= 0.15
+
+            pagado = Decimal(0)
+            filas_pagos = []
+            if aprobado:
+                cuota = (total / plazo).quantize(Decimal("0.01"))
+                fecha_pago = inicio
+                for numero in range(plazo):
+                    fecha_pago += timedelta(days=30)
+                    if fecha_pago >= self.ahora or self.rng.random() < 0.05:
+                        break
+                    estado_pago = EstadoPago.PENDIENTE if (self.ahora - fecha_pago).days < 20 else EstadoPago.APROBADO
+                    monto_pago = min(cuota, total - pagado) if numero < plazo - 1 else total - pagado
+                    if estado_pago == EstadoPago.APROBADO:
+                        pagado += monto_pago
+                    filas_pagos.append((monto_pago, fecha_pago, estado_pago))
+
+            if aprobado and pagado >= total:
+                estado = EstadoPrestamo.PAGADO
+            elif aprobado is False:
+                estado = EstadoPrestamo.CANCELADO
+            elif inicio + timedelta(days=30 * plazo) < self.ahora:
+                estado = EstadoPrestamo.VENCIDO
+            else:
+                estado = EstadoPrestamo.ACTIVO
+            referente = self.rng.choice(miembros)
+            prestamos.agregar(
+                id=prestamo_id, natillera_id=natillera_id, monto=monto, tasa_interes=tasa, plazo_meses=plazo,
+                fecha_inicio=inicio, fecha_vencimiento=inicio + timedelta(days=30 * plazo),
+                nombre_prestatario=f"{self.rng.choice(NOMBRES)} {self.rng.choice(APELLIDOS)}",
+                telefono_prestatario=f"3{self.rng.randrange(10**9):09d}", email_prestatario=None,
+                direccion_prestatario=None, referente_id=referente, estado=estado, monto_pagado=pagado,
+                notas=None, aprobado=aprobado, creado_por=creador, created_at=inicio, updated_at=inicio
+            )
+            if aprobado:
+                transacciones.agregar(
+                    id=transacciones.nuevo_id(), natillera_id=natillera_id, tipo=TipoTransaccion.PRESTAMO,
+                    categoria="Préstamo", monto=total, descripcion=f"Préstamo {prestamo_id}", fecha=inicio,
+                    creado_por=creador, aporte_id=None, prestamo_id=prestamo_id, created_at=inicio
+                )
+                transacciones.agregar(
+                    id=transacciones.nuevo_id(), natillera_id=natillera_id, tipo=TipoTransaccion.INGRESO,
+                    categoria="Intereses por Préstamo", monto=interes, descripcion=f"Intereses préstamo {prestamo_id}",
+                    fecha=inicio, creado_por=creador, aporte_id=None, prestamo_id=prestamo_id, created_at=inicio
+                )
+            for monto_pago, fecha_pago, estado_pago in filas_pagos:
+                pago_id = pagos.nuevo_id()
+                aprobado_pago = estado_pago == EstadoPago.APROBADO
+                pagos.agregar(
+                    id=pago_id, prestamo_id=prestamo_id, monto=monto_pago, fecha_pago=fecha_pago, estado=estado_pago,
+                    registrado_por=referente, aprobado_por=creador if aprobado_pago else None,
+                    fecha_aprobacion=fecha_pago + timedelta(days=1) if aprobado_pago else None,
+                    notas=None, created_at=fecha_pago
+                )
+                if aprobado_pago:
+                    transacciones.agregar(
+                        id=transacciones.nuevo_id(), natillera_id=natillera_id, tipo=TipoTransaccion.EFECTIVO,
+                        categoria="pago de prestamo", monto=monto_pago, descripcion=f"Pago préstamo {prestamo_id}",
+                        fecha=fecha_pago, creado_por=referente, aporte_id=None, prestamo_id=prestamo_id,
+                        created_at=fecha_pago
+                    )
+                if self.rng.random() < self.args.adjuntos:
+                    self.adjunto(referente, fecha_pago, id_pago=pago_id)
+
+    def generar_movimientos(self, natillera_id: int, creador: int, creada: datetime):
+        transacciones = self.carga(Transaccion)
+        for _ in range(self.rng.randint(0, 4 * self.args.anios)):
+            fecha = self.fecha_entre(creada, self.ahora)
+            ingreso = self.rng.random() < 0.4
+            transacciones.agregar(
+                id=transacciones.nuevo_id(), natillera_id=natillera_id,
+                tipo=TipoTransaccion.INGRESO if ingreso else TipoTransaccion.GASTO,
+                categoria="Multas" if ingreso else self.rng.choice(GASTOS),
+                monto=Decimal(self.rng.randrange(5_000, 300_000, 1_000)), descripcion=None, fecha=fecha,
+                creado_por=creador, aporte_id=None, prestamo_id=None, created_at=fecha
+            )
+
+    def generar_sorteos(self, natillera_id: int, creador: int, miembros: List[int], creada: datetime):
+        sorteos = self.carga(Sorteo)
+        billetes = self.carga(BilleteLoteria)
+        for _ in range(self.rng.randint(0, self.args.anios)):
+            sorteo_id = sorteos.nuevo_id()
+            creado = self.fecha_entre(creada, self.ahora)
+            tipo = TipoSorteo.LOTERIA if self.rng.random() < 0.8 else TipoSorteo.RIFA
+            finalizado = (self.ahora - creado).days > 60 and self.rng.random() < 0.8
+            tomados = {}
+            if tipo == TipoSorteo.LOTERIA:
+                ocupacion = self.rng.uniform(0.3, 0.95)
+                for numero in range(0, 101):
+                    if self.rng.random() < ocupacion:
+                        tomados[f"{numero:03d}"] = self.rng.choice(miembros)
+            ganador = self.rng.choice(sorted(tomados)) if finalizado and tomados else None
+            sorteos.agregar(
+                id=sorteo_id, natillera_id=natillera_id, tipo=tipo, titulo=f"Sorteo {sorteo_id}",
+                descripcion=None, fecha_creacion=creado, fecha_sorteo=creado + timedelta(days=30),
+                estado=EstadoSorteo.FINALIZADO if finalizado else EstadoSorteo.ACTIVO, creador_id=creador,
+                numero_ganador=ganador
+            )
+            if tipo != TipoSorteo.LOTERIA:
+                continue
+            for numero in range(0, 101):
+                clave = f"{numero:03d}"
+                usuario = tomados.get(clave)
+                billetes.agregar(
+                    id=billetes.nuevo_id(), sorteo_id=sorteo_id, numero=clave,
+                    estado=EstadoBillete.TOMADO if usuario else EstadoBillete.DISPONIBLE, tomado_por=usuario,
+                    fecha_tomado=self.fecha_entre(creado, creado + timedelta(days=25)) if usuario else None,
+                    pagado=bool(usuario) and self.rng.random() < 0.7
+                )
+
+    def actualizar_secuencias(self):
+        for carga in self.cargas.values():
+            if "id" in carga.columnas:
+                self.cursor.execute(
+                    f"SELECT setval(pg_get_serial_sequence('{carga.tabla.name}', 'id'), "
+                    f"(SELECT COALESCE(MAX(id), 1) FROM {carga.tabla.name}))"
+                )
+
+
+def _dsn(url: str) -> str:
+    # psycopg2 recibe la URL de libpq, sin el driver de SQLAlchemy
+    return make_url(url).set(drivername="postgresql").render_as_string(hide_password=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera un conjunto de datos sintético para pruebas de rendimiento")
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    parser.add_argument("--usuarios", type=int, default=10000)
+    parser.add_argument("--natilleras", type=int, default=None, help="Por defecto, una por cada 15 usuarios")
+    parser.add_argument("--anios", type=int, default=3, help="Años de historial de aportes")
+    parser.add_argument("--max-miembros", type=int, default=200)
+    parser.add_argument("--puntualidad", type=float, default=0.85, help="Probabilidad de que un miembro aporte en un mes")
+    parser.add_argument("--adjuntos", type=float, default=0.5, help="Fracción de aportes y pagos con comprobante")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--metodo", choices=["copy", "insert"], default="copy")
+    parser.add_argument("--bloque", type=int, default=50000, help="Filas acumuladas antes de enviar un bloque")
+    args = parser.parse_args()
+
+    natilleras = args.natilleras or max(1, args.usuarios // 15)
+    conexion = psycopg2.connect(_dsn(args.database_url))
+    inicio = time.perf_counter()
+    try:
+        with conexion.cursor() as cursor:
+            # Carga masiva: no esperar el fsync de cada bloque
+            cursor.execute("SET synchronous_commit = off")
+            generador = Generador(args, cursor)
+            generador.continuar_ids()
+            usuarios = generador.generar_usuarios()
+            for indice in range(natilleras):
+                generador.generar_natillera(usuarios)
+                if (indice + 1) % 100 == 0:
+                    total = sum(c.total for c in generador.cargas.values())
+                    print(f"{indice + 1}/{natilleras} natilleras, {total} filas, {time.perf_counter() - inicio:.0f}s")
+            generador.enviar_pendientes(forzar=True)
+            generador.actualizar_secuencias()
+        conexion.commit()
+    except Exception:
+        conexion.rollback()
+        raise
+    finally:
+        conexion.close()
+
+    duracion = time.perf_counter() - inicio
+    total = sum(c.total for c in generador.cargas.values())
+    for nombre, carga in generador.cargas.items():
+        print(f"{nombre:>20}: {carga.total}")
+    print(f"{total} filas en {duracion:.1f}s ({total / max(duracion, 1e-6):.0f} filas/s)")
+
+
+if __name__ == "__main__":
+    main()
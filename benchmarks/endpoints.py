@@ -0,0 +1,385 @@
+"""
+Suite de benchmarks de endpoints con presupuestos de latencia, consultas y memoria.
+
+Ejecuta la app de FastAPI en el mismo proceso (llamadas ASGI directas, sin red) contra
+una base de datos local poblada con benchmarks/datos_sinteticos.py. La autenticación se
+reemplaza con dependency_overrides: cada petición se hace como el creador de la
+natillera del escenario. Los escenarios son natilleras de varios tamaños (mediana,
+percentil 90 y la más grande por número de aportes).
+
+Para cada endpoint GET de los routers mide p50/p95 de latencia, sentencias SQL por
+petición (header Server-Timing de ConsultasMiddleware) y memoria asignada (pico de
+tracemalloc). Los endpoints de escritura (ESCRITURAS) se miden igual, pero cada
+petición corre dentro de una transacción que se deshace al terminar: los commits de la
+app pasan a ser SAVEPOINT (sus sentencias cuentan en el total) y todas las repeticiones
+parten del mismo estado. La subida de archivos no se incluye porque necesita MinIO; la
+cubre benchmarks/carga_fin_de_mes.py con almacenamiento simulado. Con --guardar-linea-base escribe los resultados como línea base; sin él
+los compara con la guardada y termina con código 1 si algún endpoint la supera por
+más del margen configurado.
+
+Uso:
+    python benchmarks/datos_sinteticos.py --usuarios 20000
+    python benchmarks/endpoints.py --guardar-linea-base
+    python benchmarks/endpoints.py --margen 0.25 --margen-consultas 0
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import statistics
+import sys
+import time
+import tracemalloc
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Sin caché de respuestas ni logs de depuración: se mide el trabajo real de cada endpoint
+os.environ.setdefault("CACHE_BACKEND", "ninguno")
+os.environ.setdefault("LOG_NIVEL", "WARNING")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import Depends  # noqa: E402
+from sqlalchemy import func, select  # noqa: E402
+from sqlalchemy.engine import Connection  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from app.auth.dependencies import get_current_user, get_current_user_async  # noqa: E402
+from app.database import SessionLocal, engine, get_async_db, get_db  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import (  # noqa: E402
+    Aporte, AporteStatus, ArchivoAdjunto, BilleteLoteria, EstadoBillete, EstadoPago, Natillera,
+    PagoPrestamo, Prestamo, Sorteo, TipoSorteo, User, user_natillera
+)
+
+LINEA_BASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "linea_base_endpoints.json")
+
+# Endpoints de lectura por router; {parametro} se completa con los IDs del escenario
+ENDPOINTS = [
+    "/aportes/my-aportes",
+    "/aportes/natillera/{natillera_id}",
+    "/aportes/natillera/{natillera_id}/pendientes/count",
+    "/aportes/my-aportes/aprobados/count",
+    "/transacciones/natilleras/{natillera_id}/balance",
+    "/transacciones/natilleras/{natillera_id}/transacciones",
+    "/natilleras/",
+    "/natilleras/activas",
+    "/natilleras/created",
+    "/natilleras/{natillera_id}",
+    "/natilleras/{natillera_id}/estadisticas",
+    "/natilleras/{natillera_id}/participacion",
+    "/prestamos/natilleras/{natillera_id}",
+    "/prestamos/{prestamo_id}",
+    "/prestamos/{prestamo_id}/pagos",
+    "/prestamos/pagos/pendientes",
+    "/prestamos/natilleras/{natillera_id}/resumen",
+    "/prestamos/natillera/{natillera_id}/pendientes/count",
+    "/prestamos/my-prestamos/aprobados/count",
+    "/prestamos/pagos/natillera/{natillera_id}/pendientes/count",
+    "/prestamos/pagos/my-pagos/aprobados/count",
+    "/sorteos/activos",
+    "/sorteos/finalizados",
+    "/sorteos/{sorteo_id}",
+    "/sorteos/{sorteo_id}/billetes",
+    "/sorteos/{sorteo_id}/billetes/admin",
+    "/invitaciones/",
+    "/invitaciones/count",
+    "/invitaciones/natillera/{natillera_id}/respondidas/count",
+    "/politicas/natillera/{natillera_id}",
+    "/archivos_adjuntos/aporte/{aporte_id}",
+    "/archivos_adjuntos/pago_prestamo/{pago_id}",
+    "/users/me",
+]
+
+_AHORA = datetime.utcnow()
+
+# Endpoints de escritura: (método, ruta, cuerpo JSON a partir de los IDs del escenario)
+ESCRITURAS: List[Tuple[str, str, Optional[Callable[[dict], dict]]]] = [
+    ("POST", "/aportes/", lambda ids: {
+        "amount": "50000", "month": _AHORA.month, "year": _AHORA.year, "natillera_id": ids["natillera_id"]
+    }),
+    ("PATCH", "/aportes/{aporte_pendiente_id}", lambda ids: {"status": "aprobado"}),
+    ("POST", "/transacciones/", lambda ids: {
+        "tipo": "gasto", "categoria": "papeleria", "monto": "12000", "natillera_id": ids["natillera_id"]
+    }),
+    ("POST", "/prestamos/{prestamo_id}/pagos", lambda ids: {"monto_pago": "10000"}),
+    ("PATCH", "/prestamos/pagos/{pago_pendiente_id}/aprobar", None),
+    ("POST", "/sorteos/{sorteo_id}/billetes/{billete_disponible}/tomar", None),
+    ("POST", "/invitaciones/", lambda ids: {
+        "natillera_id": ids["natillera_id"], "invited_email": ids["email_invitable"]
+    }),
+]
+
+# ID del usuario de la petición en curso (lo leen los reemplazos de las dependencias de auth)
+usuario_actual: ContextVar[Optional[int]] = ContextVar("usuario_actual", default=None)
+# Conexión con la transacción externa de la petición de escritura en curso
+conexion_actual: ContextVar[Optional[Connection]] = ContextVar("conexion_actual", default=None)
+
+_CONSULTAS = re.compile(r'desc="(\d+) consultas"')
+
+
+# Como las dependencias reales, cargan el usuario en la sesión de la petición (una consulta)
+def _usuario_sync(db: Session = Depends(get_db)) -> User:
+    return db.get(User, usuario_actual.get())
+
+
+async def _usuario_async(db: AsyncSession = Depends(get_async_db)) -> User:
+    return await db.get(User, usuario_actual.get())
+
+
+def _db_por_peticion():
+    """Reemplazo de get_db: dentro de una escritura, sesión unida a su transacción externa"""
+    conexion = conexion_actual.get()
+    if conexion is None:
+        yield from get_db()
+        return
+    db = Session(
+        bind=conexion, join_transaction_mode="create_savepoint", autoflush=False, expire_on_commit=False
+    )
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def escenarios() -> List[dict]:
+    """Natilleras de distintos tamaños con los IDs que necesitan los endpoints"""
+    with SessionLocal() as db:
+        conteos = db.execute(
+            select(Aporte.natillera_id, func.count(Aporte.id).label("aportes"))
+            .group_by(Aporte.natillera_id)
+            .order_by(func.count(Aporte.id))
+        ).all()
+        if not conteos:
+            raise SystemExit("La base de datos está vacía: ejecute primero benchmarks/datos_sinteticos.py")
+
+        elegidos = {
+            "mediana": conteos[len(conteos) // 2],
+            "p90": conteos[int(len(conteos) * 0.9)],
+            "maxima": conteos[-1],
+        }
+        resultado = []
+        for tamano, (natillera_id, aportes) in elegidos.items():
+            natillera = db.get(Natillera, natillera_id)
+            ids = {"natillera_id": natillera_id}
+            ids["sorteo_id"] = db.scalar(
+                select(Sorteo.id).where(Sorteo.natillera_id == natillera_id, Sorteo.tipo == TipoSorteo.LOTERIA).limit(1)
+            )
+            ids["prestamo_id"] = db.scalar(
+                select(Prestamo.id).join(PagoPrestamo).where(Prestamo.natillera_id == natillera_id)
+                .group_by(Prestamo.id).order_by(func.count(PagoPrestamo.id).desc()).limit(1)
+            )
+            ids["aporte_id"] = db.scalar(
+                select(ArchivoAdjunto.id_aporte).join(Aporte).where(Aporte.natillera_id == natillera_id).limit(1)
+            )
+            ids["pago_id"] = db.scalar(
+                select(ArchivoAdjunto.id_pago_prestamo).join(PagoPrestamo).join(Prestamo)
+                .where(Prestamo.natillera_id == natillera_id).limit(1)
+            )
+            ids["aporte_pendiente_id"] = db.scalar(
+                select(Aporte.id).where(Aporte.natillera_id == natillera_id, Aporte.status == AporteStatus.PENDIENTE)
+                .limit(1)
+            )
+            ids["pago_pendiente_id"] = db.scalar(
+                select(PagoPrestamo.id).join(Prestamo)
+                .where(Prestamo.natillera_id == natillera_id, PagoPrestamo.estado == EstadoPago.PENDIENTE)
+                .limit(1)
+            )
+            ids["billete_disponible"] = db.scalar(
+                select(BilleteLoteria.numero)
+                .where(BilleteLoteria.sorteo_id == ids["sorteo_id"], BilleteLoteria.estado == EstadoBillete.DISPONIBLE)
+                .limit(1)
+            ) if ids["sorteo_id"] else None
+            ids["email_invitable"] = db.scalar(
+                select(User.email).where(
+                    User.id != natillera.creator_id,
+                    User.id.not_in(select(user_natillera.c.user_id).where(user_natillera.c.natillera_id == natillera_id))
+                ).limit(1)
+            )
+            billetes = db.scalar(
+                select(func.count(BilleteLoteria.id)).where(BilleteLoteria.sorteo_id == ids["sorteo_id"])
+            ) if ids["sorteo_id"] else 0
+            resultado.append({
+                "tamano": tamano, "usuario_id": natillera.creator_id, "ids": ids,
+                "descripcion": f"natillera {natillera_id}: {aportes} aportes, {billetes} billetes",
+            })
+        return resultado
+
+
+async def llamar(ruta: str, metodo: str = "GET", cuerpo: Optional[dict] = None) -> Tuple[int, Dict[str, str], int]:
+    """Petición directa a la app ASGI; retorna estado, headers y bytes del cuerpo"""
+    datos = json.dumps(cuerpo).encode() if cuerpo is not None else b""
+    headers = [(b"host", b"benchmark")]
+    if cuerpo is not None:
+        headers += [(b"content-type", b"application/json"), (b"content-length", str(len(datos)).encode())]
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": metodo,
+        "scheme": "http", "path": ruta, "raw_path": ruta.encode(), "query_string": b"",
+        "root_path": "", "headers": headers, "client": ("127.0.0.1", 0),
+        "server": ("benchmark", 80),
+    }
+    estado = 0
+    cabeceras: Dict[str, str] = {}
+    tamano = 0
+
+    async def receive():
+        return {"type": "http.request", "body": datos, "more_body": False}
+
+    async def send(message):
+        nonlocal estado, tamano
+        if message["type"] == "http.response.start":
+            estado = message["status"]
+            cabeceras.update({k.decode(): v.decode() for k, v in message.get("headers", [])})
+        elif message["type"] == "http.response.body":
+            tamano += len(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return estado, cabeceras, tamano
+
+
+async def llamar_y_deshacer(ruta: str, metodo: str, cuerpo: Optional[dict]) -> Tuple[int, Dict[str, str], int]:
+    """Petición de escritura dentro de una transacción que se deshace al terminar"""
+    with engine.connect() as conexion:
+        transaccion = conexion.begin()
+        token = conexion_actual.set(conexion)
+        try:
+            return await llamar(ruta, metodo, cuerpo)
+        finally:
+            conexion_actual.reset(token)
+            transaccion.rollback()
+
+
+async def medir_endpoint(
+    ruta: str, repeticiones: int, calentamiento: int, metodo: str = "GET", cuerpo: Optional[dict] = None
+) -> dict:
+    async def peticion():
+        if metodo == "GET":
+            return await llamar(ruta)
+        return await llamar_y_deshacer(ruta, metodo, cuerpo)
+
+    for _ in range(calentamiento):
+        await peticion()
+
+    tiempos = []
+    estado, cabeceras, tamano = 0, {}, 0
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        estado, cabeceras, tamano = await peticion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+
+    # Memoria en una pasada aparte: tracemalloc hace más lentas las mediciones de latencia
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    await peticion()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    coincidencia = _CONSULTAS.search(cabeceras.get("server-timing", ""))
+    tiempos.sort()
+    return {
+        "estado": estado,
+        "p50_ms": round(statistics.median(tiempos), 2),
+        "p95_ms": round(tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))], 2),
+        "consultas": int(coincidencia.group(1)) if coincidencia else None,
+        "memoria_kb": round(pico / 1024, 1),
+        "bytes": tamano,
+    }
+
+
+async def ejecutar(args) -> Dict[str, dict]:
+    app.dependency_overrides[get_current_user] = _usuario_sync
+    app.dependency_overrides[get_current_user_async] = _usuario_async
+    app.dependency_overrides[get_db] = _db_por_peticion
+    await app.router.startup()
+    resultados = {}
+    try:
+        for escenario in escenarios():
+            print(f"== {escenario['tamano']}: {escenario['descripcion']}")
+            token = usuario_actual.set(escenario["usuario_id"])
+            try:
+                peticiones = [("GET", plantilla, None) for plantilla in ENDPOINTS]
+                if not args.solo_lectura:
+                    peticiones += ESCRITURAS
+                for metodo, plantilla, cuerpo in peticiones:
+                    if args.filtro and args.filtro not in plantilla:
+                        continue
+                    try:
+                        ruta = plantilla.format(**escenario["ids"])
+                        datos = cuerpo(escenario["ids"]) if cuerpo else None
+                    except KeyError:
+                        continue
+                    if "None" in ruta or (datos and None in datos.values()):
+                        print(f"   (sin datos para {metodo} {plantilla})")
+                        continue
+                    medicion = await medir_endpoint(ruta, args.repeticiones, args.calentamiento, metodo, datos)
+                    clave = f"{metodo} {plantilla} [{escenario['tamano']}]"
+                    resultados[clave] = medicion
+                    print(
+                        f"   {clave}: {medicion['estado']} p50={medicion['p50_ms']}ms p95={medicion['p95_ms']}ms "
+                        f"consultas={medicion['consultas']} memoria={medicion['memoria_kb']}KB"
+                    )
+            finally:
+                usuario_actual.reset(token)
+    finally:
+        await app.router.shutdown()
+        app.dependency_overrides.clear()
+    return resultados
+
+
+def comparar(resultados: Dict[str, dict], linea_base: Dict[str, dict], margen: float, margen_consultas: int) -> List[str]:
+    """Mensajes de cada métrica que supera la línea base por más del margen"""
+    fallos = []
+    for clave, actual in resultados.items():
+        base = linea_base.get(clave)
+        if base is None:
+            continue
+        if actual["estado"] != base["estado"]:
+            fallos.append(f"{clave}: estado {actual['estado']} (línea base {base['estado']})")
+        for metrica in ("p95_ms", "memoria_kb"):
+            limite = base[metrica] * (1 + margen)
+            if actual[metrica] > limite:
+                fallos.append(f"{clave}: {metrica} {actual[metrica]} > {limite:.1f} (línea base {base[metrica]})")
+        if actual["consultas"] is not None and base["consultas"] is not None:
+            if actual["consultas"] > base["consultas"] + margen_consultas:
+                fallos.append(f"{clave}: {actual['consultas']} consultas (línea base {base['consultas']})")
+    return fallos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de endpoints con presupuestos")
+    parser.add_argument("--repeticiones", type=int, default=30)
+    parser.add_argument("--calentamiento", type=int, default=3)
+    parser.add_argument("--margen", type=float, default=0.25, help="Margen relativo para latencia p95 y memoria")
+    parser.add_argument("--margen-consultas", type=int, default=0, help="Consultas extra toleradas por endpoint")
+    parser.add_argument("--linea-base", default=LINEA_BASE)
+    parser.add_argument("--guardar-linea-base", action="store_true")
+    parser.add_argument("--filtro", help="Solo los endpoints cuya ruta contiene este texto")
+    parser.add_argument("--solo-lectura", action="store_true", help="Omitir los endpoints de escritura")
+    args = parser.parse_args()
+
+    resultados = asyncio.run(ejecutar(args))
+
+    if args.guardar_linea_base:
+        with open(args.linea_base, "w", encoding="utf-8") as archivo:
+            json.dump(resultados, archivo, indent=2, ensure_ascii=False, sort_keys=True)
+        print(f"Línea base guardada en {args.linea_base} ({len(resultados)} mediciones)")
+        return
+
+    if not os.path.exists(args.linea_base):
+        print(f"No hay línea base en {args.linea_base}; ejecute con --guardar-linea-base")
+        return
+    with open(args.linea_base, encoding="utf-8") as archivo:
+        linea_base = json.load(archivo)
+    fallos = comparar(resultados, linea_base, args.margen, args.margen_consultas)
+    if fallos:
+        print(f"\n{len(fallos)} presupuestos excedidos:")
+        for fallo in fallos:
+            print(f"  - {fallo}")
+        raise SystemExit(1)
+    print("\nTodos los endpoints dentro de la línea base")
+
+
+if __name__ == "__main__":
+    main()
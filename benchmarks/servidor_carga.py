@@ -0,0 +1,105 @@
+"""
+Servidor de la API para pruebas de carga locales: la misma app, con Firebase y MinIO
+reemplazados por dobles en memoria para que la carga mida solo la API y la base.
+
+- Autenticación: el token Bearer es directamente el firebase_uid del usuario
+  (los usuarios sembrados por datos_sinteticos.py usan "sintetico-<id>"). La
+  búsqueda del usuario en la base se conserva.
+- Almacenamiento: un S3 falso por proceso que guarda los objetos en un dict, con
+  una latencia opcional por operación (CARGA_LATENCIA_S3_MS) para simular la red.
+
+Uso:
+    uvicorn benchmarks.servidor_carga:app --port 4000 --workers 4
+"""
+import io
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.auth import dependencies  # noqa: E402
+from app.main import app  # noqa: E402,F401
+from app.services.archivo_adjunto_service import ArchivoAdjuntoService  # noqa: E402
+
+PREFIJO_TOKEN = "sintetico-"
+LATENCIA_S3 = float(os.environ.get("CARGA_LATENCIA_S3_MS", "0")) / 1000
+
+
+def _verificar_token_falso(token: str):
+    """Acepta solo tokens con el prefijo de los usuarios sintéticos, igual que Firebase rechazaría los demás"""
+    if not token.startswith(PREFIJO_TOKEN):
+        return None
+    return {"uid": token}
+
+
+class _CuerpoFalso:
+    """Imita el StreamingBody de botocore (read, iter_chunks y close)"""
+
+    def __init__(self, datos: bytes):
+        self._flujo = io.BytesIO(datos)
+
+    def read(self, size: int = -1) -> bytes:
+        return self._flujo.read(size)
+
+    def iter_chunks(self, chunk_size: int = 1024):
+        while True:
+            bloque = self._flujo.read(chunk_size)
+            if not bloque:
+                break
+            yield bloque
+
+    def close(self):
+        self._flujo.close()
+
+
+class S3Falso:
+    """Subconjunto del cliente S3 de boto3 que usa la app, sobre un dict en memoria"""
+
+    def __init__(self, latencia: float = 0.0):
+        self.latencia = latencia
+        self._objetos = {}
+        self._lock = threading.Lock()
+
+    def _esperar(self):
+        if self.latencia:
+            time.sleep(self.latencia)
+
+    def upload_fileobj(self, archivo, bucket, key, ExtraArgs=None, Config=None):
+        partes = []
+        while True:
+            bloque = archivo.read(1024 * 1024)
+            if not bloque:
+                break
+            partes.append(bloque)
+        self.put_object(Bucket=bucket, Key=key, Body=b"".join(partes),
+                        ContentType=(ExtraArgs or {}).get("ContentType"))
+
+    def put_object(self, Bucket, Key, Body, ContentType=None, ContentLength=None):
+        self._esperar()
+        contenido = Body.read() if hasattr(Body, "read") else bytes(Body)
+        with self._lock:
+            self._objetos[(Bucket, Key)] = (contenido, ContentType)
+        return {}
+
+    def get_object(self, Bucket, Key):
+        self._esperar()
+        with self._lock:
+            datos, tipo = self._objetos[(Bucket, Key)]
+        return {"Body": _CuerpoFalso(datos), "ContentLength": len(datos), "ContentType": tipo}
+
+    def delete_object(self, Bucket, Key):
+        self._esperar()
+        with self._lock:
+            self._objetos.pop((Bucket, Key), None)
+        return {}
+
+    def generate_presigned_url(self, operacion, Params, ExpiresIn=3600):
+        return f"http://s3-falso.local/{Params['Bucket']}/{Params['Key']}?expira={ExpiresIn}"
+
+
+s3_falso = S3Falso(LATENCIA_S3)
+
+dependencies.verify_firebase_token = _verificar_token_falso
+ArchivoAdjuntoService._obtener_cliente_s3 = staticmethod(lambda: s3_falso)
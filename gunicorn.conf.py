@@ -0,0 +1,91 @@
+"""
+Configuración de producción: gunicorn como gestor de procesos con workers de uvicorn.
+
+    gunicorn app.main:app -c gunicorn.conf.py
+
+- WEB_CONCURRENCY workers (por defecto uno por núcleo), cada uno con su event loop.
+- La app se importa una vez en el proceso maestro (preload) y los workers la heredan
+  por fork: arrancan más rápido y comparten la memoria de solo lectura.
+- Cada worker se recicla tras GUNICORN_MAX_REQUESTS peticiones (con jitter para que
+  no se reinicien todos a la vez), lo que acota el crecimiento de memoria.
+- Al recibir SIGTERM los workers dejan de aceptar conexiones y terminan las peticiones
+  en curso durante GUNICORN_GRACEFUL_TIMEOUT segundos antes de cerrarse.
+
+Los pools de conexiones se dimensionan por worker con DB_MAX_CONEXIONES (ver
+app/database.py).
+
+Estado que queda por worker (cada proceso tiene el suyo):
+- La caché de respuestas con CACHE_BACKEND=memoria: cada worker guarda y calcula sus
+  propias entradas (más memoria, menos aciertos). Con varios workers use
+  CACHE_BACKEND=redis; al arrancar se registra un error si no.
+- La coalescencia (app/coalescencia.py): solo se comparten cálculos dentro del worker.
+- El perfilador (/admin/perfiles) y las métricas (/metrics): cada petición llega a un
+  worker al azar, así que activar el perfilador, listar perfiles o leer métricas
+  actúa sobre ese worker solamente. Para perfilar o medir uno en concreto ejecute con
+  WEB_CONCURRENCY=1 o consulte varias veces y agregue.
+"""
+import logging
+import multiprocessing
+import os
+
+workers = int(os.environ.get("WEB_CONCURRENCY") or multiprocessing.cpu_count())
+# La app lee WEB_CONCURRENCY para repartir DB_MAX_CONEXIONES entre los workers
+os.environ["WEB_CONCURRENCY"] = str(workers)
+
+worker_class = "uvicorn.workers.UvicornWorker"
+bind = f"0.0.0.0:{os.environ.get('PORT', '4000')}"
+preload_app = True
+
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", "5000"))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", str(max_requests // 10)))
+
+# Segundos para terminar las peticiones en curso al apagar o reciclar un worker
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+# Un worker que no responde al maestro en este tiempo se reinicia
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "60"))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", "5"))
+
+# Equivalente a --proxy-headers de uvicorn: confiar en X-Forwarded-* del proxy
+forwarded_allow_ips = os.environ.get("FORWARDED_ALLOW_IPS", "*")
+
+# Los logs de gunicorn pasan por la cola de app/logs.py
+accesslog = None
+errorlog = "-"
+
+
+def when_ready(server):
+    from app.config import settings
+    from app.database import POOL_MAX_OVERFLOW, POOL_SIZE
+
+    logger = logging.getLogger("gunicorn.error")
+    if workers > 1 and settings.CACHE_BACKEND == "memoria":
+        logger.error(
+            "CACHE_BACKEND=memoria con varios workers: cada worker tiene su propia caché "
+            "de respuestas; configure CACHE_BACKEND=redis",
+            extra={"workers": workers},
+        )
+    logger.info(
+        "Servidor listo",
+        extra={
+            "workers": workers, "pool_size": POOL_SIZE, "max_overflow": POOL_MAX_OVERFLOW,
+            "conexiones_maximas": workers * 2 * (POOL_SIZE + POOL_MAX_OVERFLOW),
+        },
+    )
+
+
+def post_fork(server, worker):
+    # Lo que el maestro creó al importar la app y no debe compartirse con el worker
+    from app.database import reiniciar_tras_fork as reiniciar_db
+    from app.logs import reiniciar_tras_fork as reiniciar_logs
+
+    reiniciar_logs()
+    reiniciar_db()
+
+
+def worker_exit(server, worker):
+    # Cierra las conexiones del pool síncrono (el asíncrono se cierra en el shutdown de la app)
+    from app.database import engine, replica_engines
+
+    engine.dispose()
+    for replica in replica_engines:
+        replica.dispose()